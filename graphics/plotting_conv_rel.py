@@ -1,9 +1,14 @@
 import os
 import sys
+import json
 import toml
 import glob
-import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import numpy as np
 
@@ -12,19 +17,34 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 module_dir = os.path.join(script_dir, '../py')
 sys.path.insert(0, module_dir)
 
-from exact_expectation import get_exact_expectation_afm_heisenberg, get_exact_expectation_afm_heisenberg_lattice
-
-# Read the directory from the TOML file
-with open(os.path.join(os.path.dirname(sys.argv[0]), 'graphics.toml'), 'r') as f:
-    config = toml.load(f)
-    directory = config['directory']
-    csv_prefix = config['csv_prefix']
-    save_fig_directory = config['save_fig_directory']
-    number_l_list = config['number_l']
-    number_p_list = config['number_p']
-    rows_list = config['number_row']
+from exact_expectation import get_exact_energy
+from history import history_path_for, load_history
+from catalog import ResultsCatalog
+
+# Define lists of markers and linestyles
+markers = ['o', 's', '^', 'D', 'v', '<', '>', 'p', 'H', '*']
+linestyles = ['-', '--', '-.', ':', '-', '--', '-.', ':', '-', '--']
+
+# File in save_fig_directory recording the input hash each figure was rendered from
+MANIFEST_NAME = '.figures.json'
+
+def read_energy_history(csv_file):
+    """Return (iterations, energies) of a run, memory-mapping its history store when present."""
+    history_path = history_path_for(csv_file)
+    if os.path.exists(os.path.join(history_path, "meta.json")):
+        history = load_history(history_path)
+        return history['iter'], history['energy']
+    df = pd.read_csv(csv_file)
+    if 'energy' not in df.columns:
+        return None, None
+    return df['iter'], df['energy']
+
+def read_config(config_path):
+    """Read a graphics TOML file into a settings dict."""
+    with open(config_path, 'r') as f:
+        config = toml.load(f)
+
     boundary_condition = config["boundary_condition"]
-    
     if boundary_condition == "PBC":
         periodic = True
         BC = "PBC"
@@ -34,122 +54,245 @@ with open(os.path.join(os.path.dirname(sys.argv[0]), 'graphics.toml'), 'r') as f
     else:
         periodic = False
         BC = "OBC"
-        print(f'{boundary_condition} not valid boundary condition, using OBC.')    
-        
-if not os.path.exists(save_fig_directory):
-    os.mkdir(save_fig_directory)
-    print(f"Directory {save_fig_directory} created.")
-if os.path.exists(save_fig_directory):
-    shutil.rmtree(save_fig_directory)
-    os.mkdir(save_fig_directory)
-    print(f"Directory {save_fig_directory} cleared.")
+        print(f'{boundary_condition} not valid boundary condition, using OBC.')
 
-# Define lists of markers and linestyles
-markers = ['o', 's', '^', 'D', 'v', '<', '>', 'p', 'H', '*']
-linestyles = ['-', '--', '-.', ':', '-', '--', '-.', ':', '-', '--']
+    return {
+        'directory': config['directory'],
+        'csv_prefix': config['csv_prefix'],
+        'save_fig_directory': config['save_fig_directory'],
+        'number_l_list': config['number_l'],
+        'number_p_list': config['number_p'],
+        'rows_list': config['number_row'],
+        'catalog_path': config.get('catalog'),  # Optional results catalog written by the drivers
+        'periodic': periodic,
+        'BC': BC,
+    }
+
+def collect_runs(settings):
+    """
+    Find the latest run of every (number_l, number_p) and the exact energy of every number_l.
+
+    Only file names and catalog rows are read here; the energies themselves are loaded by the
+    worker that renders a figure, and only if that figure is out of date.
+    """
+    csv_prefix = settings['csv_prefix']
+    BC = settings['BC']
+    catalog = ResultsCatalog(settings['catalog_path']) if settings['catalog_path'] else None
+
+    exact_energies = {}
+    runs = []  # dicts with number_l, number_p, source and (from the catalog) final_energy
+    for number_l in settings['number_l_list']:
+        rows = settings['rows_list'][0]
+        cols = int(number_l / rows)
+        compute_exact = lambda: get_exact_energy(csv_prefix, rows, cols, settings['periodic'])
+        exact_energies[number_l] = catalog.exact_energy(csv_prefix, rows, cols, BC, compute=compute_exact) if catalog else compute_exact()
+
+        if catalog:
+            for number_p, run in catalog.latest_runs(csv_prefix, rows, cols, BC, settings['number_p_list']).items():
+                source = run['history_path'] if os.path.exists(os.path.join(run['history_path'], 'meta.json')) else None
+                runs.append({'number_l': number_l, 'number_p': number_p, 'source': source, 'final_energy': run['final_energy']})
+        else:
+            for number_p in settings['number_p_list']:
+                pattern = os.path.join(settings['directory'], f"{csv_prefix}_l{number_l:02}_p{number_p}_*.csv")
+                files = glob.glob(pattern)
+                if files:
+                    latest_file = max(files, key=os.path.getmtime)
+                    history_path = history_path_for(latest_file)
+                    source = history_path if os.path.exists(os.path.join(history_path, 'meta.json')) else latest_file
+                    runs.append({'number_l': number_l, 'number_p': number_p, 'source': source, 'final_energy': None})
+
+    if catalog:
+        catalog.close()
+    return runs, exact_energies
+
+def figure_specs(settings, runs, exact_energies):
+    """Describe every figure of a settings dict as a picklable spec for a render worker."""
+    csv_prefix = settings['csv_prefix']
+    common = {
+        'csv_prefix': csv_prefix,
+        'number_l_list': settings['number_l_list'],
+        'rows': settings['rows_list'][0],
+        'BC': settings['BC'],
+        'runs': runs,
+        'exact_energies': exact_energies,
+    }
+    specs = [
+        dict(common, name=f"{csv_prefix}_relative_energy_vs_p", kind='relative_energy', zoom=False),
+        dict(common, name=f"{csv_prefix}_relative_energy_vs_p_zoom", kind='relative_energy', zoom=True),
+        dict(common, name=f"{csv_prefix}_energy_iteration", kind='energy_iteration'),
+    ]
+    for spec in specs:
+        spec['path'] = os.path.join(settings['save_fig_directory'], f"{spec['name']}.pdf")
+    return specs
+
+def _hash_file(hasher, path):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(block)
+
+def input_hash(spec):
+    """Content hash of everything a figure is rendered from: its spec and its input files."""
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps({key: value for key, value in spec.items() if key != 'runs'}, sort_keys=True, default=str).encode())
+    for run in spec['runs']:
+        hasher.update(json.dumps(run, sort_keys=True).encode())
+        source = run['source']
+        if source is None:
+            continue
+        if os.path.isdir(source):
+            for name in ('meta.json', 'iter.npy', 'energy.npy'):
+                _hash_file(hasher, os.path.join(source, name))
+        else:
+            _hash_file(hasher, source)
+    return hasher.hexdigest()
+
+def load_energies(run):
+    """Return (iterations, energies) of a run spec, or (None, None) if it has no readable history."""
+    source = run['source']
+    if source is None:
+        return None, None
+    if os.path.isdir(source):
+        history = load_history(source)
+        return history['iter'], history['energy']
+    return read_energy_history(source)
+
+def render_relative_energy(spec):
+    """Plot relative energy vs. p-number, optionally with a limited y-axis."""
+    plt.figure(figsize=(10, 6))
 
-# Prepare data for plotting
-plot_data = []
-
-# For each number_l, number_p, search for the latest file and extract the energy data over iterations
-for i, number_l in enumerate(number_l_list):
-    energy_per_length_values = {}
-    for number_p in number_p_list:
-        pattern = os.path.join(directory, f"{csv_prefix}_l{number_l:02}_p{number_p}_*.csv")
-        files = glob.glob(pattern)
-        if files:
-            latest_file = max(files, key=os.path.getmtime)
-            print(latest_file)
-            df = pd.read_csv(latest_file)
-            if 'energy' in df.columns:
+    for i, number_l in enumerate(spec['number_l_list']):
+        energy_per_length_values = {}
+        for run in spec['runs']:
+            if run['number_l'] != number_l:
+                continue
+            energy_value = run['final_energy']
+            if energy_value is None:
+                _, energies = load_energies(run)
+                if energies is None:
+                    continue
                 # Get the value of the energy column from the last row
-                energy_value = df['energy'].iloc[-1]
-                exact_energy, _ = get_exact_expectation_afm_heisenberg_lattice(int(number_l / rows_list[0]), rows_list[0], periodic)
-                #exact_energy, _ = get_exact_expectation_afm_heisenberg(int(number_l / rows_list[0]), rows_list[0], periodic)
-                energy_per_length_values[number_p] = energy_value / exact_energy
-                
-    # Collect data for plotting
-    plot_data.append((number_l, energy_per_length_values))
-
-# Plot the first figure: Relative energy vs. p-number
-plt.figure(figsize=(10, 6))
-
-for i, (number_l, energy_per_length_values) in enumerate(plot_data):
-    plt.plot(list(energy_per_length_values.keys()), list(energy_per_length_values.values()),
-             marker=markers[i % len(markers)], linestyle=linestyles[i % len(linestyles)], label=f'L = {number_l}')
-
-plt.tick_params(axis='both', labelsize=16)
-plt.xlabel('$p$', fontsize=20)
-plt.ylabel('$E$/$E_{exact}$', fontsize=20)
-plt.title(f"Relative energy vs. p-number\n{csv_prefix}", fontsize=16)
-plt.legend(fontsize=10)
-plt.grid(True)
-
-# Save as an image file
-plt.savefig(os.path.join(save_fig_directory, f"{csv_prefix}_relative_energy_vs_p.pdf"), format='pdf', dpi=300)
-plt.close()
-
-# Plot the second figure: Relative energy vs. p-number with limited y-axis
-plt.figure(figsize=(10, 6))
-
-for i, (number_l, energy_per_length_values) in enumerate(plot_data):
-    plt.plot(list(energy_per_length_values.keys()), list(energy_per_length_values.values()),
-             marker=markers[i % len(markers)], linestyle=linestyles[i % len(linestyles)], label=f'L = {number_l}')
-
-plt.tick_params(axis='both', labelsize=16)
-plt.xlabel('$p$', fontsize=20)
-plt.ylabel('$E$/$E_{exact}$', fontsize=20)
-plt.ylim(0.9, 1.0)
-plt.title(f"Relative energy vs. p-number\n{csv_prefix}, limited y-axis", fontsize=16)
-plt.legend(fontsize=10)
-plt.grid(True)
-
-# Save as an image file
-plt.savefig(os.path.join(save_fig_directory, f"{csv_prefix}_relative_energy_vs_p_zoom.pdf"), format='pdf', dpi=300)
-plt.close()
-
-# Plot energy convergence over iterations for each number_l and number_p
-plt.figure(figsize=(10, 6))
-
-for i, number_l in enumerate(number_l_list):
-    for number_p in number_p_list:
-        pattern = os.path.join(directory, f"{csv_prefix}_l{number_l:02}_p{number_p}_*.csv")
-        files = glob.glob(pattern)
-        if files:
-            latest_file = max(files, key=os.path.getmtime)
-            print(latest_file)
-            df = pd.read_csv(latest_file)
-            if 'energy' in df.columns:
-                iterations = df['iter']
-                energy_real_values = df['energy']
-                
-                plt.plot(iterations, energy_real_values, 
-                         marker=markers[i % len(markers)], linestyle=linestyles[i % len(linestyles)], 
-                         label=f'L = {number_l}, p = {number_p}')
-
-# Add the exact solution line
-if csv_prefix == "afm-heisenberg-matrix":
-    for number_l in number_l_list:
-        exact_energy, _ = get_exact_expectation_afm_heisenberg_lattice( rows_list[0],int(number_l / rows_list[0]), periodic)
-        plt.axhline(y=exact_energy, color='r', linestyle='--', label=f'Exact solution L = {number_l}')
-
-if csv_prefix == "afm-heisenberg-lattice":
-    for number_l in number_l_list:
-        exact_energy, _ = get_exact_expectation_afm_heisenberg_lattice( rows_list[0],int(number_l / rows_list[0]), periodic)
-        plt.axhline(y=exact_energy, color='r', linestyle='--', label=f'Exact solution L = {number_l}')
-        
-elif csv_prefix == "afm-heisenberg":
-    for number_l in number_l_list:
-        exact_energy, _ = get_exact_expectation_afm_heisenberg(number_l, periodic)
-        plt.axhline(y=exact_energy, color='r', linestyle='--', label=f'Exact solution L = {number_l}')
-
-plt.tick_params(axis='both', labelsize=16)
-plt.xlabel('Iteration', fontsize=20)
-plt.ylabel('Energy', fontsize=20)
-plt.title(f'Energy convergence \n {rows_list[0]}x{int(number_l / rows_list[0])} Heisenberg model {BC}')
-plt.legend(fontsize=10)
-plt.grid(True)
-
-# Save as an image file
-plt.savefig(os.path.join(save_fig_directory, f"{csv_prefix}_energy_iteration.pdf"), format='pdf', dpi=300)
-plt.close()
\ No newline at end of file
+                energy_value = energies[len(energies) - 1]
+            energy_per_length_values[run['number_p']] = energy_value / spec['exact_energies'][number_l]
+
+        plt.plot(list(energy_per_length_values.keys()), list(energy_per_length_values.values()),
+                 marker=markers[i % len(markers)], linestyle=linestyles[i % len(linestyles)], label=f'L = {number_l}')
+
+    plt.tick_params(axis='both', labelsize=16)
+    plt.xlabel('$p$', fontsize=20)
+    plt.ylabel('$E$/$E_{exact}$', fontsize=20)
+    if spec['zoom']:
+        plt.ylim(0.9, 1.0)
+        plt.title(f"Relative energy vs. p-number\n{spec['csv_prefix']}, limited y-axis", fontsize=16)
+    else:
+        plt.title(f"Relative energy vs. p-number\n{spec['csv_prefix']}", fontsize=16)
+    plt.legend(fontsize=10)
+    plt.grid(True)
+
+    # Save as an image file
+    plt.savefig(spec['path'], format='pdf', dpi=300)
+    plt.close()
+
+def render_energy_iteration(spec):
+    """Plot energy convergence over iterations for each number_l and number_p."""
+    plt.figure(figsize=(10, 6))
+
+    for run in spec['runs']:
+        iterations, energy_real_values = load_energies(run)
+        if energy_real_values is None:
+            continue
+        i = spec['number_l_list'].index(run['number_l'])
+        plt.plot(iterations, energy_real_values,
+                 marker=markers[i % len(markers)], linestyle=linestyles[i % len(linestyles)],
+                 label=f"L = {run['number_l']}, p = {run['number_p']}")
+
+    # Add the exact solution line
+    for number_l in spec['number_l_list']:
+        plt.axhline(y=spec['exact_energies'][number_l], color='r', linestyle='--', label=f'Exact solution L = {number_l}')
+
+    number_l = spec['number_l_list'][-1]
+    plt.tick_params(axis='both', labelsize=16)
+    plt.xlabel('Iteration', fontsize=20)
+    plt.ylabel('Energy', fontsize=20)
+    plt.title(f"Energy convergence \n {spec['rows']}x{int(number_l / spec['rows'])} Heisenberg model {spec['BC']}")
+    plt.legend(fontsize=10)
+    plt.grid(True)
+
+    # Save as an image file
+    plt.savefig(spec['path'], format='pdf', dpi=300)
+    plt.close()
+
+RENDERERS = {
+    'relative_energy': render_relative_energy,
+    'energy_iteration': render_energy_iteration,
+}
+
+def render(spec):
+    """Worker entry point: render one figure and return its name."""
+    RENDERERS[spec['kind']](spec)
+    return spec['name']
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def main(argv=None):
+    """
+    Render the figures of one or more graphics TOML files.
+
+    Figures whose inputs (spec and result files, by content hash) are unchanged since the
+    last render are skipped; the remaining ones are rendered in parallel worker processes.
+    `--figure NAME` re-renders only the named figure(s), regardless of their hash.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('configs', nargs='*', default=[os.path.join(script_dir, 'graphics.toml')], help='graphics TOML files')
+    parser.add_argument('--figure', action='append', default=[], help='name of a figure to regenerate on demand (repeatable)')
+    parser.add_argument('--force', action='store_true', help='re-render every figure even if its inputs are unchanged')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of render processes')
+    args = parser.parse_args(argv)
+
+    specs = []
+    for config_path in args.configs:
+        settings = read_config(config_path)
+        if not os.path.exists(settings['save_fig_directory']):
+            os.makedirs(settings['save_fig_directory'])
+            print(f"Directory {settings['save_fig_directory']} created.")
+        runs, exact_energies = collect_runs(settings)
+        specs.extend(figure_specs(settings, runs, exact_energies))
+
+    if args.figure:
+        unknown = set(args.figure) - {spec['name'] for spec in specs}
+        if unknown:
+            parser.error(f"unknown figure(s): {', '.join(sorted(unknown))}")
+        specs = [spec for spec in specs if spec['name'] in args.figure]
+
+    manifests = {}
+    pending = []
+    for spec in specs:
+        directory = os.path.dirname(spec['path'])
+        manifest = manifests.setdefault(directory, read_manifest(directory))
+        spec_hash = input_hash(spec)
+        if not (args.force or args.figure) and manifest.get(spec['name']) == spec_hash and os.path.exists(spec['path']):
+            print(f"{spec['name']}: unchanged, skipped")
+            continue
+        pending.append((spec, spec_hash))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max(1, min(args.workers, len(pending)))) as executor:
+            for (spec, spec_hash), name in zip(pending, executor.map(render, [spec for spec, _ in pending])):
+                manifests[os.path.dirname(spec['path'])][spec['name']] = spec_hash
+                print(f"{name}: rendered {spec['path']}")
+
+    for directory, manifest in manifests.items():
+        write_manifest(directory, manifest)
+
+if __name__ == '__main__':
+    main()
@@ -3,10 +3,19 @@ import shutil
 import datetime
 import time
 from functools import partial
+from contextlib import nullcontext
 import tomllib
+import multiprocessing as mp
 import numpy as np  
 from expectation import get_expectation_afm_heisenberg_matrix, AFMHeisenbergMatrixArgs
-from optimization import optimize_by_lbfgsb
+from catalog import ResultsCatalog, register_from_history
+from exact_expectation import load_exact_ground_state, get_exact_energy
+from stopping import StoppingCriteria
+from optimization import optimize_by_lbfgsb_multistart, OPTIMIZERS, POOLED_OPTIMIZERS
+from landscape import landscape_initial_points, landscape_cache_path
+from observables import measure_observables, save_observables
+from kernels import warm_up
+from result_cache import ResultCache, result_key
 
 def main():  # Main function
     output_file_prefix = "afm-heisenberg-matrix"  # Prefix for output files
@@ -21,6 +30,20 @@ def main():  # Main function
     p_list = config[output_file_prefix]["p_list"]
     boundary_condition = config[output_file_prefix]["boundary_condition"]
     results_dir_path = config[output_file_prefix]["results_dir_path"]    
+    catalog_path = config[output_file_prefix].get("catalog_path", ".results/catalog.sqlite")
+    precision = config[output_file_prefix].get("precision", "single")  # "single" (default: qsim, complex64), "double" (cirq, complex128, tight tolerances) or "mixed"
+    n_starts = config[output_file_prefix].get("n_starts", 1)  # > 1 enables multi-start with successive halving
+    initialization = config[output_file_prefix].get("initialization", "random")  # "random" or "structured"
+    optimizer_name = config[output_file_prefix].get("optimizer", "lbfgsb")  # see OPTIMIZERS in optimization.py
+    track_fidelity = config[output_file_prefix].get("track_fidelity", False)  # log fidelity and relative error per iteration
+    max_exact_qubits = config[output_file_prefix].get("max_exact_qubits", 20)  # largest geometry diagonalized for references
+    qsimh_option = config[output_file_prefix].get("qsimh_option")  # e.g. {prefix_gates = 2}: qsimh, cut between column blocks
+    memmap_option = config[output_file_prefix].get("memmap_option")  # e.g. {path = "/nvme/tmp", block_qubits = 24}: out-of-core state vector
+    blocked_option = config[output_file_prefix].get("blocked_option")  # e.g. {block_qubits = 16}: cache-blocked in-house kernels instead of qsim
+    landscape_resolution = config[output_file_prefix].get("landscape_resolution", 0)  # > 0 starts from the best points of a landscape scan
+    measure = config[output_file_prefix].get("measure_observables", False)  # save correlations, staggered magnetization and energy variance
+    result_cache_dir = config[output_file_prefix].get("result_cache")  # e.g. ".results/cache": reuse the outputs of identical finished jobs
+    seed = config[output_file_prefix].get("seed", 0 if result_cache_dir else None)  # seeds the random initial parameters and multi-start points of every job
 
     # Set boundary condition: Periodic (PBC) or Open (OBC)
     if boundary_condition == "PBC":
@@ -47,7 +70,17 @@ def main():  # Main function
     ymdhms = now.strftime('%Y-%m-%d_%H-%M-%S')  # Current time formatted as a string
     
     start_time = time.time()  # Start timing the execution
+
+    # Compile the numba kernels (if installed) before any pool is created, so workers do not recompile
+    warm_up()
     
+    catalog = ResultsCatalog(catalog_path)
+    boundary_name = "PBC" if periodic else "OBC"
+    result_cache = ResultCache(result_cache_dir) if result_cache_dir else None
+    # Pool batching the gradient evaluations of the first-order optimizers, shared by all jobs; not with
+    # qsimh, which runs its prefix paths in a pool of its own, nor with the out-of-core state vector
+    gradient_pool = mp.Pool() if optimizer_name in POOLED_OPTIMIZERS and qsimh_option is None and memmap_option is None else None
+
     print('Running Scipy optimizer')
     # Loop over values of p
     for p in p_list:
@@ -61,34 +94,108 @@ def main():  # Main function
         cols = cols_list[0]
         length = rows * cols  # Calculate total length
         
+        job_start_time = time.time()
         qsim_option = {'t': int(length / 2), 'f': 1}  # Set simulation options
+
         csvpath = os.path.join(results_dir_path, '{}_l{:02}_p{}_{}.csv'.format(output_file_prefix, length, p, ymdhms))
         tomlpath = os.path.join(results_dir_path, '{}_l{:02}_p{}_{}.toml'.format(output_file_prefix, length, p, ymdhms))
 
+        # Reuse the outputs of an identical finished job (same inputs, settings and code) instead of recomputing it
+        # (looked up before the landscape scan: the key holds the starts before the scan, whose settings it includes)
+        if result_cache is not None:
+            cache_key = result_key(output_file_prefix, rows, cols, boundary_name, p, np.concatenate([initial_gamma, initial_beta, initial_phi, initial_theta]),
+                                   optimizer_name, config[output_file_prefix])
+            if result_cache.restore(cache_key, os.path.splitext(csvpath)[0]) is not None:
+                print(f"p={p}: reusing the cached result {cache_key[:12]}")
+                register_from_history(catalog, output_file_prefix, rows, cols, p, boundary_name, ymdhms, csvpath,
+                                      elapsed=time.time() - job_start_time)
+                continue
+
+        # This job's start; the scan below may replace it, but not the per-p initial parameters (and cache key) of the next job
+        gamma, beta, phi, theta = initial_gamma, initial_beta, initial_phi, initial_theta
+
+        # Informed starts: the best points of a (cached) scan over constant schedules replace the 0.6 folklore
+        landscape_points = []
+        if landscape_resolution:
+            scan_precision = "double" if precision == "double" else "single"
+            scan_args = AFMHeisenbergMatrixArgs(rows, cols, periodic, qsim_option, precision=scan_precision, qsimh_option=qsimh_option,
+                                                memmap_option=memmap_option, blocked_option=blocked_option)
+            # Out of core, the scan runs serially here: every pool worker would map a state file of its own
+            with mp.Pool() if memmap_option is None else nullcontext() as pool:
+                landscape_points = landscape_initial_points(
+                    partial(get_expectation_afm_heisenberg_matrix, function_args=scan_args), parameters=4, p=p,
+                    n_points=n_starts, resolution=landscape_resolution, pool=pool,
+                    cache_path=landscape_cache_path(output_file_prefix, rows, cols, periodic, p, landscape_resolution, scan_precision))
+            gamma, beta, phi, theta = np.split(landscape_points[0], 4)
+
         # Write parameters to a TOML file
         with open(tomlpath, mode='a') as f:
             f.write("length       ={}x{}\n".format(rows, cols))
             f.write("p            ={}\n".format(p))
-            f.write("initial_gamma={}\n".format("[" + ", ".join(str(value) for value in initial_gamma.tolist()) + "]"))
-            f.write("initial_beta ={}\n".format("[" + ", ".join(str(value) for value in initial_beta.tolist()) + "]"))
-            f.write("initial_phi  ={}\n".format("[" + ", ".join(str(value) for value in initial_phi.tolist()) + "]"))
-            f.write("initial_theta={}\n".format("[" + ", ".join(str(value) for value in initial_theta.tolist()) + "]"))
+            f.write("initial_gamma={}\n".format("[" + ", ".join(str(value) for value in gamma.tolist()) + "]"))
+            f.write("initial_beta ={}\n".format("[" + ", ".join(str(value) for value in beta.tolist()) + "]"))
+            f.write("initial_phi  ={}\n".format("[" + ", ".join(str(value) for value in phi.tolist()) + "]"))
+            f.write("initial_theta={}\n".format("[" + ", ".join(str(value) for value in theta.tolist()) + "]"))
         
-        # Create function arguments
-        function_args = AFMHeisenbergMatrixArgs(rows, cols, periodic, qsim_option)
-
-        # Perform optimization using Scipy's L-BFGS-B algorithm
-        gamma, beta, phi, theta = optimize_by_lbfgsb(
-            function=partial(get_expectation_afm_heisenberg_matrix, function_args=function_args),
-            initial_gamma=initial_gamma,
-            initial_beta=initial_beta,
-            initial_phi=initial_phi,
-            initial_theta=initial_theta,
-            bounds=None,
-            parameters=4,
-            print_results=True,
-            filepath=csvpath)
+        # Single precision only resolves the energy to ~1e-7, so "mixed" refines the single-precision
+        # optimum in double precision
+        stages = ["single", "double"] if precision == "mixed" else [precision]
+        # Exact reference for fidelity tracking, diagonalized once per geometry and cached
+        exact_energy, exact_state = load_exact_ground_state(output_file_prefix, rows, cols, periodic) if track_fidelity else (None, None)
+        # Reference for target-accuracy stopping: the exact energy, from the catalog or diagonalized once
+        def reference_energy():
+            if exact_energy is not None:
+                return exact_energy
+            compute = (lambda: get_exact_energy(output_file_prefix, rows, cols, periodic)) if rows * cols <= max_exact_qubits else None
+            return catalog.exact_energy(output_file_prefix, rows, cols, boundary_name, compute=compute)
+        for stage in stages:
+            stage_csvpath = csvpath if stage == stages[-1] else csvpath.replace('.csv', f'_{stage}.csv')
+            # Create function arguments
+            function_args = AFMHeisenbergMatrixArgs(rows, cols, periodic, qsim_option, precision=stage, qsimh_option=qsimh_option,
+                                                    memmap_option=memmap_option, blocked_option=blocked_option)
+
+            # Early-stopping rules of this run, if any are configured
+            stopping = StoppingCriteria.from_config(config[output_file_prefix], reference_energy)
+
+            # Perform optimization (L-BFGS-B by default); multi-start L-BFGS-B with pruning in the first stage if requested
+            if n_starts > 1 and stage == stages[0]:
+                optimizer = partial(optimize_by_lbfgsb_multistart, n_starts=n_starts, initialization=initialization,
+                                    initial_points=landscape_points[1:],
+                                    seed=None if seed is None else [seed, rows, cols, p])
+            else:
+                optimizer = OPTIMIZERS[optimizer_name]
+                if gradient_pool is not None:
+                    optimizer = partial(optimizer, pool=gradient_pool)
+            gamma, beta, phi, theta = optimizer(
+                function=partial(get_expectation_afm_heisenberg_matrix, function_args=function_args),
+                initial_gamma=gamma,
+                initial_beta=beta,
+                initial_phi=phi,
+                initial_theta=theta,
+                bounds=None,
+                parameters=4,
+                print_results=True,
+                filepath=stage_csvpath,
+                precision=stage,
+                exact_energy=exact_energy,
+                exact_state=exact_state,
+                stopping=stopping)
+
+        # Spin correlations, staggered magnetization and energy variance of the optimized state, from one simulation
+        if measure and qsimh_option is None and memmap_option is None:
+            _, state = get_expectation_afm_heisenberg_matrix(function_args, gamma, beta, phi, theta, return_state=True)
+            save_observables(csvpath.replace('.csv', '_observables.json'), measure_observables(state, rows, cols, periodic))
+
+        # Register the finished run in the results catalog
+        register_from_history(catalog, output_file_prefix, rows, cols, p, boundary_name, ymdhms, csvpath,
+                              elapsed=time.time() - job_start_time)
+        if result_cache is not None:
+            result_cache.put(cache_key, os.path.splitext(csvpath)[0])
                 
+    if gradient_pool is not None:
+        gradient_pool.close()
+        gradient_pool.join()
+    catalog.close()
     end_time = time.time()  # End timing the execution
     elapsed_time = end_time - start_time  # Calculate elapsed time
 
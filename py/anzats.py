@@ -1,10 +1,161 @@
 import cirq
-import openfermion as of
 import numpy as np
-import datetime
-import matplotlib.pyplot as plt
+from functools import lru_cache
 from numpy import pi as Pi
 
+BOND_SETS = ("gamma", "beta", "phi", "theta")  # Parameter sets in the order their layers are applied
+
+def heisenberg_gate(angle):
+    """
+    Fused Heisenberg bond gate exp(-i angle (XX + YY + ZZ)), one MatrixGate instead of three gates.
+
+    The matrix is the product XX**t YY**t ZZ**t with t = -2 angle / pi (the three commute), so
+    the circuits are identical, including the global phase, to the unfused construction.
+
+    Args:
+        angle (float): Angle of the layer.
+
+    Returns:
+        cirq.MatrixGate: Two-qubit gate.
+    """
+    t = -angle * 2 / Pi
+    return cirq.MatrixGate(cirq.unitary(cirq.XX ** t) @ cirq.unitary(cirq.YY ** t) @ cirq.unitary(cirq.ZZ ** t))
+
+def pack_moments(operations):
+    """
+    Pack operations into as few moments as possible without reordering operations that share a qubit.
+
+    Every operation goes into the moment after the last one touching any of its qubits. For a
+    list of bonds this is a greedy edge colouring, each moment being a matching.
+
+    Args:
+        operations (list): cirq operations, or tuples of qubits (e.g. bonds of (row, col) pairs).
+
+    Returns:
+        List[list]: The operations of every moment.
+    """
+    moments, last = [], {}
+    for operation in operations:
+        qubits = operation.qubits if isinstance(operation, cirq.Operation) else operation
+        index = max(last.get(qubit, -1) for qubit in qubits) + 1
+        if index == len(moments):
+            moments.append([])
+        moments[index].append(operation)
+        for qubit in qubits:
+            last[qubit] = index
+    return moments
+
+@lru_cache(maxsize=None)
+def brick_layers(rows, cols, periodic=True, parameters=3):
+    """
+    Edge colouring of the bonds of every parameter set, precomputed once per geometry.
+
+    The bonds are those of the unfused ansatz classes: gamma and beta couple even and odd
+    columns to their right neighbour, phi and theta even and odd rows to the row below. A chain
+    is the single row of a 1 x length lattice.
+
+    Args:
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        periodic (bool): If True, periodic boundary conditions are used.
+        parameters (int): Number of parameter sets (2, 3, or 4).
+
+    Returns:
+        tuple: Per parameter set, its moments, each a list of ((row, col), (row, col)) bonds on disjoint qubits.
+    """
+    edge = 0 if periodic else 1
+    bonds = {
+        "gamma": lambda: [((i, j), (i, (j + 1) % cols)) for i in range(rows) for j in range(0, cols, 2)],
+        "beta": lambda: [((i, j), (i, (j + 1) % cols)) for i in range(rows) for j in range(1, cols - edge, 2)],
+        "phi": lambda: [((i, j), ((i + 1) % rows, j)) for i in range(0, rows, 2) for j in range(cols)],
+        "theta": lambda: [((i, j), ((i + 1) % rows, j)) for i in range(1, rows - edge, 2) for j in range(cols)],
+    }
+    return tuple(pack_moments(bonds[name]()) for name in BOND_SETS[:parameters])
+
+@lru_cache(maxsize=8)
+def dimer_product_state(rows, cols, dtype=np.complex64):
+    """
+    The state prepared by the ansatz's first layer, built analytically once per geometry.
+
+    H and Y on the even and X on the odd qubit of a dimer, then CNOT, map |00> to the singlet
+    -i (|01> - |10>) / sqrt(2). The dimers (row, 2k), (row, 2k + 1) are neighbours in cirq's
+    row-major qubit order, so the state is the Kronecker product of one singlet per dimer.
+
+    The returned array is cached and read-only; simulators copy it into their own buffer.
+
+    Args:
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain); must be even, since with
+            an odd number of columns the last dimer wraps around and overlaps the first.
+        dtype (type): np.complex64 for qsim, np.complex128 for cirq.Simulator in double precision.
+
+    Returns:
+        np.ndarray: State vector of 2^(rows * cols) amplitudes.
+    """
+    if cols % 2:
+        raise ValueError(f"The dimers of {cols} columns overlap, the product state needs an even number of columns.")
+    dimer = np.array([0, 1, -1, 0], dtype=dtype) * dtype(-1j / np.sqrt(2))
+    state = np.ones(1, dtype=dtype)
+    for _ in range(rows * cols // 2):
+        state = np.kron(state, dimer)
+    state.setflags(write=False)
+    return state
+
+def layered_heisenberg_circuit(qubit, rows, cols, periodic, schedules, prepare=True):
+    """
+    Ansatz circuit built moment by moment, one moment per brick layer of fused Heisenberg gates.
+
+    The singlet preparation (H and Y on the even, X on the odd column, then CNOT) is packed
+    into three moments, and every layer of every parameter set is a single moment of
+    `heisenberg_gate`s (two for odd periodic geometries, whose bonds overlap). This keeps gates
+    on neighbouring pairs aligned, which is what qsim's gate fuser works on.
+
+    Args:
+        qubit (callable): Maps (row, col) to the cirq qubit.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        periodic (bool): If True, periodic boundary conditions are used.
+        schedules (list): Angles of every parameter set, in the order of `BOND_SETS`.
+        prepare (bool): If False, the singlet preparation is left out, for simulations starting
+            from `dimer_product_state`.
+
+    Returns:
+        cirq.Circuit: The circuit.
+    """
+    preparation = []
+    for i in range(rows) if prepare else []:
+        for j in range(0, cols, 2):
+            first, second = qubit(i, j), qubit(i, (j + 1) % cols)
+            preparation += [cirq.H(first), cirq.Y(first), cirq.X(second), cirq.CNOT(first, second)]
+    moments = [cirq.Moment(operations) for operations in pack_moments(preparation)]
+
+    layers = brick_layers(rows, cols, periodic, len(schedules))
+    for index in range(len(schedules[0])):
+        for set_moments, angles in zip(layers, schedules):
+            gate = heisenberg_gate(angles[index])
+            moments += [cirq.Moment(gate.on(qubit(*a), qubit(*b)) for a, b in bonds) for bonds in set_moments]
+    return cirq.Circuit(moments)
+
+def circuit_metrics(circuit):
+    """
+    Depth and gate counts of a circuit.
+
+    Args:
+        circuit (cirq.Circuit): The circuit.
+
+    Returns:
+        dict: `depth` (moments), `two_qubit_depth` (moments with a two-qubit gate), `operations`,
+            `one_qubit_gates` and `two_qubit_gates`.
+    """
+    operations = list(circuit.all_operations())
+    return {
+        "depth": len(circuit),
+        "two_qubit_depth": sum(any(len(op.qubits) == 2 for op in moment) for moment in circuit),
+        "operations": len(operations),
+        "one_qubit_gates": sum(len(op.qubits) == 1 for op in operations),
+        "two_qubit_gates": sum(len(op.qubits) == 2 for op in operations),
+    }
+
 class AnzatsAFMHeisenberg():
     """
     Class to construct and represent an ansatz for the AFM Heisenberg model on a 1D chain.
@@ -15,7 +166,7 @@ class AnzatsAFMHeisenberg():
         gamma (np.ndarray): Array of gamma parameters for the circuit.
         beta (np.ndarray): Array of beta parameters for the circuit.
     """
-    def __init__(self, length, gamma, beta, periodic=True):
+    def __init__(self, length, gamma, beta, periodic=True, layered=False, prepare=True):
         """
         Initialize the AFM Heisenberg ansatz circuit for a 1D chain.
         
@@ -24,6 +175,10 @@ class AnzatsAFMHeisenberg():
             gamma (np.ndarray): Array of gamma parameters.
             beta (np.ndarray): Array of beta parameters.
             periodic (bool): If True, periodic boundary conditions (PBC) are used; otherwise, open boundary conditions (OBC).
+            layered (bool): If True, the circuit is built from fused Heisenberg gates, one moment per brick
+                layer (see `layered_heisenberg_circuit`); needs numeric parameters.
+            prepare (bool): If False, the singlet preparation is left out, for simulations starting from
+                `dimer_product_state`.
         """
         
         edge = 0 if periodic else 1  # Edge = 0 for PBC and edge = 1 for OBC
@@ -32,34 +187,47 @@ class AnzatsAFMHeisenberg():
         circuit = cirq.Circuit()
         qubits = cirq.LineQubit.range(length)
 
-        # Create the initial circuit with Hadamard, Y, X, and CNOT gates
-        # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
-        for i in range(0, length, 2):
-            circuit.append(cirq.H(qubits[i]))
-            circuit.append(cirq.Y(qubits[i]))
-            circuit.append(cirq.X(qubits[i+1]))
-            circuit.append(cirq.CNOT(qubits[i], qubits[i+1]))
-
-        # Add correlation gates XX, YY, ZZ
-        for index in range(len(gamma)):
-            # Add gamma circuit, first AFM Hamiltonian
-            for i in range(0, length, 2):
-                circuit.append(cirq.XX(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
-                circuit.append(cirq.YY(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
-                circuit.append(cirq.ZZ(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
+        if layered:
+            # One moment per brick layer of fused Heisenberg gates
+            circuit = layered_heisenberg_circuit(lambda row, col: qubits[col], 1, length, periodic, [gamma, beta], prepare)
+        else:
+            # Create the initial circuit with Hadamard, Y, X, and CNOT gates
+            # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
+            for i in range(0, length, 2) if prepare else []:
+                circuit.append(cirq.H(qubits[i]))
+                circuit.append(cirq.Y(qubits[i]))
+                circuit.append(cirq.X(qubits[i+1]))
+                circuit.append(cirq.CNOT(qubits[i], qubits[i+1]))
+
+            # Add correlation gates XX, YY, ZZ
+            for index in range(len(gamma)):
+                # Add gamma circuit, first AFM Hamiltonian
+                for i in range(0, length, 2):
+                    circuit.append(cirq.XX(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
+                    circuit.append(cirq.YY(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
+                    circuit.append(cirq.ZZ(qubits[i], qubits[(i+1)]) ** (-gamma[index]*2/Pi))
                 
-            # Add beta circuit, second AFM Hamiltonian
-            for i in range(1, length-edge, 2):
-                right_neighbor = (i + 1) % length  # Modulus operation sets (i+1) = 0 if i+1 > length, only applicable for PBC
-                circuit.append(cirq.XX(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
-                circuit.append(cirq.YY(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
-                circuit.append(cirq.ZZ(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
+                # Add beta circuit, second AFM Hamiltonian
+                for i in range(1, length-edge, 2):
+                    right_neighbor = (i + 1) % length  # Modulus operation sets (i+1) = 0 if i+1 > length, only applicable for PBC
+                    circuit.append(cirq.XX(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
+                    circuit.append(cirq.YY(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
+                    circuit.append(cirq.ZZ(qubits[i], qubits[right_neighbor]) ** (-beta[index]*2/Pi))
 
         self.circuit = circuit
         self.qubits = qubits
         self.gamma = gamma
         self.beta = beta
 
+    def metrics(self):
+        """
+        Depth and gate counts of the circuit, see `circuit_metrics`.
+
+        Returns:
+            dict: The metrics.
+        """
+        return circuit_metrics(self.circuit)
+
     def circuit_to_latex_using_qcircuit(self):
         """
         Convert the circuit to LaTeX format using QCircuit.
@@ -82,7 +250,7 @@ class AnzatsAFMHeisenbergLattice():
         beta (np.ndarray): Array of beta parameters for the circuit.
         phi (np.ndarray): Array of phi parameters for the circuit.
     """
-    def __init__(self, rows, cols, gamma, beta, phi, periodic=True):
+    def __init__(self, rows, cols, gamma, beta, phi, periodic=True, layered=False, prepare=True):
         """
         Initialize the AFM Heisenberg ansatz circuit for a 2D lattice.
         
@@ -93,6 +261,10 @@ class AnzatsAFMHeisenbergLattice():
             beta (np.ndarray): Array of beta parameters.
             phi (np.ndarray): Array of phi parameters.
             periodic (bool): If True, periodic boundary conditions (PBC) are used; otherwise, open boundary conditions (OBC).
+            layered (bool): If True, the circuit is built from fused Heisenberg gates, one moment per brick
+                layer (see `layered_heisenberg_circuit`); needs numeric parameters.
+            prepare (bool): If False, the singlet preparation is left out, for simulations starting from
+                `dimer_product_state`.
         """
         
         edge = 0 if periodic else 1  # Edge = 0 for PBC and edge = 1 for OBC
@@ -101,40 +273,44 @@ class AnzatsAFMHeisenbergLattice():
         circuit = cirq.Circuit()
         qubits = [cirq.GridQubit(row, col) for row in range(rows) for col in range(cols)]  # Create grid of qubits
 
-        # Create the initial circuit with Hadamard, Y, X, and CNOT gates
-        # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
-        for i in range(rows):        
-            for j in range(0, cols, 2):
-                circuit.append(cirq.H(cirq.GridQubit(i, j)))
-                circuit.append(cirq.Y(cirq.GridQubit(i, j)))
-                circuit.append(cirq.X(cirq.GridQubit(i, (j + 1) % cols)))
-                circuit.append(cirq.CNOT(cirq.GridQubit(i, j), cirq.GridQubit(i, (j + 1) % cols)))
-        
-        # Add correlation gates XX, YY, ZZ
-        for index in range(gamma.size):
-            # Add gamma circuit
-            for i in range(rows):
+        if layered:
+            # One moment per brick layer of fused Heisenberg gates
+            circuit = layered_heisenberg_circuit(cirq.GridQubit, rows, cols, periodic, [gamma, beta, phi], prepare)
+        else:
+            # Create the initial circuit with Hadamard, Y, X, and CNOT gates
+            # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
+            for i in range(rows) if prepare else []:
                 for j in range(0, cols, 2):
-                    right_neighbor = (j + 1) % cols # Modulus operation sets index = 0 if index > cols, only applicable for PBC
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                    circuit.append(cirq.H(cirq.GridQubit(i, j)))
+                    circuit.append(cirq.Y(cirq.GridQubit(i, j)))
+                    circuit.append(cirq.X(cirq.GridQubit(i, (j + 1) % cols)))
+                    circuit.append(cirq.CNOT(cirq.GridQubit(i, j), cirq.GridQubit(i, (j + 1) % cols)))
+        
+            # Add correlation gates XX, YY, ZZ
+            for index in range(gamma.size):
+                # Add gamma circuit
+                for i in range(rows):
+                    for j in range(0, cols, 2):
+                        right_neighbor = (j + 1) % cols # Modulus operation sets index = 0 if index > cols, only applicable for PBC
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
             
-            # Add beta circuit
-            for i in range(rows):
-                for j in range(1, cols - edge, 2):
-                    right_neighbor = (j + 1) % cols
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-
-            # Add phi circuit
-            for i in range(0, rows, 2):
-                for j in range(cols):
-                    bottom_neighbor = (i + 1) % rows
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+                # Add beta circuit
+                for i in range(rows):
+                    for j in range(1, cols - edge, 2):
+                        right_neighbor = (j + 1) % cols
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+
+                # Add phi circuit
+                for i in range(0, rows, 2):
+                    for j in range(cols):
+                        bottom_neighbor = (i + 1) % rows
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
 
         # Store circuit, qubits, gamma, beta, and phi parameters
         self.circuit = circuit
@@ -143,6 +319,15 @@ class AnzatsAFMHeisenbergLattice():
         self.beta = beta
         self.phi = phi
 
+    def metrics(self):
+        """
+        Depth and gate counts of the circuit, see `circuit_metrics`.
+
+        Returns:
+            dict: The metrics.
+        """
+        return circuit_metrics(self.circuit)
+
     def circuit_to_latex_using_qcircuit(self):
         """
         Convert the circuit to LaTeX format using QCircuit.
@@ -160,13 +345,13 @@ class AnzatsAFMHeisenbergMatrix():
     
     Attributes:
         circuit (cirq.Circuit): The quantum circuit for the ansatz.
-        qubits (List[cirq.LineQubit]): List of qubits used in the circuit.
+        qubits (List[cirq.GridQubit]): List of qubits used in the circuit, in row-major order.
         gamma (np.ndarray): Array of gamma parameters for the circuit.
         beta (np.ndarray): Array of beta parameters for the circuit.
         phi (np.ndarray): Array of phi parameters for the circuit.
         theta (np.ndarray): Array of theta parameters for the circuit.
     """
-    def __init__(self, rows, cols, gamma, beta, phi, theta, periodic=True):
+    def __init__(self, rows, cols, gamma, beta, phi, theta, periodic=True, layered=False, prepare=True):
         """
         Initialize the AFM Heisenberg ansatz circuit for a matrix (2D lattice).
         
@@ -178,56 +363,64 @@ class AnzatsAFMHeisenbergMatrix():
             phi (np.ndarray): Array of phi parameters.
             theta (np.ndarray): Array of theta parameters.
             periodic (bool): If True, periodic boundary conditions (PBC) are used; otherwise, open boundary conditions (OBC).
+            layered (bool): If True, the circuit is built from fused Heisenberg gates, one moment per brick
+                layer (see `layered_heisenberg_circuit`); needs numeric parameters.
+            prepare (bool): If False, the singlet preparation is left out, for simulations starting from
+                `dimer_product_state`.
         """
         
         edge = 0 if periodic else 1  # Edge = 0 for PBC and edge = 1 for OBC
         
         # Initialize circuit and qubits
         circuit = cirq.Circuit()
-        qubits = cirq.LineQubit.range(rows * cols)
-        
-        # Create the initial circuit with Hadamard, Y, X, and CNOT gates
-        # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
-        for i in range(rows):        
-            for j in range(0, cols, 2):
-                circuit.append(cirq.H(cirq.GridQubit(i, j)))
-                circuit.append(cirq.Y(cirq.GridQubit(i, j)))
-                circuit.append(cirq.X(cirq.GridQubit(i, (j + 1) % cols)))
-                circuit.append(cirq.CNOT(cirq.GridQubit(i, j), cirq.GridQubit(i, (j + 1) % cols)))
-        
-         # Add correlation gates XX, YY, ZZ
-        for index in range(gamma.size):
-            # Add gamma circuit
-            for i in range(rows):
+        qubits = [cirq.GridQubit(row, col) for row in range(rows) for col in range(cols)]  # Create grid of qubits
+        
+        if layered:
+            # One moment per brick layer of fused Heisenberg gates
+            circuit = layered_heisenberg_circuit(cirq.GridQubit, rows, cols, periodic, [gamma, beta, phi, theta], prepare)
+        else:
+            # Create the initial circuit with Hadamard, Y, X, and CNOT gates
+            # Even qubits get H + Y-gates and odd qubits get X-gates, CNOT gates between for correlation
+            for i in range(rows) if prepare else []:
                 for j in range(0, cols, 2):
-                    right_neighbor = (j + 1) % cols  # Modulus operation sets index = 0 if index > cols, only applicable for PBC
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                    circuit.append(cirq.H(cirq.GridQubit(i, j)))
+                    circuit.append(cirq.Y(cirq.GridQubit(i, j)))
+                    circuit.append(cirq.X(cirq.GridQubit(i, (j + 1) % cols)))
+                    circuit.append(cirq.CNOT(cirq.GridQubit(i, j), cirq.GridQubit(i, (j + 1) % cols)))
+        
+             # Add correlation gates XX, YY, ZZ
+            for index in range(gamma.size):
+                # Add gamma circuit
+                for i in range(rows):
+                    for j in range(0, cols, 2):
+                        right_neighbor = (j + 1) % cols  # Modulus operation sets index = 0 if index > cols, only applicable for PBC
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-gamma[index] * 2 / Pi))
             
-            # Add beta circuit
-            for i in range(rows):
-                for j in range(1, cols - edge, 2):
-                    right_neighbor = (j + 1) % cols
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
-
-            # Add phi circuit
-            for i in range(0, rows, 2):
-                for j in range(cols):
-                    bottom_neighbor = (i + 1) % rows
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
-
-            # Add theta circuit
-            for i in range(1, rows - edge, 2):
-                for j in range(cols):
-                    bottom_neighbor = (i + 1) % rows
-                    circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
-                    circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
-                    circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
+                # Add beta circuit
+                for i in range(rows):
+                    for j in range(1, cols - edge, 2):
+                        right_neighbor = (j + 1) % cols
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(i, right_neighbor)) ** (-beta[index] * 2 / Pi))
+
+                # Add phi circuit
+                for i in range(0, rows, 2):
+                    for j in range(cols):
+                        bottom_neighbor = (i + 1) % rows
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-phi[index] * 2 / Pi))
+
+                # Add theta circuit
+                for i in range(1, rows - edge, 2):
+                    for j in range(cols):
+                        bottom_neighbor = (i + 1) % rows
+                        circuit.append(cirq.XX(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
+                        circuit.append(cirq.YY(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
+                        circuit.append(cirq.ZZ(cirq.GridQubit(i, j), cirq.GridQubit(bottom_neighbor, j)) ** (-theta[index] * 2 / Pi))
                 
         # Store circuit, qubits, gamma, beta, phi and theta parameters
         self.circuit = circuit
@@ -237,6 +430,15 @@ class AnzatsAFMHeisenbergMatrix():
         self.phi = phi
         self.theta = theta
         
+    def metrics(self):
+        """
+        Depth and gate counts of the circuit, see `circuit_metrics`.
+
+        Returns:
+            dict: The metrics.
+        """
+        return circuit_metrics(self.circuit)
+
     def circuit_to_latex_using_qcircuit(self):
         """
         Convert the circuit to LaTeX format using QCircuit.
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cirq
+from anzats import AnzatsAFMHeisenbergLattice
+
+def simulation_time(simulator, circuit, repeats=5):
+    """Median wall-clock time of `simulator.simulate(circuit)` in seconds, after one warm-up run."""
+    simulator.simulate(circuit)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        simulator.simulate(circuit)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def main(argv=None):
+    """
+    Compare the gate-by-gate and the layered (fused, moment-packed) lattice ansatz under qsim.
+
+        python benchmarks/ansatz_fusion.py --geometries 3x4 4x4 4x5 --p 4
+
+    Prints the circuit metrics of both constructions, their simulation times and the largest
+    difference of the state vectors. Falls back to cirq.Simulator if qsimcirq is not installed.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--geometries', nargs='+', default=['2x4', '4x4', '4x5'], help='rows x cols')
+    parser.add_argument('--p', type=int, default=4, help='number of layers')
+    parser.add_argument('--fuse', type=int, default=1, help="qsim option 'f' (maximum fused gate size)")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--obc', action='store_true', help='open instead of periodic boundary conditions')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"{'geometry':<10}{'construction':<14}{'depth':>7}{'2q depth':>10}{'2q gates':>10}{'time':>12}{'max |diff|':>12}")
+    for geometry in args.geometries:
+        rows, cols = map(int, geometry.split('x'))
+        try:
+            import qsimcirq
+            simulator = qsimcirq.QSimSimulator({'t': max(1, rows * cols // 2), 'f': args.fuse})
+        except ImportError:
+            simulator = cirq.Simulator(dtype=np.complex64)
+        gamma, beta, phi = rng.uniform(0, 1, (3, args.p))
+
+        vectors = {}
+        for name, layered in (("gate-by-gate", False), ("layered", True)):
+            anzats = AnzatsAFMHeisenbergLattice(rows, cols, gamma, beta, phi, periodic=not args.obc, layered=layered)
+            metrics = anzats.metrics()
+            seconds = simulation_time(simulator, anzats.circuit, args.repeats)
+            vectors[name] = simulator.simulate(anzats.circuit).state_vector()
+            difference = np.max(np.abs(vectors[name] - vectors["gate-by-gate"]))
+            print(f"{geometry:<10}{name:<14}{metrics['depth']:>7}{metrics['two_qubit_depth']:>10}"
+                  f"{metrics['two_qubit_gates']:>10}{seconds * 1e3:>10.2f}ms{difference:>12.1e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from anzats import AnzatsAFMHeisenbergLattice
+from statevector import circuit_moments, circuit_layout, plan_passes, plan_qubit_order, simulate_blocked
+
+def simulation_time(circuit, qubits, blocked_option, repeats=3):
+    """Median wall-clock time of `simulate_blocked` in seconds (after one warm-up run, which also plans the qubit order) and its state."""
+    vector = simulate_blocked(circuit, qubits, blocked_option=blocked_option)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        simulate_blocked(circuit, qubits, blocked_option=blocked_option)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), vector
+
+def main(argv=None):
+    """
+    Compare unblocked and cache-blocked application of the lattice ansatz in the in-house kernels.
+
+        python benchmarks/blocked_kernels.py --geometries 4x5 4x6 --p 4 --block-qubits 12 14 16
+
+    "unblocked" applies every gate to the whole state (block_qubits = n). The blocked rows
+    apply the gates of a pass to one cache-sized group of blocks at a time, with and without
+    the planned qubit order. "traffic" is the state read and written per simulation, one sweep
+    per gate unblocked and one per pass blocked, the memory-bandwidth cost the blocking saves.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--geometries', nargs='+', default=['4x5', '4x6'], help='rows x cols')
+    parser.add_argument('--p', type=int, default=4, help='number of layers')
+    parser.add_argument('--block-qubits', nargs='+', type=int, default=[12, 14, 16])
+    parser.add_argument('--max-high-qubits', type=int, default=2)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"{'geometry':<10}{'kernel':<22}{'sweeps':>8}{'traffic':>12}{'time':>12}{'max |diff|':>12}")
+    for geometry in args.geometries:
+        rows, cols = map(int, geometry.split('x'))
+        n_qubits = rows * cols
+        gamma, beta, phi = rng.uniform(0, 1, (3, args.p))
+        anzats = AnzatsAFMHeisenbergLattice(rows, cols, gamma, beta, phi)
+        moments = circuit_moments(anzats.circuit, anzats.qubits)
+        state_bytes = 2 ** n_qubits * np.dtype(np.complex64).itemsize
+
+        kernels = [("unblocked", {'block_qubits': n_qubits, 'reorder': False})]
+        for block_qubits in args.block_qubits:
+            for reorder in (False, True):
+                kernels.append((f"blocked {block_qubits}{' reordered' if reorder else ''}",
+                                {'block_qubits': block_qubits, 'max_high_qubits': args.max_high_qubits, 'reorder': reorder}))
+
+        reference = None
+        for name, option in kernels:
+            block_qubits = min(option['block_qubits'], n_qubits)
+            order = range(n_qubits)
+            if option['reorder']:
+                order = plan_qubit_order(circuit_layout(moments), n_qubits, block_qubits, args.max_high_qubits)
+            positioned = [[(unitary, [order[q] for q in targets]) for unitary, targets in moment] for moment in moments]
+            sweeps = sum(map(len, moments)) if block_qubits == n_qubits else len(plan_passes(positioned, n_qubits, block_qubits, args.max_high_qubits))
+            seconds, vector = simulation_time(anzats.circuit, anzats.qubits, option, args.repeats)
+            reference = vector if reference is None else reference
+            print(f"{geometry:<10}{name:<22}{sweeps:>8}{2 * sweeps * state_bytes / 2 ** 30:>10.2f}GB"
+                  f"{seconds:>11.2f}s{np.max(np.abs(vector - reference)):>12.1e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+import numpy as np
+
+PY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules every pool worker or short CLI invocation imports
+MODULES = ["stopping", "gradient", "history", "catalog", "work_queue", "cost_model", "optimization", "landscape", "sweep",
+           "anzats", "kernels", "qsimh_expectation", "statevector", "expectation", "exact_expectation"]
+
+def import_time(module, repeats=5):
+    """
+    Wall-clock time of `import module` in a fresh interpreter, minus the interpreter start-up.
+
+    Args:
+        module (str): Module in py/.
+        repeats (int): Number of fresh interpreters; the median is reported.
+
+    Returns:
+        float: Median import time in seconds, or None if the import fails (e.g. a missing dependency).
+    """
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-c", f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"],
+                                cwd=PY_DIR, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return float(np.median(times))
+
+def heaviest_imports(module, n=10):
+    """
+    Top-level packages that dominate `import module`, from `python -X importtime`.
+
+    Args:
+        module (str): Module in py/.
+        n (int): Number of packages listed.
+
+    Returns:
+        List[Tuple[str, float]]: (package, cumulative seconds), heaviest first.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PY_DIR, capture_output=True, text=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| *(\S+)", line)
+        if match and "." not in match.group(2) and match.group(2) != module:  # Packages, wherever first imported
+            packages[match.group(2)] = int(match.group(1)) * 1e-6
+    return sorted(packages.items(), key=lambda item: -item[1])[:n]
+
+def main(argv=None):
+    """
+    Measure the import time of the py/ modules, e.g. to check that workers start quickly.
+
+        python benchmarks/import_time.py
+        python benchmarks/import_time.py --breakdown optimization
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeats', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--breakdown', metavar='MODULE', help='list the heaviest imports of MODULE instead')
+    args = parser.parse_args(argv)
+
+    if args.breakdown:
+        for package, seconds in heaviest_imports(args.breakdown):
+            print(f"{package:<30}{seconds * 1e3:10.1f} ms")
+        return
+
+    start = time.time()
+    print(f"{'module':<20}{'import time':>14}")
+    for module in args.modules:
+        seconds = import_time(module, args.repeats)
+        print(f"{module:<20}{'unavailable' if seconds is None else f'{seconds * 1e3:.1f} ms':>14}")
+    print(f"({time.time() - start:.1f} s in total, median of {args.repeats} fresh interpreters)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import os
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    boundary TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    final_energy REAL,
+    best_energy REAL,
+    exact_energy REAL,
+    best_params TEXT,
+    n_iter INTEGER,
+    elapsed REAL,
+    csv_path TEXT,
+    history_path TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_lookup ON runs (model, rows, cols, p, boundary, timestamp);
+CREATE TABLE IF NOT EXISTS exact_energies (
+    model TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    boundary TEXT NOT NULL,
+    energy REAL NOT NULL,
+    PRIMARY KEY (model, rows, cols, boundary)
+);
+"""
+
+class ResultsCatalog:
+    """
+    SQLite index of finished optimization runs.
+
+    Sweep drivers register every (model, geometry, p) job when it finishes, together with
+    its final energy, best parameters and the exact reference energy. Plotting and analysis
+    then query only the rows they need instead of globbing and re-reading result files.
+    A 1D chain of length L is stored as rows = 1, cols = L.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+    """
+    def __init__(self, path):
+        """
+        Open (and create if needed) the catalog database.
+
+        Args:
+            path (str): Path of the SQLite database file.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.executescript(SCHEMA)
+        # Catalogs created before best_energy was added
+        columns = [row["name"] for row in self._connection.execute("PRAGMA table_info(runs)")]
+        if "best_energy" not in columns:
+            with self._connection:
+                self._connection.execute("ALTER TABLE runs ADD COLUMN best_energy REAL")
+
+    def register_run(self, model, rows, cols, p, boundary, timestamp, final_energy, best_params,
+                     exact_energy=None, n_iter=None, elapsed=None, csv_path="", history_path="", best_energy=None):
+        """
+        Record a finished run.
+
+        Args:
+            model (str): Model name, i.e. the driver's output file prefix.
+            rows (int): Number of rows (1 for a chain).
+            cols (int): Number of columns (the chain length for a chain).
+            p (int): Number of ansatz layers.
+            boundary (str): "PBC" or "OBC".
+            timestamp (str): Timestamp of the sweep, as used in the result file names.
+            final_energy (float): Last recorded energy of the run, as in the last row of its CSV.
+            best_params (array-like): Optimized, flattened parameter vector.
+            exact_energy (float, optional): Exact ground-state energy of the geometry.
+            n_iter (int, optional): Number of optimizer iterations.
+            elapsed (float, optional): Wall time of the run in seconds.
+            csv_path (str): Path of the CSV file of the run.
+            history_path (str): Path of the history store of the run.
+            best_energy (float, optional): Lowest energy recorded during the run.
+
+        Returns:
+            int: Row id of the run.
+        """
+        with self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO runs (model, rows, cols, p, boundary, timestamp, final_energy, best_energy, exact_energy, "
+                "best_params, n_iter, elapsed, csv_path, history_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (model, int(rows), int(cols), int(p), boundary, timestamp,
+                 None if final_energy is None else float(final_energy),
+                 None if best_energy is None else float(best_energy),
+                 None if exact_energy is None else float(exact_energy),
+                 json.dumps([float(value) for value in best_params]),
+                 n_iter, elapsed,
+                 os.path.abspath(csv_path) if csv_path else "",
+                 os.path.abspath(history_path) if history_path else ""))
+        if exact_energy is not None:
+            self.store_exact_energy(model, rows, cols, boundary, exact_energy)
+        return cursor.lastrowid
+
+    def store_exact_energy(self, model, rows, cols, boundary, energy):
+        """Cache the exact ground-state energy of a geometry."""
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO exact_energies (model, rows, cols, boundary, energy) VALUES (?, ?, ?, ?, ?)",
+                (model, int(rows), int(cols), boundary, float(energy)))
+
+    def exact_energy(self, model, rows, cols, boundary, compute=None):
+        """
+        Return the cached exact energy of a geometry, computing and storing it on a miss.
+
+        Args:
+            model (str): Model name.
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            boundary (str): "PBC" or "OBC".
+            compute (callable, optional): Called without arguments on a cache miss; returns the energy.
+
+        Returns:
+            float or None: Exact energy, or None if it is not cached and `compute` is None.
+        """
+        row = self._connection.execute(
+            "SELECT energy FROM exact_energies WHERE model = ? AND rows = ? AND cols = ? AND boundary = ?",
+            (model, int(rows), int(cols), boundary)).fetchone()
+        if row is not None:
+            return row["energy"]
+        if compute is None:
+            return None
+        energy = float(compute())
+        self.store_exact_energy(model, rows, cols, boundary, energy)
+        return energy
+
+    def latest_runs(self, model, rows, cols, boundary, p_list=None):
+        """
+        Return the most recent run of each p for a geometry.
+
+        Args:
+            model (str): Model name.
+            rows (int): Number of rows.
+            cols (int): Number of columns.
+            boundary (str): "PBC" or "OBC".
+            p_list (List[int], optional): Restrict the result to these p values.
+
+        Returns:
+            dict: p to run row (`sqlite3.Row`), ordered by p.
+        """
+        query = (
+            "SELECT r.* FROM runs r JOIN ("
+            "  SELECT p, MAX(timestamp) AS latest FROM runs"
+            "  WHERE model = ? AND rows = ? AND cols = ? AND boundary = ? GROUP BY p"
+            ") l ON r.p = l.p AND r.timestamp = l.latest "
+            "WHERE r.model = ? AND r.rows = ? AND r.cols = ? AND r.boundary = ?")
+        key = (model, int(rows), int(cols), boundary)
+        runs = {}
+        for row in self._connection.execute(query + " ORDER BY r.p, r.id", key + key):
+            if p_list is None or row["p"] in p_list:
+                runs[row["p"]] = row
+        return runs
+
+    def query(self, sql, parameters=()):
+        """Run an arbitrary read query against the catalog, e.g. for aggregate statistics."""
+        return self._connection.execute(sql, parameters).fetchall()
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def register_from_history(catalog, model, rows, cols, p, boundary, timestamp, csv_path, elapsed=None, max_exact_qubits=20):
+    """
+    Register a finished run, reading its final state from the history store.
+
+    `final_energy` is the last recorded energy, which is what the CSV-based plots read;
+    `best_energy` and `best_params` are those of the lowest recorded energy.
+
+    The exact reference is taken from the catalog, or computed once by exact diagonalization
+    when the geometry has at most `max_exact_qubits` qubits.
+
+    Args:
+        catalog (ResultsCatalog): Catalog to register into.
+        model (str): Model name.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns.
+        p (int): Number of ansatz layers.
+        boundary (str): "PBC" or "OBC".
+        timestamp (str): Timestamp of the sweep.
+        csv_path (str): Path of the CSV file of the run.
+        elapsed (float, optional): Wall time of the run in seconds.
+        max_exact_qubits (int): Largest geometry for which the exact energy is computed.
+
+    Returns:
+        int: Row id of the run.
+    """
+    from history import history_path_for, load_history
+
+    history_path = history_path_for(csv_path)
+    history = load_history(history_path)
+    n_iter = len(history["energy"])
+    if n_iter:
+        best = int(history["energy"].argmin())
+        final_energy = float(history["energy"][-1])
+        best_energy = float(history["energy"][best])
+        best_params = history["params"][best]
+    else:
+        final_energy, best_energy, best_params = None, None, []
+
+    def compute_exact():
+        from exact_expectation import get_exact_energy
+        return get_exact_energy(model, rows, cols, periodic=(boundary == "PBC"))
+
+    exact_energy = catalog.exact_energy(model, rows, cols, boundary,
+                                        compute=compute_exact if rows * cols <= max_exact_qubits else None)
+
+    return catalog.register_run(model, rows, cols, p, boundary, timestamp, final_energy, best_params,
+                                exact_energy=exact_energy, n_iter=n_iter, elapsed=elapsed,
+                                csv_path=csv_path, history_path=history_path, best_energy=best_energy)
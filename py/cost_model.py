@@ -0,0 +1,200 @@
+import os
+import math
+import heapq
+import numpy as np
+from hamiltonian import chain_bonds, lattice_bonds
+
+AMPLITUDE_BYTES = {"single": 8, "double": 16, "mixed": 16}
+
+# Bytes per amplitude of a qsimh block (its bitstrings and their bond-flipped partners) held by a
+# process: the int64 bitstrings and partners, the complex128 sums, and the block's list handed to qsimh
+QSIMH_BLOCK_BYTES = 72
+
+def job_size(model, rows, cols, p, periodic=True):
+    """
+    The cost feature of a job, 2^N x p x bonds: one simulation sweeps 2^N amplitudes once per
+    gate (p x bonds of them) and the energy once per bond.
+
+    Args:
+        model (str): Model name; "afm-heisenberg" is the chain.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        p (int): Number of ansatz layers.
+        periodic (bool): If True, periodic boundary conditions are used.
+
+    Returns:
+        float: The feature.
+    """
+    bonds = chain_bonds(cols, periodic) if model == "afm-heisenberg" else lattice_bonds(rows, cols, periodic)
+    return float(2 ** (rows * cols) * p * len(bonds))
+
+class CostModel:
+    """
+    Runtime and memory estimates of sweep jobs.
+
+    The runtime is a power law a * size^c of `job_size`, fitted per model in log space to the
+    elapsed times of finished runs (so small and large jobs weigh alike); the exponent absorbs
+    the growth of the number of optimizer iterations with p. Models with fewer than two
+    distinct sizes use the fit of all models, and without any history the default
+    coefficients. The memory is the interpreter plus what the job's simulation mode holds
+    (see `memory`): `state_copies` state vectors in the job's precision (the simulator's, the
+    returned vector and the reduction temporaries), one more with the cache-blocked kernels,
+    only blocks of the state out of core, and only blocks of the S_z = 0 sector with qsimh.
+
+    Attributes:
+        coefficients (dict): Model (or None for all models) to (a, c).
+        state_copies (float): State vectors held at once by a job.
+        base_memory (float): Bytes of the interpreter and the imported packages.
+    """
+    DEFAULT = (1e-6, 1.0)
+
+    def __init__(self, coefficients=None, state_copies=4.0, base_memory=300e6):
+        """
+        Args:
+            coefficients (dict, optional): Model (or None) to (a, c); see `fit`.
+            state_copies (float): State vectors held at once by a job.
+            base_memory (float): Bytes of the interpreter and the imported packages.
+        """
+        self.coefficients = dict(coefficients or {})
+        self.state_copies = state_copies
+        self.base_memory = base_memory
+
+    @staticmethod
+    def _fit(sizes, elapsed):
+        sizes, elapsed = np.log(sizes), np.log(elapsed)
+        if len(set(sizes.tolist())) < 2:
+            return None
+        slope, _ = np.polyfit(sizes, elapsed, 1)
+        slope = float(np.clip(slope, 0.5, 2.0))  # Keep extrapolations to larger lattices sane
+        return float(np.exp(np.mean(elapsed - slope * sizes))), slope
+
+    @classmethod
+    def fit(cls, records, **kwargs):
+        """
+        Fit the runtime of every model to finished runs.
+
+        Args:
+            records (iterable): (model, rows, cols, p, periodic, elapsed seconds) of finished runs.
+            **kwargs: `state_copies` and `base_memory`.
+
+        Returns:
+            CostModel: The fitted model.
+        """
+        by_model = {}
+        for model, rows, cols, p, periodic, elapsed in records:
+            if elapsed and elapsed > 0:
+                by_model.setdefault(model, []).append((job_size(model, rows, cols, p, periodic), elapsed))
+        coefficients = {}
+        pooled = [record for model_records in by_model.values() for record in model_records]
+        if pooled:
+            coefficients[None] = cls._fit(*map(np.array, zip(*pooled)))
+        for model, model_records in by_model.items():
+            coefficients[model] = cls._fit(*map(np.array, zip(*model_records)))
+        return cls({model: value for model, value in coefficients.items() if value is not None}, **kwargs)
+
+    @classmethod
+    def from_catalog(cls, catalog, **kwargs):
+        """
+        Fit to the elapsed times of the runs registered in a `ResultsCatalog`.
+
+        Jobs restored from the result cache are registered with the time of the copy, so only
+        the longest run of every configuration is used.
+
+        Returns:
+            CostModel: The fitted model.
+        """
+        rows = catalog.query("SELECT model, rows, cols, p, boundary, MAX(elapsed) AS elapsed FROM runs WHERE elapsed > 0 "
+                             "GROUP BY model, rows, cols, p, boundary")
+        return cls.fit(((row["model"], row["rows"], row["cols"], row["p"], row["boundary"] == "PBC", row["elapsed"]) for row in rows), **kwargs)
+
+    def runtime(self, job):
+        """
+        Estimated seconds of a job.
+
+        Args:
+            job (dict): With `model`, `rows`, `cols`, `p` and `periodic`, e.g. from `sweep.sweep_jobs`.
+
+        Returns:
+            float: The estimate.
+        """
+        a, c = self.coefficients.get(job["model"], self.coefficients.get(None, self.DEFAULT))
+        return a * job_size(job["model"], job["rows"], job["cols"], job["p"], job.get("periodic", True)) ** c
+
+    def memory(self, job):
+        """
+        Estimated peak bytes of a job.
+
+        The simulation mode is read from the job's `settings` (the driver's TOML section):
+        - `memmap_option`: the state is in a file; in memory are `state_copies` groups of the
+          2^max_high_qubits blocks updated together (the page cache is not counted).
+        - `qsimh_option`: the coordinating process and each of its `processes` hold the
+          amplitudes of one block of the S_z = 0 sector and its bond-flipped partners (at most
+          block_size x (bonds + 1), and never more than the sector), the processes also the two
+          half-lattice state vectors.
+        - `blocked_option`: the blocked kernels permute the state into their qubit order and
+          back, one state vector more than the simulators.
+
+        Args:
+            job (dict): With `rows`, `cols` and optionally `model`, `periodic`, `precision` and `settings`.
+
+        Returns:
+            float: The estimate.
+        """
+        amplitude_bytes = AMPLITUDE_BYTES.get(job.get("precision", "single"), 16)
+        settings = job.get("settings") or {}
+        n_qubits = job["rows"] * job["cols"]
+        if settings.get("qsimh_option") is not None:
+            option = settings["qsimh_option"]
+            processes = option.get("processes", os.cpu_count() or 1)
+            bonds = lattice_bonds(job["rows"], job["cols"], job.get("periodic", True))
+            block = min(option.get("block_size", 2 ** 16) * (len(bonds) + 1), math.comb(n_qubits, n_qubits // 2))
+            halves = 2 * 2 ** ((n_qubits + 1) // 2) * AMPLITUDE_BYTES["single"]  # qsim simulates the halves in complex64
+            return self.base_memory + (processes + 1) * block * QSIMH_BLOCK_BYTES + processes * halves
+        if settings.get("memmap_option") is not None:
+            option = settings["memmap_option"]
+            group_qubits = min(n_qubits, option.get("block_qubits", 22) + option.get("max_high_qubits", 2))
+            return self.base_memory + self.state_copies * 2 ** group_qubits * amplitude_bytes
+        copies = self.state_copies + 1 if settings.get("blocked_option") is not None else self.state_copies
+        return self.base_memory + copies * 2 ** n_qubits * amplitude_bytes
+
+def simulate_schedule(jobs, workers, memory_budget=None, longest_first=True):
+    """
+    Simulate list scheduling of jobs on identical workers that share one memory budget.
+
+    Whenever a worker is idle it takes the first job in priority order (the longest first,
+    or submission order) whose memory fits next to the running jobs; a job larger than the
+    budget runs alone. This is the policy of `WorkQueue.claim` with `memory_budget`.
+
+    Args:
+        jobs (list): (job id, estimated seconds, estimated bytes).
+        workers (int): Number of workers.
+        memory_budget (float, optional): Bytes available to the workers together; unlimited if None.
+        longest_first (bool): If False, jobs are taken in submission order instead.
+
+    Returns:
+        tuple: (makespan in seconds, list of (job id, start, end)).
+    """
+    pending = sorted(jobs, key=lambda job: -job[1]) if longest_first else list(jobs)
+    running = []  # heap of (end, job id, bytes)
+    now, schedule = 0.0, []
+    while pending or running:
+        used = sum(job[2] for job in running)
+        started = False
+        if len(running) < workers:
+            for index, (job_id, seconds, memory) in enumerate(pending):
+                if memory_budget is None or used + memory <= memory_budget or not running:
+                    pending.pop(index)
+                    heapq.heappush(running, (now + seconds, job_id, memory))
+                    schedule.append((job_id, now, now + seconds))
+                    started = True
+                    break
+        if not started:
+            now, _, _ = heapq.heappop(running)
+    return max((end for _, _, end in schedule), default=0.0), schedule
+
+def physical_memory():
+    """Bytes of RAM of this host, or None where `os.sysconf` does not report it."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
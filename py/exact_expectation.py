@@ -1,6 +1,6 @@
-import cirq
-import openfermion as of
+import os
 import numpy as np
+from hamiltonian import heisenberg_hamiltonian
 from itertools import product
 
 def run_exact_expectation_state(file_prefix, length, width, periodic=True):
@@ -13,55 +13,62 @@ def run_exact_expectation_state(file_prefix, length, width, periodic=True):
     except ValueError:
         print("input a correct file_prefix: {}".format(file_prefix))
 
-def get_exact_expectation_afm_heisenberg(length, periodic=True):
-    # open boundary
-    ham = of.ops.QubitOperator()
+def get_exact_energy(model, rows, cols, periodic=True):
+    """Exact ground-state energy of a driver model on a rows x cols geometry (rows = 1 for a chain)."""
+    if model == 'afm-heisenberg':
+        energy, _ = get_exact_expectation_afm_heisenberg(cols, periodic)
+    elif model in ('afm-heisenberg-lattice', 'afm-heisenberg-matrix'):
+        energy, _ = get_exact_expectation_afm_heisenberg_lattice(cols, rows, periodic)
+    else:
+        raise ValueError(f"Unknown model {model}")
+    return energy
+
+def load_exact_ground_state(model, rows, cols, periodic=True, cache_dir=".results/exact_states"):
+    """
+    Exact ground state of a driver model, diagonalized once per geometry and cached on disk.
 
-    edge = 0 if periodic else 1
-    for i in range(length-edge):
-        ham += of.ops.QubitOperator(((i, "X"), ((i+1)%length, "X")))
-        ham += of.ops.QubitOperator(((i, "Y"), ((i+1)%length, "Y")))
-        ham += of.ops.QubitOperator(((i, "Z"), ((i+1)%length, "Z")))
+    The state is in cirq's qubit order (LineQubit i, or GridQubit(row, col) at index
+    row * cols + col, most significant first), so it can be overlapped directly with the
+    state vectors of the simulators.
 
-    sparse_ham = of.linalg.get_sparse_operator(ham)
-    # sparse_ham = of.linalg.generate_linear_qubit_operator(ham)
+    Args:
+        model (str): Model name, i.e. the driver's output file prefix.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        periodic (bool): If True, periodic boundary conditions are used.
+        cache_dir (str): Directory of the cached `.npz` files.
 
-    energy, state = of.linalg.get_ground_state(
-        sparse_ham, initial_guess=None
-    )
+    Returns:
+        tuple: (energy, state vector as complex128).
+    """
+    boundary = "PBC" if periodic else "OBC"
+    path = os.path.join(cache_dir, f"{model}_r{rows}c{cols}_{boundary}.npz")
+    if os.path.exists(path):
+        cached = np.load(path)
+        return float(cached["energy"]), cached["state"]
+
+    if model == 'afm-heisenberg':
+        energy, state = get_exact_expectation_afm_heisenberg(cols, periodic)
+    elif model in ('afm-heisenberg-lattice', 'afm-heisenberg-matrix'):
+        # The lattice Hamiltonian indexes qubit (row, col) as row * cols + col when called as (cols, rows)
+        energy, state = get_exact_expectation_afm_heisenberg_lattice(cols, rows, periodic)
+    else:
+        raise ValueError(f"Unknown model {model}")
+    state = np.asarray(state, dtype=np.complex128).ravel()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path + ".tmp.npz", energy=energy, state=state)
+    os.replace(path + ".tmp.npz", path)
+    return float(energy), state
 
-    return energy, state 
+def get_exact_expectation_afm_heisenberg(length, periodic=True):
+    # Matrix-free Lanczos on the compiled sum_bonds (XX + YY + ZZ)
+    return heisenberg_hamiltonian(1, length, periodic, chain=True).ground_state()
 
 def get_exact_expectation_afm_heisenberg_lattice(rows, cols, periodic=True):
-    # open boundary
-    ham = of.ops.QubitOperator()
-
-    edge = 1-1 if periodic else 1-0
-    # row
-    for i in range(rows-edge):
-        for j in range(cols):
-            current_index = j * rows + i
-            right_neighbor = j * rows + (i + 1) % rows
-            ham += of.ops.QubitOperator(((current_index, "X"), (right_neighbor, "X")))
-            ham += of.ops.QubitOperator(((current_index, "Y"), (right_neighbor, "Y")))
-            ham += of.ops.QubitOperator(((current_index, "Z"), (right_neighbor, "Z")))
-
-    # column
-    for i in range(rows):
-        for j in range(cols-edge):
-            current_index = j * rows + i
-            down_neighbor = ((j + 1) % cols) * rows + i 
-            ham += of.ops.QubitOperator(((current_index, "X"), (down_neighbor, "X")))
-            ham += of.ops.QubitOperator(((current_index, "Y"), (down_neighbor, "Y")))
-            ham += of.ops.QubitOperator(((current_index, "Z"), (down_neighbor, "Z")))
-
-    sparse_ham = of.linalg.get_sparse_operator(ham)
-
-    energy, state = of.linalg.get_ground_state(
-        sparse_ham, initial_guess=None
-    )
-
-    return energy, state
+    # Qubit (i, j) has index j * rows + i here, i.e. this is the lattice of `cols` rows and `rows` columns
+    # in cirq's row-major order (the drivers call it as (cols, rows))
+    return heisenberg_hamiltonian(cols, rows, periodic).ground_state()
 
 def run_expectations_on_heisenberg():
     print('|rows x cols|energy|energy/L|periodic|')
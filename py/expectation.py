@@ -1,8 +1,72 @@
-import cirq
-import openfermion as of
 import numpy as np
-from anzats import AnzatsAFMHeisenberg, AnzatsAFMHeisenbergLattice, AnzatsAFMHeisenbergMatrix
-import qsimcirq
+from qsimh_expectation import get_expectation_qsimh
+from hamiltonian import heisenberg_hamiltonian
+from kernels import heisenberg_energy
+from statevector import get_expectation_memmap, simulate_blocked
+
+PRECISIONS = {"single": np.complex64, "double": np.complex128}
+
+def get_simulator(function_args):
+    """
+    Create the state-vector simulator matching the precision requested in `function_args`.
+    
+    qsim only simulates in single precision, so "double" falls back to cirq.Simulator with a
+    complex128 state vector (slower, but able to resolve energy differences below ~1e-7).
+    
+    Args:
+        function_args: Any of the `*Args` classes.
+        
+    Returns:
+        cirq.SimulatesFinalState: Simulator whose `simulate(circuit).state_vector()` is the state.
+    """
+    # cirq and qsimcirq take seconds to import, so the Args classes and the blocked kernels do without them
+    if function_args.precision == "double":
+        import cirq
+        return cirq.Simulator(dtype=np.complex128)
+    if function_args.precision != "single":
+        raise ValueError(f"Unsupported precision {function_args.precision}, use 'single' or 'double'.")
+    import qsimcirq
+    return qsimcirq.QSimSimulator(function_args.qsim_option)
+
+def get_initial_state(function_args, rows, cols):
+    """
+    State the ansatz circuit is simulated from.
+
+    With `function_args.dimer_state` the singlet product is built once per geometry by
+    `dimer_product_state`, and the ansatz leaves out its preparation gates, so no evaluation
+    re-simulates them. Geometries with an odd number of columns, whose dimers overlap, and the
+    qsimh and memmap modes, which never hold the full state in memory, start from |0...0> (None)
+    with the preparation gates in the circuit instead.
+
+    Args:
+        function_args: Any of the `*Args` classes.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+
+    Returns:
+        np.ndarray or None: Cached read-only state vector in the simulator's precision, or None.
+    """
+    if not function_args.dimer_state or cols % 2:
+        return None
+    if getattr(function_args, "qsimh_option", None) is not None or getattr(function_args, "memmap_option", None) is not None:
+        return None
+    from anzats import dimer_product_state
+    return dimer_product_state(rows, cols, PRECISIONS[function_args.precision])
+
+def overlap(vector2, vector, accumulator="double"):
+    """
+    Compute <vector2|vector>, accumulating in the requested precision.
+    
+    Args:
+        vector2 (np.ndarray): Bra state vector (conjugated).
+        vector (np.ndarray): Ket state vector.
+        accumulator (str): "single" or "double".
+        
+    Returns:
+        complex: The overlap.
+    """
+    dtype = PRECISIONS[accumulator]
+    return np.vdot(vector2.astype(dtype, copy=False), vector.astype(dtype, copy=False))
 
 class AFMHeisenbergArgs:
     """
@@ -12,14 +76,30 @@ class AFMHeisenbergArgs:
         length (int): Length of the 1D lattice.
         periodic (bool): If True, periodic boundary conditions are used.
         qsim_option (dict): Options for the qsim simulator.
+        precision (str): "single" (the default) simulates complex64 state vectors with qsim, "double" simulates
+            complex128 state vectors with cirq.Simulator.
+        accumulator (str): Precision of the energy reductions, "single" or "double";
+            defaults to "double".
+        layered (bool): If True (default), the ansatz is built from fused Heisenberg gates, one
+            moment per brick layer; False builds it gate by gate as before.
+        dimer_state (bool): If True (default), the simulation starts from the cached singlet
+            product instead of simulating its preparation gates, see `get_initial_state`.
+        blocked_option (dict, optional): If given, the state vector is simulated in memory by the
+            cache-blocked in-house kernels instead of qsim / cirq; see `simulate_blocked` for the keys.
     """
     
-    def __init__(self, length, periodic, qsim_option):
+    def __init__(self, length, periodic, qsim_option, precision="single", accumulator="double", layered=True,
+                 dimer_state=True, blocked_option=None):
         self.length = length
         self.periodic = periodic
         self.qsim_option = qsim_option
+        self.precision = precision
+        self.accumulator = accumulator
+        self.layered = layered
+        self.dimer_state = dimer_state
+        self.blocked_option = blocked_option
 
-def get_expectation_afm_heisenberg(function_args, gamma, beta):
+def get_expectation_afm_heisenberg(function_args, gamma, beta, return_state=False):
     """
     Calculate the expectation value for the AFM Heisenberg model using a quantum circuit ansatz.
     
@@ -27,55 +107,36 @@ def get_expectation_afm_heisenberg(function_args, gamma, beta):
         function_args (AFMHeisenbergArgs): Arguments for the AFM Heisenberg model.
         gamma (np.ndarray): Array of gamma parameters.
         beta (np.ndarray): Array of beta parameters.
+        return_state (bool): If True, also return the simulated ansatz state.
         
     Returns:
-        float: Real part of the calculated expectation value.
+        float: The calculated expectation value (and the state vector if `return_state`).
     """
     
     # Initialize the ansatz for the AFM Heisenberg model with given parameters
-    anzats = AnzatsAFMHeisenberg(function_args.length, gamma, beta)
+    initial_state = get_initial_state(function_args, 1, function_args.length)
+    from anzats import AnzatsAFMHeisenberg  # Imported here with cirq, see `get_simulator`
+    anzats = AnzatsAFMHeisenberg(function_args.length, gamma, beta, layered=function_args.layered,
+                                 prepare=initial_state is None)
     circuit = anzats.circuit
     qubits = anzats.qubits
 
     periodic = function_args.periodic
     length = function_args.length
-    # Initialize the quantum simulator
-    simulator = qsimcirq.QSimSimulator(function_args.qsim_option)
+    # Simulate the circuit to get the state vector, with qsim / cirq or the cache-blocked kernels
+    if function_args.blocked_option is not None:
+        vector = simulate_blocked(circuit, qubits, initial_state, function_args.blocked_option, function_args.precision)
+    else:
+        simulator = get_simulator(function_args)
+        vector = simulator.simulate(circuit, qubit_order=qubits, initial_state=initial_state).state_vector()
 
-    # Simulate the circuit to get the initial state vector
-    vector = simulator.simulate(circuit).state_vector()
+    # <psi|sum_bonds (XX + YY + ZZ)|psi>, in one JIT-compiled pass if numba is installed (see `heisenberg_energy`)
+    value = heisenberg_energy(vector, 1, length, periodic, chain=True, accumulator=function_args.accumulator)
 
-    edge = 0 if periodic else 1
-    value = 0 + 0j  # Initialize the expectation value as a complex number
-
-    # Loop through each pair of neighboring qubits
-    for i in range(length - edge):
-        right_neighbor = (i + 1) % length
-        # Create copies of the original circuit for each Pauli operator (X, Y, Z)
-        circuitX = anzats.circuit.copy()
-        circuitY = anzats.circuit.copy()
-        circuitZ = anzats.circuit.copy()
-
-        # Apply Pauli-X operators to the i-th and (i+1)-th qubits and simulate the circuit
-        circuitX.append(cirq.X(qubits[i]))
-        circuitX.append(cirq.X(qubits[right_neighbor]))
-        vector2 = simulator.simulate(circuitX).state_vector()
-        value += np.dot(vector2.conj(), vector)  # Add the overlap to the expectation value
-
-        # Apply Pauli-Y operators to the i-th and (i+1)-th qubits and simulate the circuit
-        circuitY.append(cirq.Y(qubits[i]))
-        circuitY.append(cirq.Y(qubits[right_neighbor]))
-        vector2 = simulator.simulate(circuitY).state_vector()
-        value += np.dot(vector2.conj(), vector)  # Add the overlap to the expectation value
-        
-        # Apply Pauli-Z operators to the i-th and (i+1)-th qubits and simulate the circuit
-        circuitZ.append(cirq.Z(qubits[i]))
-        circuitZ.append(cirq.Z(qubits[right_neighbor]))
-        vector2 = simulator.simulate(circuitZ).state_vector()
-        value += np.dot(vector2.conj(), vector)  # Add the overlap to the expectation value
-        
-    # Return the real part of the expectation value
-    return np.real(value)
+    # Return the expectation value
+    if return_state:
+        return value, vector
+    return value
 
 class AFMHeisenbergLatticeArgs:
     """
@@ -86,15 +147,39 @@ class AFMHeisenbergLatticeArgs:
         cols (int): Number of columns in the lattice.
         periodic (bool): If True, periodic boundary conditions are used.
         qsim_option (dict): Options for the qsim simulator.
+        precision (str): "single" (the default) simulates complex64 state vectors with qsim, "double" simulates
+            complex128 state vectors with cirq.Simulator.
+        accumulator (str): Precision of the energy reductions, "single" or "double";
+            defaults to "double".
+        qsimh_option (dict, optional): If given, the energy is computed with the hybrid
+            Schrödinger-Feynman simulator qsimh, cut between column blocks, without holding the
+            full state vector; see `get_expectation_qsimh` for the keys.
+        layered (bool): If True (default), the ansatz is built from fused Heisenberg gates, one
+            moment per brick layer; False builds it gate by gate as before (always the case with qsimh).
+        dimer_state (bool): If True (default), the simulation starts from the cached singlet
+            product instead of simulating its preparation gates, see `get_initial_state`.
+        memmap_option (dict, optional): If given, the state vector is simulated out of core in a
+            memory-mapped file, streamed in blocks, for states larger than the RAM; see
+            `get_expectation_memmap` for the keys.
+        blocked_option (dict, optional): If given, the state vector is simulated in memory by the
+            cache-blocked in-house kernels instead of qsim / cirq; see `simulate_blocked` for the keys.
     """
     
-    def __init__(self, rows, cols, periodic, qsim_option):
+    def __init__(self, rows, cols, periodic, qsim_option, precision="single", accumulator="double", qsimh_option=None,
+                 layered=True, dimer_state=True, memmap_option=None, blocked_option=None):
         self.rows = rows
         self.cols = cols
         self.periodic = periodic
         self.qsim_option = qsim_option
+        self.precision = precision
+        self.accumulator = accumulator
+        self.qsimh_option = qsimh_option
+        self.layered = layered
+        self.dimer_state = dimer_state
+        self.memmap_option = memmap_option
+        self.blocked_option = blocked_option
 
-def get_expectation_afm_heisenberg_lattice(function_args, gamma, beta, phi):
+def get_expectation_afm_heisenberg_lattice(function_args, gamma, beta, phi, return_state=False):
     """
     Calculate the expectation value for the AFM Heisenberg model on a lattice using a quantum circuit ansatz.
     
@@ -103,9 +188,10 @@ def get_expectation_afm_heisenberg_lattice(function_args, gamma, beta, phi):
         gamma (np.ndarray): Array of gamma parameters.
         beta (np.ndarray): Array of beta parameters.
         phi (np.ndarray): Array of phi parameters.
+        return_state (bool): If True, also return the simulated ansatz state.
         
     Returns:
-        float: Real part of the calculated expectation value.
+        float: The calculated expectation value (and the state vector if `return_state`).
     """
     
     # Variables from function_args
@@ -114,79 +200,41 @@ def get_expectation_afm_heisenberg_lattice(function_args, gamma, beta, phi):
     periodic = function_args.periodic
     
     # Create an instance of the AnzatsAFMHeisenbergLattice class
-    anzats = AnzatsAFMHeisenbergLattice(rows, cols, gamma, beta, phi, periodic)
+    # qsimh splits the gates crossing its cut, so it keeps the gate-by-gate construction
+    initial_state = get_initial_state(function_args, rows, cols)
+    from anzats import AnzatsAFMHeisenbergLattice  # Imported here with cirq, see `get_simulator`
+    anzats = AnzatsAFMHeisenbergLattice(rows, cols, gamma, beta, phi, periodic,
+                                        layered=function_args.layered and function_args.qsimh_option is None,
+                                        prepare=initial_state is None)
+    
+    if function_args.qsimh_option is not None:
+        if return_state:
+            raise ValueError("qsimh mode never holds the full state vector, return_state is not supported.")
+        return get_expectation_qsimh(anzats.circuit, rows, cols, periodic, function_args.qsimh_option)
+    
+    if function_args.memmap_option is not None:
+        return get_expectation_memmap(anzats.circuit, anzats.qubits, heisenberg_hamiltonian(rows, cols, periodic),
+                                      function_args.memmap_option, function_args.precision, function_args.accumulator,
+                                      return_state=return_state)
     
     # Extract the circuit and qubits from the anzats object
     circuit = anzats.circuit
     qubits = anzats.qubits
     
-    # Initialize the simulator with the provided options
-    simulator = qsimcirq.QSimSimulator(function_args.qsim_option)
+    # Simulate the circuit and get the state vector, with qsim / cirq or the cache-blocked kernels
+    if function_args.blocked_option is not None:
+        vector = simulate_blocked(circuit, qubits, initial_state, function_args.blocked_option, function_args.precision)
+    else:
+        simulator = get_simulator(function_args)
+        vector = simulator.simulate(circuit, qubit_order=qubits, initial_state=initial_state).state_vector()
     
-    # Simulate the circuit and get the state vector
-    vector = simulator.simulate(circuit).state_vector()
-    
-    edge = 0 if periodic else 1
-    value = 0 + 0j
-
-    # Calculate the expectation value for row interactions
-    for i in range(rows):
-        for j in range(cols - edge):
-            right_neighbor = (j + 1) % cols
-
-            # Create copies of the circuit for X, Y, Z operations
-            circuitX = anzats.circuit.copy()
-            circuitY = anzats.circuit.copy()
-            circuitZ = anzats.circuit.copy()
-            
-            # Append X operations and simulate
-            circuitX.append(cirq.X(cirq.GridQubit(i, j)))
-            circuitX.append(cirq.X(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitX).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Y operations and simulate
-            circuitY.append(cirq.Y(cirq.GridQubit(i, j)))
-            circuitY.append(cirq.Y(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitY).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Z operations and simulate
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, j)))
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitZ).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-    # Calculate the expectation value for column interactions
-    for i in range(rows - edge):
-        for j in range(cols):
-            bottom_neighbor = (i + 1) % rows
-
-            # Create copies of the circuit for X, Y, Z operations
-            circuitX = anzats.circuit.copy()
-            circuitY = anzats.circuit.copy()
-            circuitZ = anzats.circuit.copy()
-
-            # Append X operations and simulate
-            circuitX.append(cirq.X(cirq.GridQubit(i, j)))
-            circuitX.append(cirq.X(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitX).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Y operations and simulate
-            circuitY.append(cirq.Y(cirq.GridQubit(i, j)))
-            circuitY.append(cirq.Y(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitY).state_vector()
-            value += np.dot(vector2.conj(), vector)
+    # <psi|sum_bonds (XX + YY + ZZ)|psi>, in one JIT-compiled pass if numba is installed (see `heisenberg_energy`)
+    value = heisenberg_energy(vector, rows, cols, periodic, accumulator=function_args.accumulator)
 
-            # Append Z operations and simulate
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, j)))
-            circuitZ.append(cirq.Z(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitZ).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-    # Return the real part of the calculated value
-    return np.real(value)
+    # Return the calculated value
+    if return_state:
+        return value, vector
+    return value
 
 class AFMHeisenbergMatrixArgs:
     """
@@ -197,15 +245,39 @@ class AFMHeisenbergMatrixArgs:
         cols (int): Number of columns in the matrix.
         periodic (bool): If True, periodic boundary conditions are used.
         qsim_option (dict): Options for the qsim simulator.
+        precision (str): "single" (the default) simulates complex64 state vectors with qsim, "double" simulates
+            complex128 state vectors with cirq.Simulator.
+        accumulator (str): Precision of the energy reductions, "single" or "double";
+            defaults to "double".
+        qsimh_option (dict, optional): If given, the energy is computed with the hybrid
+            Schrödinger-Feynman simulator qsimh, cut between column blocks, without holding the
+            full state vector; see `get_expectation_qsimh` for the keys.
+        layered (bool): If True (default), the ansatz is built from fused Heisenberg gates, one
+            moment per brick layer; False builds it gate by gate as before (always the case with qsimh).
+        dimer_state (bool): If True (default), the simulation starts from the cached singlet
+            product instead of simulating its preparation gates, see `get_initial_state`.
+        memmap_option (dict, optional): If given, the state vector is simulated out of core in a
+            memory-mapped file, streamed in blocks, for states larger than the RAM; see
+            `get_expectation_memmap` for the keys.
+        blocked_option (dict, optional): If given, the state vector is simulated in memory by the
+            cache-blocked in-house kernels instead of qsim / cirq; see `simulate_blocked` for the keys.
     """
     
-    def __init__(self, rows, cols, periodic, qsim_option):
+    def __init__(self, rows, cols, periodic, qsim_option, precision="single", accumulator="double", qsimh_option=None,
+                 layered=True, dimer_state=True, memmap_option=None, blocked_option=None):
         self.rows = rows
         self.cols = cols
         self.periodic = periodic
         self.qsim_option = qsim_option
+        self.precision = precision
+        self.accumulator = accumulator
+        self.qsimh_option = qsimh_option
+        self.layered = layered
+        self.dimer_state = dimer_state
+        self.memmap_option = memmap_option
+        self.blocked_option = blocked_option
 
-def get_expectation_afm_heisenberg_matrix(function_args, gamma, beta, phi, theta):
+def get_expectation_afm_heisenberg_matrix(function_args, gamma, beta, phi, theta, return_state=False):
     """
     Calculate the expectation value for the AFM Heisenberg model on a matrix using a quantum circuit ansatz.
     
@@ -215,9 +287,10 @@ def get_expectation_afm_heisenberg_matrix(function_args, gamma, beta, phi, theta
         beta (np.ndarray): Array of beta parameters.
         phi (np.ndarray): Array of phi parameters.
         theta (np.ndarray): Array of theta parameters.
+        return_state (bool): If True, also return the simulated ansatz state.
         
     Returns:
-        float: Real part of the calculated expectation value.
+        float: The calculated expectation value (and the state vector if `return_state`).
     """
     
     # Variables from function_args
@@ -225,76 +298,38 @@ def get_expectation_afm_heisenberg_matrix(function_args, gamma, beta, phi, theta
     cols = function_args.cols
     periodic = function_args.periodic
     
-    anzats = AnzatsAFMHeisenbergMatrix(rows, cols, gamma, beta, phi, theta, periodic)
+    # qsimh splits the gates crossing its cut, so it keeps the gate-by-gate construction
+    initial_state = get_initial_state(function_args, rows, cols)
+    from anzats import AnzatsAFMHeisenbergMatrix  # Imported here with cirq, see `get_simulator`
+    anzats = AnzatsAFMHeisenbergMatrix(rows, cols, gamma, beta, phi, theta, periodic,
+                                       layered=function_args.layered and function_args.qsimh_option is None,
+                                       prepare=initial_state is None)
+    
+    if function_args.qsimh_option is not None:
+        if return_state:
+            raise ValueError("qsimh mode never holds the full state vector, return_state is not supported.")
+        return get_expectation_qsimh(anzats.circuit, rows, cols, periodic, function_args.qsimh_option)
+    
+    if function_args.memmap_option is not None:
+        return get_expectation_memmap(anzats.circuit, anzats.qubits, heisenberg_hamiltonian(rows, cols, periodic),
+                                      function_args.memmap_option, function_args.precision, function_args.accumulator,
+                                      return_state=return_state)
     
     # Extract the circuit and qubits from the anzats object
     circuit = anzats.circuit
     qubits = anzats.qubits
     
-    # Initialize the simulator with the provided options
-    simulator = qsimcirq.QSimSimulator(function_args.qsim_option)
-    
-    # Simulate the circuit and get the state vector
-    vector = simulator.simulate(circuit).state_vector()
+    # Simulate the circuit and get the state vector, with qsim / cirq or the cache-blocked kernels
+    if function_args.blocked_option is not None:
+        vector = simulate_blocked(circuit, qubits, initial_state, function_args.blocked_option, function_args.precision)
+    else:
+        simulator = get_simulator(function_args)
+        vector = simulator.simulate(circuit, qubit_order=qubits, initial_state=initial_state).state_vector()
     
-    edge = 0 if periodic else 1
-    value = 0 + 0j
-    
-    # Calculate the expectation value for row interactions
-    for i in range(rows):
-        for j in range(cols - edge):
-            right_neighbor = (j + 1) % cols
-
-            # Create copies of the circuit for X, Y, Z operations
-            circuitX = anzats.circuit.copy()
-            circuitY = anzats.circuit.copy()
-            circuitZ = anzats.circuit.copy()
-            
-            # Append X operations and simulate
-            circuitX.append(cirq.X(cirq.GridQubit(i, j)))
-            circuitX.append(cirq.X(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitX).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Y operations and simulate
-            circuitY.append(cirq.Y(cirq.GridQubit(i, j)))
-            circuitY.append(cirq.Y(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitY).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Z operations and simulate
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, j)))
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, right_neighbor)))
-            vector2 = simulator.simulate(circuitZ).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-    # Calculate the expectation value for column interactions
-    for i in range(rows - edge):
-        for j in range(cols):
-            bottom_neighbor = (i + 1) % rows
-
-            # Create copies of the circuit for X, Y, Z operations
-            circuitX = anzats.circuit.copy()
-            circuitY = anzats.circuit.copy()
-            circuitZ = anzats.circuit.copy()
-
-            # Append X operations and simulate
-            circuitX.append(cirq.X(cirq.GridQubit(i, j)))
-            circuitX.append(cirq.X(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitX).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Y operations and simulate
-            circuitY.append(cirq.Y(cirq.GridQubit(i, j)))
-            circuitY.append(cirq.Y(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitY).state_vector()
-            value += np.dot(vector2.conj(), vector)
-
-            # Append Z operations and simulate
-            circuitZ.append(cirq.Z(cirq.GridQubit(i, j)))
-            circuitZ.append(cirq.Z(cirq.GridQubit(bottom_neighbor, j)))
-            vector2 = simulator.simulate(circuitZ).state_vector()
-            value += np.dot(vector2.conj(), vector)
+    # <psi|sum_bonds (XX + YY + ZZ)|psi>, in one JIT-compiled pass if numba is installed (see `heisenberg_energy`)
+    value = heisenberg_energy(vector, rows, cols, periodic, accumulator=function_args.accumulator)
 
-    # Return the real part of the calculated value
-    return np.real(value)
\ No newline at end of file
+    # Return the calculated value
+    if return_state:
+        return value, vector
+    return value
\ No newline at end of file
@@ -0,0 +1,156 @@
+import numpy as np
+
+# Relative rounding error of an energy evaluated from a state vector of each precision; only
+# used until the noise has been measured
+RELATIVE_NOISE = {"single": 1e-6, "double": 1e-14}
+
+def estimate_noise(energy, params, samples=8, spacing=1e-6, seed=None, lower=None, upper=None):
+    """
+    Estimate the noise level of `energy` at `params` from a difference table.
+
+    `energy` is sampled at `samples` equidistant points along a random direction, so close that
+    the smooth part of the third differences is negligible; for independent noise of standard
+    deviation sigma, a third difference has variance 20 sigma^2. Components of the direction
+    that would leave the bounds are reversed, so the samples stay inside them.
+
+    Args:
+        energy (callable): Energy of a flattened parameter vector.
+        params (np.ndarray): Point to estimate the noise at.
+        samples (int): Number of evaluations (at least 4).
+        spacing (float): Distance between the sample points.
+        seed (int, optional): Seed of the random direction.
+        lower (np.ndarray, optional): Lower bound of every parameter; unbounded if None.
+        upper (np.ndarray, optional): Upper bound of every parameter; unbounded if None.
+
+    Returns:
+        float: Estimated standard deviation of the noise.
+    """
+    lower = np.full(len(params), -np.inf) if lower is None else lower
+    upper = np.full(len(params), np.inf) if upper is None else upper
+    direction = np.random.default_rng(seed).normal(size=len(params))
+    direction /= np.linalg.norm(direction)
+    reach = params + (samples - 1) * spacing * direction
+    direction = np.where((reach < lower) | (reach > upper), -direction, direction)
+    # Clipping only matters for boxes narrower than the samples' reach
+    values = np.array([np.real(energy(np.clip(params + i * spacing * direction, lower, upper))) for i in range(samples)])
+    third_differences = np.diff(values, n=3)
+    return float(np.sqrt(np.mean(third_differences ** 2) / 20))
+
+class AdaptiveGradient:
+    """
+    Central-difference gradients with per-parameter step sizes adapted to noise and curvature.
+
+    A central difference has truncation error ~ h^2 |f'''| / 6 and rounding error ~ noise / h,
+    which balance at h = (3 noise / |f'''|)^(1/3). The noise is measured once (see
+    `estimate_noise`), and the curvature of every parameter comes for free from the same
+    evaluations as the gradient, (f(x + h) - 2 f(x) + f(x - h)) / h^2, standing in for |f'''|.
+    The steps are cached and updated after every gradient, so each gradient uses the steps
+    that suited the previous one.
+
+    With `richardson`, the derivative is also taken with half the step and extrapolated,
+    (4 D(h/2) - D(h)) / 3, which cancels the h^2 error term at twice the cost.
+
+    A parameter closer than its step to a bound is differentiated one-sidedly into the box,
+    (-3 f(x) + 4 f(x + h) - f(x + 2h)) / 2h (mirrored at an upper bound), which is also
+    second order and costs the same two evaluations, so no point outside the bounds is evaluated.
+
+    Attributes:
+        steps (np.ndarray): Current step size of every parameter.
+        noise (float): Noise level of the energy, None until measured.
+        n_evals (int): Number of energy evaluations made by this object.
+    """
+    def __init__(self, energy, n, precision="double", initial_step=None, noise=None, richardson=False,
+                 min_step=1e-8, max_step=0.1, curvature_floor=1.0, pool=None, lower=None, upper=None):
+        """
+        Args:
+            energy (callable): Energy of a flattened parameter vector; must be picklable with `pool`.
+            n (int): Number of parameters.
+            precision (str): "single" or "double"; sets the initial step and the noise used until measured.
+            initial_step (float, optional): Initial step of every parameter; 1e-2 in single and 1e-4 in
+                double precision by default.
+            noise (float, optional): Known noise level; measured at the first gradient if None.
+            richardson (bool): Apply Richardson extrapolation.
+            min_step (float): Smallest step.
+            max_step (float): Largest step.
+            curvature_floor (float): Smallest derivative scale assumed; the energies are trigonometric in the
+                angles, so higher derivatives are of the order of the energy even where f'' vanishes.
+            pool (multiprocessing.Pool, optional): Pool the evaluations of a gradient are batched in.
+            lower (np.ndarray, optional): Lower bound of every parameter; unbounded if None.
+            upper (np.ndarray, optional): Upper bound of every parameter; unbounded if None.
+        """
+        if initial_step is None:
+            initial_step = 1e-2 if precision == "single" else 1e-4
+        self.energy = energy
+        self.precision = precision
+        self.steps = np.full(n, float(initial_step))
+        self.noise = noise
+        self.richardson = richardson
+        self.min_step = min_step
+        self.max_step = max_step
+        self.curvature_floor = curvature_floor
+        self.pool = pool
+        self.lower = np.full(n, -np.inf) if lower is None else np.asarray(lower, dtype=float)
+        self.upper = np.full(n, np.inf) if upper is None else np.asarray(upper, dtype=float)
+        self.n_evals = 0
+
+    def _map(self, points):
+        self.n_evals += len(points)
+        values = self.pool.map(self.energy, points) if self.pool else [self.energy(x) for x in points]
+        return np.real(np.array(values, dtype=complex))
+
+    def gradient(self, params, energy=None):
+        """
+        Gradient at `params`, updating the cached steps.
+
+        Args:
+            params (np.ndarray): Flattened parameters.
+            energy (float, optional): Energy at `params` if already known (it is needed for the curvature).
+
+        Returns:
+            np.ndarray: The gradient.
+        """
+        params = np.asarray(params, dtype=float)
+        n = len(params)
+        if self.noise is None:
+            self.noise = estimate_noise(self.energy, params, lower=self.lower, upper=self.upper)
+            self.n_evals += 8
+
+        # Sides with room for the steps: central differences evaluate x + h and x - h, one-sided ones
+        # x + h and x + 2h into the box (sign +1 at a lower bound, -1 at an upper bound)
+        sign = np.zeros(n)
+        sign[(params - self.steps < self.lower) & (params + 2 * self.steps <= self.upper)] = 1
+        sign[(params + self.steps > self.upper) & (params - 2 * self.steps >= self.lower)] = -1
+        near, far = np.where(sign == 0, 1, sign), np.where(sign == 0, -1, 2 * sign)
+        shifts = self.steps[:, None] * np.eye(n)
+        points = [params + a * shift for a, shift in zip(near, shifts)] + [params + b * shift for b, shift in zip(far, shifts)]
+        if self.richardson:
+            points += [params + a * shift / 2 for a, shift in zip(near, shifts)] + [params + b * shift / 2 for b, shift in zip(far, shifts)]
+        if energy is None:
+            points.append(params)
+        values = self._map(points)
+        center = values[-1] if energy is None else np.real(energy)
+
+        def derivative(near_values, far_values, steps):
+            central = (near_values - far_values) / (2 * steps)
+            one_sided = sign * (-3 * center + 4 * near_values - far_values) / (2 * steps)
+            return np.where(sign == 0, central, one_sided)
+
+        plus, minus = values[:n], values[n:2 * n]
+        gradient = derivative(plus, minus, self.steps)
+        if self.richardson:
+            gradient = (4 * derivative(values[2 * n:3 * n], values[3 * n:4 * n], self.steps / 2) - gradient) / 3
+
+        # Update the steps from this gradient's curvature; geometric smoothing avoids jumps
+        second_difference = np.where(sign == 0, plus - 2 * center + minus, center - 2 * plus + minus)
+        curvature = np.maximum(np.abs(second_difference) / self.steps ** 2, self.curvature_floor)
+        noise = max(self.noise, RELATIVE_NOISE[self.precision] * abs(center))
+        # Richardson's error is O(h^4), so its optimal step balances noise / h against h^4 instead
+        exponent = 1 / 5 if self.richardson else 1 / 3
+        optimal = np.clip((3 * noise / curvature) ** exponent, self.min_step, self.max_step)
+        self.steps = np.sqrt(self.steps * optimal)
+        return gradient
+
+    def __call__(self, params):
+        """Energy and gradient at `params`."""
+        energy = self._map([np.asarray(params, dtype=float)])[0]
+        return energy, self.gradient(params, energy)
@@ -0,0 +1,244 @@
+from functools import lru_cache
+import numpy as np
+
+def chain_bonds(length, periodic=True):
+    """
+    Nearest-neighbour bonds of a chain, as qubit index pairs (the bonds summed for `afm-heisenberg`).
+
+    Args:
+        length (int): Number of qubits.
+        periodic (bool): If True, periodic boundary conditions are used.
+
+    Returns:
+        List[Tuple[int, int]]: Bonds.
+    """
+    edge = 0 if periodic else 1
+    return [(i, (i + 1) % length) for i in range(length - edge)]
+
+def lattice_bonds(rows, cols, periodic=True):
+    """
+    Nearest-neighbour bonds of a rows x cols lattice, as qubit index pairs.
+
+    The bonds are exactly the ones summed for the lattice and matrix models, and a qubit's
+    index is its position in cirq's (row, col) order of GridQubits, i.e. `i * cols + j`. As in
+    the original loops, a periodic dimension of length 2 has every bond twice.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        periodic (bool): If True, periodic boundary conditions are used.
+
+    Returns:
+        List[Tuple[int, int]]: Bonds.
+    """
+    edge = 0 if periodic else 1
+    bonds = [(i * cols + j, i * cols + (j + 1) % cols) for i in range(rows) for j in range(cols - edge)]
+    bonds += [(i * cols + j, ((i + 1) % rows) * cols + j) for i in range(rows - edge) for j in range(cols)]
+    return bonds
+
+def compile_pauli_string(n_qubits, paulis):
+    """
+    Write a product of Pauli operators as i^k X^x Z^z.
+
+    X^x Z^z maps the basis state |b> to (-1)^popcount(b & z) |b ^ x>, so a Pauli string is fully
+    described by its flip mask x, its phase mask z and the power k of i. Bit `n_qubits - 1 - q`
+    stands for qubit q (cirq's big-endian order). Factors on the same qubit are multiplied out.
+
+    Args:
+        n_qubits (int): Number of qubits.
+        paulis (iterable): (qubit, 'X' | 'Y' | 'Z') factors of the product, in order.
+
+    Returns:
+        tuple: (k, x, z).
+    """
+    k, x, z = 0, 0, 0
+    for qubit, pauli in paulis:
+        bit = 1 << (n_qubits - 1 - qubit)
+        flip, phase = pauli in "XY", pauli in "YZ"
+        if pauli == "Y":
+            k += 1  # Y = i X Z
+        if flip and z & bit:
+            k += 2  # Z X = -X Z on the same qubit
+        x ^= bit if flip else 0
+        z ^= bit if phase else 0
+    return k % 4, x, z
+
+class CompiledHamiltonian:
+    """
+    A sum of Pauli strings, compiled to bit masks and applied to state vectors without matrices.
+
+    The terms are grouped by flip mask x. All terms of a group map |b> to |b ^ x>, and their
+    signs and coefficients add up to one phase tensor f_x(b), so
+
+        <psi|H|psi> = sum_x sum_b conj(psi(b ^ x)) f_x(b) psi(b),
+        (H psi)(b ^ x) = sum_x f_x(b) psi(b).
+
+    Every group is one vectorized pass over the state, viewed as a (2,) * n tensor: flipping
+    the bits of x is a reversal of those axes, and f_x only spans the axes of its phase masks
+    (broadcast over the others). The Heisenberg model has one group per bond, XX + YY, and the
+    diagonal group of all ZZ terms.
+
+    Attributes:
+        n_qubits (int): Number of qubits.
+        flip_masks (np.ndarray): Distinct flip masks, one per group.
+        phase_masks (List[np.ndarray]): Phase masks of the terms of every group.
+        coefficients (List[np.ndarray]): Complex coefficients of the terms of every group, including
+            the powers of i from the Y factors.
+    """
+    def __init__(self, n_qubits, terms):
+        """
+        Args:
+            n_qubits (int): Number of qubits.
+            terms (iterable): (coefficient, paulis) pairs, `paulis` being (qubit, 'X' | 'Y' | 'Z') factors.
+        """
+        groups = {}
+        for coefficient, paulis in terms:
+            k, x, z = compile_pauli_string(n_qubits, paulis)
+            phases = groups.setdefault(x, {})
+            phases[z] = phases.get(z, 0) + coefficient * 1j ** k
+        self.n_qubits = n_qubits
+        self.flip_masks = np.array(sorted(groups), dtype=np.int64)
+        self.phase_masks = [np.array(list(groups[x]), dtype=np.int64) for x in sorted(groups)]
+        self.coefficients = [np.array(list(groups[x].values()), dtype=np.complex128) for x in sorted(groups)]
+        self._phase_tensors = [None] * len(self.flip_masks)
+
+    @classmethod
+    def from_qubit_operator(cls, operator, n_qubits=None):
+        """
+        Compile an openfermion `QubitOperator` (or anything with its `terms` dictionary).
+
+        Args:
+            operator (openfermion.QubitOperator): The operator.
+            n_qubits (int, optional): Number of qubits; defaults to the highest index in the operator plus one.
+
+        Returns:
+            CompiledHamiltonian: The compiled operator.
+        """
+        if n_qubits is None:
+            n_qubits = 1 + max((qubit for term in operator.terms for qubit, _ in term), default=0)
+        return cls(n_qubits, [(coefficient, term) for term, coefficient in operator.terms.items()])
+
+    @classmethod
+    def from_bonds(cls, n_qubits, bonds, couplings=(1.0, 1.0, 1.0), field=(0.0, 0.0, 0.0)):
+        """
+        Compile a spin model sum_bonds J (Jx XX + Jy YY + Jz ZZ) + sum_qubits (hx X + hy Y + hz Z).
+
+        Args:
+            n_qubits (int): Number of qubits.
+            bonds (iterable): (a, b) or (a, b, J) qubit pairs; J defaults to 1, so J1-J2 models are
+                two bond lists with their own J.
+            couplings (tuple): (Jx, Jy, Jz), e.g. (1, 1, Delta) for the XXZ model.
+            field (tuple): (hx, hy, hz) applied to every qubit.
+
+        Returns:
+            CompiledHamiltonian: The compiled operator.
+        """
+        terms = []
+        for bond in bonds:
+            a, b = bond[:2]
+            weight = bond[2] if len(bond) > 2 else 1.0
+            terms += [(weight * coupling, ((a, pauli), (b, pauli))) for pauli, coupling in zip("XYZ", couplings) if coupling]
+        terms += [(strength, ((qubit, pauli),)) for qubit in range(n_qubits) for pauli, strength in zip("XYZ", field) if strength]
+        return cls(n_qubits, terms)
+
+    def _axes(self, mask):
+        """Tensor axes (qubits) of the bits set in `mask`."""
+        return tuple(q for q in range(self.n_qubits) if (int(mask) >> (self.n_qubits - 1 - q)) & 1)
+
+    def phase_tensor(self, group):
+        """
+        f_x(b) of a group, broadcastable against the (2,) * n state tensor; computed once and cached.
+
+        Args:
+            group (int): Index into `flip_masks`.
+
+        Returns:
+            np.ndarray: Real if all coefficients of the group are, complex otherwise.
+        """
+        if self._phase_tensors[group] is None:
+            coefficients = self.coefficients[group]
+            if not np.any(coefficients.imag):
+                coefficients = coefficients.real
+            tensor = np.zeros((1,) * self.n_qubits, dtype=coefficients.dtype)
+            for z, coefficient in zip(self.phase_masks[group], coefficients):
+                sign = np.ones((1,) * self.n_qubits)
+                for axis in self._axes(z):
+                    shape = [1] * self.n_qubits
+                    shape[axis] = 2
+                    sign = sign * np.array([1.0, -1.0]).reshape(shape)
+                tensor = tensor + coefficient * sign
+            self._phase_tensors[group] = tensor
+        return self._phase_tensors[group]
+
+    def expectation(self, state, accumulator="double"):
+        """
+        <psi|H|psi> of a state vector, one vectorized pass per flip mask.
+
+        Args:
+            state (np.ndarray): State vector of 2^n amplitudes in cirq's qubit order.
+            accumulator (str): "single" or "double", the precision of the reductions.
+
+        Returns:
+            float: The real part of the expectation value.
+        """
+        dtype = np.complex128 if accumulator == "double" else np.complex64
+        psi = np.asarray(state).astype(dtype, copy=False).reshape((2,) * self.n_qubits)
+        value = 0j
+        for group, x in enumerate(self.flip_masks):
+            weighted = self.phase_tensor(group) * psi
+            if x == 0:
+                value += np.vdot(psi, weighted)
+            else:
+                value += np.vdot(np.flip(psi, self._axes(x)), weighted)
+        return float(np.real(value))
+
+    def matvec(self, state):
+        """
+        H |psi> without building a matrix, e.g. for `scipy.sparse.linalg.LinearOperator`.
+
+        Args:
+            state (np.ndarray): State vector of 2^n amplitudes.
+
+        Returns:
+            np.ndarray: H |psi>, flat, complex128.
+        """
+        psi = np.asarray(state, dtype=np.complex128).reshape((2,) * self.n_qubits)
+        result = np.zeros_like(psi)
+        for group, x in enumerate(self.flip_masks):
+            weighted = self.phase_tensor(group) * psi
+            result += weighted if x == 0 else np.flip(weighted, self._axes(x))
+        return result.reshape(-1)
+
+    def ground_state(self, tol=0):
+        """
+        Lowest eigenvalue and eigenvector with ARPACK on the matrix-free `matvec`.
+
+        Args:
+            tol (float): Relative accuracy of the eigenvalue; 0 means machine precision.
+
+        Returns:
+            tuple: (energy, state vector as complex128).
+        """
+        from scipy.sparse.linalg import LinearOperator, eigsh
+
+        dimension = 2 ** self.n_qubits
+        operator = LinearOperator((dimension, dimension), matvec=self.matvec, dtype=np.complex128)
+        values, vectors = eigsh(operator, k=1, which='SA', tol=tol)
+        return float(values[0]), vectors[:, 0]
+
+@lru_cache(maxsize=None)
+def heisenberg_hamiltonian(rows, cols, periodic=True, chain=False):
+    """
+    Compiled sum_bonds (XX + YY + ZZ) of a driver geometry, cached per geometry.
+
+    Args:
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        periodic (bool): If True, periodic boundary conditions are used.
+        chain (bool): If True, the bonds are `chain_bonds(cols)`, otherwise `lattice_bonds(rows, cols)`.
+
+    Returns:
+        CompiledHamiltonian: The Hamiltonian on rows * cols qubits in cirq's qubit order.
+    """
+    bonds = chain_bonds(cols, periodic) if chain else lattice_bonds(rows, cols, periodic)
+    return CompiledHamiltonian.from_bonds(rows * cols, bonds)
@@ -0,0 +1,180 @@
+import csv
+import json
+import os
+import numpy as np
+
+SCALAR_COLUMNS = ("iter", "energy", "wall_time", "n_evals")
+
+class OptimizationHistory:
+    """
+    Columnar binary store for the iterations of an optimization run.
+
+    Every column is a `.npy` file inside the history directory, opened as a memory map and
+    preallocated `chunk_size` rows at a time. Appending an iteration is therefore a slice
+    assignment into the page cache instead of reopening and rewriting a text file.
+
+    Attributes:
+        path (str): Directory holding the column files and `meta.json`.
+        param_names (List[str]): Names of the parameter columns, e.g. `gamma[0]`.
+        columns (List[str]): Names of the scalar columns.
+        count (int): Number of iterations written so far.
+    """
+    def __init__(self, path, param_names, chunk_size=1024, flush_every=32, extra_columns=()):
+        """
+        Create a new, empty history at `path` (an existing history is overwritten).
+
+        Args:
+            path (str): Directory of the history store, conventionally `<csv stem>.history`.
+            param_names (List[str]): Names of the parameters stored per iteration.
+            chunk_size (int): Number of rows allocated whenever the store runs out of space.
+            flush_every (int): Number of appends between updates of `meta.json`.
+            extra_columns (Iterable[str]): Additional float columns besides `SCALAR_COLUMNS`.
+        """
+        self.path = path
+        self.param_names = list(param_names)
+        self.columns = list(SCALAR_COLUMNS) + [name for name in extra_columns if name not in SCALAR_COLUMNS]
+        self.chunk_size = int(chunk_size)
+        self.flush_every = int(flush_every)
+        self.count = 0
+        self.capacity = 0
+        self._arrays = {}
+
+        os.makedirs(path, exist_ok=True)
+        self._grow(self.chunk_size)
+        self.flush()
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.npy")
+
+    def _allocate(self, name, shape, dtype):
+        """Allocate a column file of the given shape, keeping the rows written so far."""
+        column_path = self._column_path(name)
+        array = np.lib.format.open_memmap(column_path + ".tmp", mode="w+", dtype=dtype, shape=shape)
+        old = self._arrays.get(name)
+        if old is not None:
+            array[:self.count] = old[:self.count]
+            del old
+        array.flush()
+        os.replace(column_path + ".tmp", column_path)
+        return array
+
+    def _grow(self, capacity):
+        n_params = len(self.param_names)
+        arrays = {}
+        for name in self.columns:
+            dtype = np.int64 if name in ("iter", "n_evals") else np.float64
+            arrays[name] = self._allocate(name, (capacity,), dtype)
+        arrays["params"] = self._allocate("params", (capacity, n_params), np.float64)
+        self._arrays = arrays
+        self.capacity = capacity
+
+    def append(self, iteration, energy, params, wall_time, n_evals, **extra):
+        """
+        Append one iteration to the store.
+
+        Args:
+            iteration (int): Iteration number.
+            energy (float): Energy at `params`.
+            params (array-like): Parameter vector of length `len(param_names)`.
+            wall_time (float): Seconds since the start of the optimization.
+            n_evals (int): Number of energy evaluations so far.
+            **extra (float): Values for the extra columns given at construction.
+        """
+        if self.count == self.capacity:
+            # Grow geometrically in whole chunks so the copy cost stays amortized
+            self._grow(self.capacity + max(self.chunk_size, self.capacity))
+
+        row = self.count
+        self._arrays["iter"][row] = iteration
+        self._arrays["energy"][row] = np.real(energy)
+        self._arrays["wall_time"][row] = wall_time
+        self._arrays["n_evals"][row] = n_evals
+        for name in self.columns[len(SCALAR_COLUMNS):]:
+            self._arrays[name][row] = extra.get(name, np.nan)
+        self._arrays["params"][row] = np.real(params)
+        self.count += 1
+
+        if self.count % self.flush_every == 0:
+            self.flush()
+
+    def flush(self):
+        """Flush the column maps and record the number of valid rows in `meta.json`."""
+        for array in self._arrays.values():
+            array.flush()
+        meta = {
+            "count": self.count,
+            "capacity": self.capacity,
+            "columns": self.columns,
+            "param_names": self.param_names,
+        }
+        with open(os.path.join(self.path, "meta.json.tmp"), mode="w") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(self.path, "meta.json.tmp"), os.path.join(self.path, "meta.json"))
+
+    def close(self):
+        """Flush and release the memory maps."""
+        self.flush()
+        self._arrays = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def history_path_for(filepath):
+    """
+    Return the history directory that belongs to a results CSV path.
+
+    Args:
+        filepath (str): Path of the CSV file, e.g. `afm-heisenberg_l08_p4_<date>.csv`.
+
+    Returns:
+        str: Path of the matching history directory, e.g. `afm-heisenberg_l08_p4_<date>.history`.
+    """
+    return os.path.splitext(filepath)[0] + ".history"
+
+def load_history(path, mmap_mode="r"):
+    """
+    Load a history store written by `OptimizationHistory`.
+
+    Args:
+        path (str): History directory.
+        mmap_mode (str or None): Memory-map mode passed to `np.load`; None reads into memory.
+
+    Returns:
+        dict: Column name to array (trimmed to the valid rows), plus `params` (2D) and
+        `param_names`.
+    """
+    with open(os.path.join(path, "meta.json"), mode="r") as f:
+        meta = json.load(f)
+    count = meta["count"]
+
+    history = {}
+    for name in meta["columns"] + ["params"]:
+        history[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)[:count]
+    history["param_names"] = meta["param_names"]
+    return history
+
+def export_history_csv(path, filepath):
+    """
+    Write a history store as a CSV file with one row per iteration.
+
+    The layout matches the CSV files the optimizers used to write directly: `iter`, `energy`
+    followed by the parameters. Extra columns are appended after the parameters.
+
+    Args:
+        path (str): History directory.
+        filepath (str): Path of the CSV file to write.
+    """
+    history = load_history(path)
+    extra_columns = [name for name in history if name not in SCALAR_COLUMNS + ("params", "param_names")]
+
+    with open(filepath, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["iter", "energy"] + history["param_names"] + extra_columns)
+        for row in range(len(history["iter"])):
+            record = [int(history["iter"][row]), float(history["energy"][row])]
+            record += history["params"][row].tolist()
+            record += [float(history[name][row]) for name in extra_columns]
+            writer.writerow(record)
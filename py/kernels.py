@@ -0,0 +1,147 @@
+import os
+from functools import lru_cache
+from types import SimpleNamespace
+import numpy as np
+from hamiltonian import chain_bonds, lattice_bonds, heisenberg_hamiltonian
+
+@lru_cache(maxsize=None)
+def numba_kernels():
+    """
+    The JIT-compiled kernels, or None if numba is not installed.
+
+    numba is only imported here, on first use, so importing this module stays cheap. The
+    kernels are compiled with `cache=True`, i.e. once per machine into __pycache__, and loaded
+    from there by every later process, including pool workers; `warm_up` compiles them ahead.
+    Unless NUMBA_THREADING_LAYER is set, the workqueue threading layer is used: with TBB,
+    numba's first choice when it is installed, a process that ran a parallel kernel and then
+    forked a pool hangs at exit, and the drivers fork their pools after `warm_up`.
+
+    Returns:
+        SimpleNamespace or None: `apply_one_qubit`, `apply_two_qubit` and `bond_energy`.
+    """
+    try:
+        import numba
+    except ImportError:
+        return None
+    if "NUMBA_THREADING_LAYER" not in os.environ:
+        numba.config.THREADING_LAYER = "workqueue"
+
+    @numba.njit(parallel=True, cache=True)
+    def apply_one_qubit(state, matrix, bit):
+        """In place: the 2 x 2 `matrix` on the qubit at bit position `bit` (from the least significant)."""
+        low = (1 << bit) - 1
+        for i in numba.prange(state.size >> 1):
+            i0 = ((i >> bit) << (bit + 1)) | (i & low)
+            i1 = i0 | (1 << bit)
+            a0, a1 = state[i0], state[i1]
+            state[i0] = matrix[0, 0] * a0 + matrix[0, 1] * a1
+            state[i1] = matrix[1, 0] * a0 + matrix[1, 1] * a1
+
+    @numba.njit(parallel=True, cache=True)
+    def apply_two_qubit(state, matrix, bit_a, bit_b):
+        """In place: the 4 x 4 `matrix` on the qubits at bit positions `bit_a` (its more significant) and `bit_b`."""
+        lo, hi = min(bit_a, bit_b), max(bit_a, bit_b)
+        mask_lo, mask_hi = (1 << lo) - 1, (1 << hi) - 1
+        flip_a, flip_b = 1 << bit_a, 1 << bit_b
+        for i in numba.prange(state.size >> 2):
+            j = ((i >> lo) << (lo + 1)) | (i & mask_lo)
+            j = ((j >> hi) << (hi + 1)) | (j & mask_hi)
+            indices = (j, j | flip_b, j | flip_a, j | flip_a | flip_b)
+            a0, a1, a2, a3 = state[indices[0]], state[indices[1]], state[indices[2]], state[indices[3]]
+            for row in range(4):
+                state[indices[row]] = matrix[row, 0] * a0 + matrix[row, 1] * a1 + matrix[row, 2] * a2 + matrix[row, 3] * a3
+
+    @numba.njit(parallel=True, cache=True)
+    def bond_energy(state, bits_a, bits_b):
+        """sum_bonds <XX + YY + ZZ> in one pass, for bonds between the bit positions `bits_a[k]` and `bits_b[k]`."""
+        total = 0.0
+        for i in numba.prange(state.size):
+            amplitude = state[i]
+            probability = amplitude.real * amplitude.real + amplitude.imag * amplitude.imag
+            value = 0.0
+            for k in range(bits_a.size):
+                a, b = (i >> bits_a[k]) & 1, (i >> bits_b[k]) & 1
+                if a == b:
+                    value += probability
+                else:
+                    value -= probability
+                    if a == 0:  # XX + YY maps |01> to 2 |10> and back: 4 Re(conj(psi_10) psi_01)
+                        partner = state[i ^ ((1 << bits_a[k]) | (1 << bits_b[k]))]
+                        value += 4.0 * (partner.real * amplitude.real + partner.imag * amplitude.imag)
+            total += value
+        return total
+
+    return SimpleNamespace(apply_one_qubit=apply_one_qubit, apply_two_qubit=apply_two_qubit, bond_energy=bond_energy)
+
+def warm_up():
+    """
+    Compile (or load from the cache) the kernels for complex64 and complex128 states.
+
+    Call it once in the parent process before a pool is created, so forked workers inherit
+    the compiled kernels and spawned ones load them from the on-disk cache.
+
+    Returns:
+        bool: True if the numba kernels are available.
+    """
+    kernels = numba_kernels()
+    if kernels is None:
+        return False
+    for dtype in (np.complex64, np.complex128):
+        state = np.zeros(4, dtype=dtype)
+        state[0] = 1
+        apply_gate(state, np.eye(2, dtype=dtype), [1])
+        apply_gate(state, np.eye(4, dtype=dtype), [0, 1])
+        kernels.bond_energy(state, np.array([0], dtype=np.int64), np.array([1], dtype=np.int64))
+    return True
+
+def apply_gate(state, matrix, axes):
+    """
+    Apply a one- or two-qubit unitary in place to a flat state vector.
+
+    Uses the numba kernels, parallel over amplitude ranges, if available, otherwise a NumPy
+    contraction on a (2,) * n view (which needs one temporary of the size of the state).
+
+    Args:
+        state (np.ndarray): Flat, contiguous state of 2^n amplitudes; axis 0 is the most significant qubit.
+        matrix (np.ndarray): (2^k, 2^k) unitary, in the order of `axes`.
+        axes (list): Qubits (axes of the (2,) * n tensor) the unitary acts on, one or two.
+    """
+    n_qubits = state.size.bit_length() - 1
+    matrix = np.asarray(matrix, dtype=state.dtype)
+    kernels = numba_kernels()
+    if kernels is not None and len(axes) == 1:
+        kernels.apply_one_qubit(state, matrix, n_qubits - 1 - axes[0])
+    elif kernels is not None and len(axes) == 2:
+        kernels.apply_two_qubit(state, matrix, n_qubits - 1 - axes[0], n_qubits - 1 - axes[1])
+    else:
+        k = len(axes)
+        tensor = state.reshape((2,) * n_qubits)
+        result = np.tensordot(matrix.reshape((2,) * (2 * k)), tensor, axes=(list(range(k, 2 * k)), list(axes)))
+        tensor[...] = np.moveaxis(result, list(range(k)), list(axes))
+
+def heisenberg_energy(state, rows, cols, periodic=True, chain=False, accumulator="double"):
+    """
+    sum_bonds <XX + YY + ZZ> of a driver geometry.
+
+    With numba, all bonds are reduced in a single parallel pass over the state (always in
+    double precision); otherwise the cached `heisenberg_hamiltonian` is used.
+
+    Args:
+        state (np.ndarray): State vector of 2^(rows * cols) amplitudes in cirq's qubit order.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        periodic (bool): If True, periodic boundary conditions are used.
+        chain (bool): If True, the bonds are `chain_bonds(cols)`, otherwise `lattice_bonds(rows, cols)`.
+        accumulator (str): "single" or "double", the precision of the NumPy reductions.
+
+    Returns:
+        float: The energy.
+    """
+    kernels = numba_kernels()
+    if kernels is None:
+        return heisenberg_hamiltonian(rows, cols, periodic, chain=chain).expectation(state, accumulator)
+    bonds = chain_bonds(cols, periodic) if chain else lattice_bonds(rows, cols, periodic)
+    n_qubits = rows * cols
+    bits_a = np.array([n_qubits - 1 - a for a, _ in bonds], dtype=np.int64)
+    bits_b = np.array([n_qubits - 1 - b for _, b in bonds], dtype=np.int64)
+    return float(kernels.bond_energy(np.ascontiguousarray(state), bits_a, bits_b))
@@ -0,0 +1,190 @@
+import os
+import argparse
+import itertools
+from functools import partial
+import tomllib
+import numpy as np
+from optimization import evaluate_point, PARAMETER_NAMES
+
+# Every layer applies exp(-i angle (XX + YY + ZZ)) per bond, whose eigenvalues 1 and -3 make the
+# circuit periodic in every angle with period pi / 2 (up to a global phase)
+ANGLE_PERIOD = np.pi / 2
+
+def landscape_grid(parameters=2, resolution=16, low=0.0, high=ANGLE_PERIOD):
+    """
+    Grid of angles for a landscape scan, one column per parameter set.
+
+    The end point `high` is left out, since with the default range it is the start point again.
+
+    Args:
+        parameters (int): Number of parameter sets (2, 3, or 4).
+        resolution (int): Number of grid points per parameter set.
+        low (float): Lower end of the range of every angle.
+        high (float): Upper end of the range of every angle.
+
+    Returns:
+        np.ndarray: Angles of shape (resolution ** parameters, parameters).
+    """
+    axis = np.linspace(low, high, resolution, endpoint=False)
+    return np.array(list(itertools.product(axis, repeat=parameters)))
+
+def schedule_points(angles, p=1):
+    """
+    Flattened parameter vectors of constant schedules, i.e. the p-layer slice the landscape is scanned on.
+
+    Args:
+        angles (np.ndarray): Angles of shape (n, parameters), one value per parameter set.
+        p (int): Number of layers.
+
+    Returns:
+        np.ndarray: Parameter vectors of shape (n, parameters * p), every layer with the same angles.
+    """
+    return np.repeat(np.asarray(angles, dtype=float), p, axis=1)
+
+def landscape_cache_path(model, rows, cols, periodic, p, resolution, precision="single", cache_dir=".results/landscapes"):
+    """Path of the cached scan of one model, geometry, depth and grid."""
+    boundary = "PBC" if periodic else "OBC"
+    return os.path.join(cache_dir, f"{model}_r{rows}c{cols}_{boundary}_p{p}_n{resolution}_{precision}.npz")
+
+def scan_landscape(function, parameters=2, p=1, resolution=16, low=0.0, high=ANGLE_PERIOD, pool=None, cache_path=None):
+    """
+    Energy over a grid of constant-schedule angles, evaluated in parallel and cached on disk.
+
+    For p = 1 this is the full landscape; for p > 1 it is the slice where all layers share
+    their angles, which is where the usual constant starts (`initial_gamma = 0.6`) live.
+
+    Args:
+        function (callable): The expectation function, taking the parameter sets as keywords
+            (must be picklable when `pool` is used).
+        parameters (int): Number of parameter sets (2, 3, or 4).
+        p (int): Number of layers.
+        resolution (int): Number of grid points per parameter set.
+        low (float): Lower end of the range of every angle.
+        high (float): Upper end of the range of every angle.
+        pool (multiprocessing.Pool, optional): Pool the grid is batched through; evaluated serially if None.
+        cache_path (str, optional): `.npz` file the scan is read from if present (and matching
+            the grid), or written to otherwise.
+
+    Returns:
+        tuple: (angles of shape (n, parameters), energies of shape (n,)).
+    """
+    angles = landscape_grid(parameters, resolution, low, high)
+    if cache_path and os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if cached["angles"].shape == angles.shape and np.allclose(cached["angles"], angles):
+            return angles, cached["energies"]
+
+    points = schedule_points(angles, p)
+    evaluate = partial(evaluate_point, function, parameters=parameters)
+    if pool is None:
+        values = [evaluate(x) for x in points]
+    else:
+        values = pool.map(evaluate, points)
+    energies = np.real(np.array(values, dtype=complex))
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        np.savez(cache_path + ".tmp.npz", angles=angles, energies=energies)
+        os.replace(cache_path + ".tmp.npz", cache_path)
+    return angles, energies
+
+def best_grid_points(angles, energies, n_points=1, resolution=16, min_separation=2):
+    """
+    Lowest-energy grid points that are at least `min_separation` grid steps apart.
+
+    Neighbours of an already chosen point are skipped, so several points come from different
+    valleys rather than from one. The distance is taken on the periodic grid.
+
+    Args:
+        angles (np.ndarray): Angles from `scan_landscape`.
+        energies (np.ndarray): Energies from `scan_landscape`.
+        n_points (int): Number of points.
+        resolution (int): Number of grid points per parameter set of the scan.
+        min_separation (int): Smallest distance between chosen points, in grid steps (max norm);
+            2 skips the direct neighbours.
+
+    Returns:
+        np.ndarray: Up to `n_points` rows of `angles`, lowest energy first.
+    """
+    parameters = angles.shape[1]
+    # Grid index of every point: itertools.product enumerates in row-major order
+    indices = np.array(np.unravel_index(np.arange(len(angles)), (resolution,) * parameters)).T
+    chosen = []
+    for index in np.argsort(energies):
+        distances = [np.abs(indices[index] - indices[other]) for other in chosen]
+        if all(np.max(np.minimum(d, resolution - d)) >= min_separation for d in distances):
+            chosen.append(index)
+            if len(chosen) == n_points:
+                break
+    return angles[chosen]
+
+def landscape_initial_points(function, parameters=2, p=1, n_points=1, resolution=16, low=0.0, high=ANGLE_PERIOD,
+                             pool=None, cache_path=None, min_separation=2):
+    """
+    Initial points for the optimizers from a landscape scan, replacing random starts.
+
+    Args:
+        function (callable): The expectation function, see `scan_landscape`.
+        parameters (int): Number of parameter sets (2, 3, or 4).
+        p (int): Number of layers.
+        n_points (int): Number of points, e.g. the number of multi-start starts.
+        resolution (int): Number of grid points per parameter set.
+        low (float): Lower end of the range of every angle.
+        high (float): Upper end of the range of every angle.
+        pool (multiprocessing.Pool, optional): Pool the grid is batched through.
+        cache_path (str, optional): Cache of the scan, see `landscape_cache_path`.
+        min_separation (int): Smallest distance between the points, in grid steps.
+
+    Returns:
+        list: Flattened parameter vectors of length `parameters * p`, best first.
+    """
+    angles, energies = scan_landscape(function, parameters, p, resolution, low, high, pool, cache_path)
+    best = best_grid_points(angles, energies, n_points, resolution, min_separation)
+    return list(schedule_points(best, p))
+
+def main(argv=None):
+    """
+    Scan the energy landscape of a model and print its best grid points.
+
+        python landscape.py afm-heisenberg-lattice --p 1 --resolution 24
+
+    The geometry is the first one of the model's TOML section; scans are cached in .results/landscapes.
+    """
+    import multiprocessing as mp
+    import expectation
+    from sweep import MODELS
+
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('model', choices=list(MODELS))
+    parser.add_argument('--config', default='.toml', help='TOML configuration file')
+    parser.add_argument('--p', type=int, default=1, help='number of layers (p > 1 scans constant schedules)')
+    parser.add_argument('--resolution', type=int, default=16, help='grid points per parameter set')
+    parser.add_argument('--n-points', type=int, default=5, help='number of points printed')
+    parser.add_argument('--processes', type=int, default=None, help='pool size (default: CPU count)')
+    args = parser.parse_args(argv)
+
+    with open(args.config, mode="rb") as f:
+        section = tomllib.load(f)[args.model]
+    periodic = section.get("boundary_condition", "PBC") == "PBC"
+    precision = section.get("precision", "single")
+    precision = "single" if precision == "mixed" else precision
+    function_name, args_name, parameters = MODELS[args.model]
+    if args.model == "afm-heisenberg":
+        rows, cols = 1, section["length_list"][0]
+        function_args = getattr(expectation, args_name)(cols, periodic, {'t': int(cols / 2), 'f': 1}, precision=precision)
+    else:
+        rows, cols = section["rows_list"][0], section["cols_list"][0]
+        function_args = getattr(expectation, args_name)(rows, cols, periodic, {'t': int(rows * cols / 2), 'f': 1}, precision=precision)
+    function = partial(getattr(expectation, function_name), function_args=function_args)
+
+    cache_path = landscape_cache_path(args.model, rows, cols, periodic, args.p, args.resolution, precision)
+    with mp.Pool(args.processes) as pool:
+        angles, energies = scan_landscape(function, parameters, args.p, args.resolution, pool=pool, cache_path=cache_path)
+    print(f"{args.model} {rows}x{cols} p={args.p}: {len(energies)} grid points, "
+          f"energy in [{energies.min():.6f}, {energies.max():.6f}], cached in {cache_path}")
+    for point in best_grid_points(angles, energies, args.n_points, args.resolution):
+        energy = energies[np.flatnonzero(np.all(angles == point, axis=1))[0]]
+        print(f"  E = {energy:.6f}  " + "  ".join(f"{name} = {value:.4f}" for name, value in zip(PARAMETER_NAMES, point)))
+
+if __name__ == '__main__':
+    main()
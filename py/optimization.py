@@ -1,13 +1,35 @@
 import csv 
+import sys
+import math
+import time
+import queue
+import atexit
+import threading
 import multiprocessing as mp
+from functools import partial
 import numpy as np
-from scipy.optimize import minimize
+from history import OptimizationHistory, history_path_for, export_history_csv
+from gradient import AdaptiveGradient
+from stopping import StopOptimization
 Pi = np.pi
 
-def optimize_by_lbfgsb(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2, print_results=True, filepath=""):
+PARAMETER_NAMES = ("gamma", "beta", "phi", "theta")
+
+# L-BFGS-B settings each state-vector precision can actually resolve. A complex64 energy is only
+# good to ~1e-7 relative, so a 3-point gradient needs a step of ~1e-2 and cannot get below ~1e-4.
+PRECISION_TOLERANCES = {
+    "single": {"gtol": 1e-4, "tol": 1e-6, "finite_diff_rel_step": 1e-2},
+    "double": {"gtol": 1e-8, "tol": 1e-10, "finite_diff_rel_step": None},
+}
+
+def optimize_by_lbfgsb(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2, print_results=True, filepath="", history_path=None, write_csv=True, precision="double",
+                       exact_energy=None, exact_state=None, jac="3-point", stopping=None):
     """
     Optimize a given function using the L-BFGS-B algorithm.
 
+    Every iteration is appended to a binary `OptimizationHistory` (see history.py). The CSV
+    file at `filepath` is exported from the history when the optimization ends.
+
     Parameters:
     function (callable): The function to be optimized.
     initial_gamma (array-like): Initial values for gamma parameters.
@@ -18,6 +40,17 @@ def optimize_by_lbfgsb(function, initial_gamma, initial_beta, initial_phi=None,
     parameters (int): Number of parameter sets (2, 3, or 4).
     figure (bool): Whether to print the optimization process.
     filepath (str): Path to the CSV file for logging.
+    history_path (str, optional): Directory of the history store, defaults to `filepath` with a `.history` suffix.
+    write_csv (bool): Whether to export the history to `filepath` as CSV.
+    precision (str): Precision of the energies `function` returns ("single" or "double"); selects the
+        tolerances and finite-difference step from `PRECISION_TOLERANCES`.
+    exact_energy (float, optional): Exact ground-state energy; adds a `relative_error` column to the history.
+    exact_state (np.ndarray, optional): Exact ground state in the simulator's qubit order; adds a `fidelity`
+        column |<psi_exact|psi>|^2. `function` must then accept `return_state=True` and return
+        (energy, state vector), as the expectation functions do.
+    jac (str): "3-point" for scipy's finite differences, "adaptive" for `AdaptiveGradient` steps
+        adapted to the noise and curvature, or "richardson" for adaptive steps with Richardson extrapolation.
+    stopping (StoppingCriteria, optional): Early-stopping rules, checked after every iteration.
 
     Returns:
     tuple: Optimized parameter values.
@@ -37,83 +70,972 @@ def optimize_by_lbfgsb(function, initial_gamma, initial_beta, initial_phi=None,
     else:
         raise ValueError("Unsupported number of parameters. Only 2, 3 or 4 parameters are supported.")
     
+    # Energies (and fidelities) of the most recent evaluations, so the callback does not
+    # re-simulate the accepted point (it is always among the last few points scipy evaluated)
+    recent_energies = {}
+    recent_fidelities = {}
+    n_evals = 0
+    state_kwargs = {} if exact_state is None else {'return_state': True}
+
     def energy_function(params):
+        nonlocal n_evals
         if parameters == 2:
             gamma, beta = np.split(params, split_count)
-            energy = function(gamma=gamma, beta=beta)
+            energy = function(gamma=gamma, beta=beta, **state_kwargs)
         elif parameters == 3:
             gamma, beta, phi = np.split(params, split_count)
-            energy = function(gamma=gamma, beta=beta, phi=phi)
+            energy = function(gamma=gamma, beta=beta, phi=phi, **state_kwargs)
         elif parameters == 4:
             gamma, beta, phi, theta = np.split(params, split_count)
-            energy = function(gamma=gamma, beta=beta, phi=phi, theta=theta)    
+            energy = function(gamma=gamma, beta=beta, phi=phi, theta=theta, **state_kwargs)
+        n_evals += 1
+        key = params.tobytes()
+        if exact_state is not None:
+            # One inner product on the state the energy was computed from
+            energy, state = energy
+            recent_fidelities[key] = recorder.fidelity(state)
+        recent_energies[key] = energy
+        if len(recent_energies) > 2 * len(params) + 4:
+            oldest = next(iter(recent_energies))
+            del recent_energies[oldest]
+            recent_fidelities.pop(oldest, None)
         return energy
-    
-    history_params = []
-    history_energy = []
+
+    recorder = RunRecorder(filepath, parameter_names(len(initial_gamma), parameters), print_results=print_results,
+                           history_path=history_path, write_csv=write_csv, exact_energy=exact_energy, exact_state=exact_state,
+                           stopping=stopping)
 
     def callback(params):
-        history_params.append(params)
-        history_energy.append(energy_function(params))
-        if parameters == 2:
-            gamma, beta = np.split(params, split_count)
-            record = [len(history_energy), energy_function(params)] + list(gamma) + list(beta)
-        elif parameters == 3:
-            gamma, beta, phi = np.split(params, split_count)
-            record = [len(history_energy), energy_function(params)] + list(gamma) + list(beta) + list(phi)
-        elif parameters == 4:
-            gamma, beta, phi, theta = np.split(params, split_count)
-            record = [len(history_energy), energy_function(params)] + list(gamma) + list(beta) + list(phi) + list(theta)
-        
-        # Open the file in append mode and write the record
-        with open(filepath, mode='a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(record)
-            if print_results:
-                print(record)
-            f.flush()
-            
-    # Write the header to the CSV file
-    with open(filepath, mode='w', newline='') as f:
-        writer = csv.writer(f)
-        headline = ["iter", "energy"]
-        for p in range(int(len(initial_gamma))):
-            headline.append(f"gamma[{p}]")
-            headline.append(f"beta[{p}]")
-            if parameters >= 3:
-                headline.append(f"phi[{p}]")
-            if parameters == 4: 
-                headline.append(f"theta[{p}]")   
-        writer.writerow(headline)
-            
+        key = params.tobytes()
+        if key not in recent_energies:
+            energy_function(params)
+        gradient_evals = adaptive.n_evals if adaptive is not None else 0
+        recorder.record(recent_energies[key], params, n_evals + gradient_evals, fidelity=recent_fidelities.get(key))
+        if recorder.stop_reason:
+            raise StopOptimization(recorder.stop_reason)
+
     # Perform the optimization
     if bounds is None:
         bounds = [(0, None)] * len(initial_params)
 
-    result = minimize(
-        fun=energy_function,
-        x0=initial_params,
-        jac="3-point",
-        method='L-BFGS-B',
-        options={'gtol': 1e-8},
-        bounds=bounds,
-        tol=1e-10,
-        callback=callback
-    )
-    
+    adaptive = None
+    if jac in ("adaptive", "richardson"):
+        lower, upper = bound_arrays(bounds, len(initial_params))
+        adaptive = AdaptiveGradient(partial(evaluate_point, function, parameters=parameters), len(initial_params),
+                                    precision=precision, richardson=(jac == "richardson"), lower=lower, upper=upper)
+
+        def objective(params):
+            energy = energy_function(params)
+            return energy, adaptive.gradient(params, energy)
+    elif jac == "3-point":
+        objective = energy_function
+    else:
+        raise ValueError(f"Unsupported jac {jac}, use '3-point', 'adaptive' or 'richardson'.")
+
+    options, tol = lbfgsb_options(precision)
+
+    from scipy.optimize import minimize  # Imported here so that pool workers and small CLI runs skip scipy
+    try:
+        result = minimize(
+            fun=objective,
+            x0=initial_params,
+            jac=True if adaptive is not None else "3-point",
+            method='L-BFGS-B',
+            options=options,
+            bounds=bounds,
+            tol=tol,
+            callback=callback
+        )
+        final_params = result.x
+    except StopOptimization:
+        result = f"L-BFGS-B stopped early: {recorder.stop_reason}"
+        final_params = recorder.last_params
+    finally:
+        recorder.close()
+
     if print_results:
         print(result)
     
     if parameters == 2:
-        gamma, beta = np.split(result.x, split_count)
+        gamma, beta = np.split(final_params, split_count)
         return gamma, beta
     elif parameters == 3:
-        gamma, beta, phi = np.split(result.x, split_count)
+        gamma, beta, phi = np.split(final_params, split_count)
         return gamma, beta, phi
     elif parameters == 4:
-        gamma, beta, phi, theta = np.split(result.x, split_count)
+        gamma, beta, phi, theta = np.split(final_params, split_count)
         return gamma, beta, phi, theta
 
+def parameter_names(p, parameters=2):
+    """
+    Names of the flattened parameter vector, in the order `np.concatenate` produces it.
+
+    Parameters:
+    p (int): Number of layers.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+
+    Returns:
+    list: Names such as `gamma[0]`, ..., `beta[p-1]`.
+    """
+    return [f"{name}[{index}]" for name in PARAMETER_NAMES[:parameters] for index in range(p)]
+
+def split_parameters(params, parameters=2):
+    """
+    Split a flattened parameter vector into the keyword arguments of an expectation function.
+
+    Parameters:
+    params (np.ndarray): Flattened parameters, e.g. `np.concatenate([gamma, beta])`.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+
+    Returns:
+    dict: e.g. `{'gamma': ..., 'beta': ...}`.
+    """
+    return dict(zip(PARAMETER_NAMES[:parameters], np.split(np.asarray(params), parameters)))
+
+def lbfgsb_options(precision="double"):
+    """
+    L-BFGS-B `options` and `tol` for a given energy precision.
+
+    Parameters:
+    precision (str): "single" or "double", see `PRECISION_TOLERANCES`.
+
+    Returns:
+    tuple: (options dict, tol).
+    """
+    tolerances = PRECISION_TOLERANCES[precision]
+    options = {'gtol': tolerances['gtol']}
+    if tolerances['finite_diff_rel_step'] is not None:
+        options['finite_diff_rel_step'] = tolerances['finite_diff_rel_step']
+    return options, tolerances['tol']
+
+def bound_arrays(bounds, n):
+    """
+    Lower and upper bound arrays for clipping, from scipy-style `bounds`.
+
+    Parameters:
+    bounds (list of tuple, optional): (min, max) per parameter, None for no bound; None for the
+        default of `optimize_by_lbfgsb`, [(0, None)] * n.
+    n (int): Number of parameters.
+
+    Returns:
+    tuple: (lower, upper) arrays, with -inf/inf for missing bounds.
+    """
+    if bounds is None:
+        return np.zeros(n), np.full(n, np.inf)
+    lower = np.array([-np.inf if low is None else low for low, _ in bounds], dtype=float)
+    upper = np.array([np.inf if high is None else high for _, high in bounds], dtype=float)
+    return lower, upper
+
+def finite_difference_step(precision="double"):
+    """Central-difference step resolvable at an energy precision: 1e-2 for "single", 1e-4 for "double"."""
+    return 1e-2 if precision == "single" else 1e-4
+
+class BackgroundLogger:
+    """
+    Non-blocking sink for optimizer records, drained by a writer thread.
+
+    `log` only puts the record on a bounded queue, so an optimizer iteration does not wait on
+    disk or stdout. The writer thread appends records to the CSV file and echoes them to
+    stdout in batches, flushing at most every `flush_interval` seconds. When the queue is
+    full, `log` blocks until the writer catches up (backpressure), so the history never
+    loses iterations; records are only dropped, counted and reported if the writer thread
+    has died. `close` (called on `with` exit, on error, and at interpreter exit) drains
+    everything left in the queue and flushes the file.
+
+    Attributes:
+        filepath (str): CSV file the records are appended to, empty for stdout only.
+        dropped (int): Number of records dropped because the writer thread had died.
+    """
+    _STOP = object()
+
+    def __init__(self, filepath="", header=None, echo=True, maxsize=10000, batch_size=256, flush_interval=1.0):
+        """
+        Start the writer thread.
+
+        Parameters:
+        filepath (str): CSV file to append records to; empty to only echo.
+        header (list, optional): Row written to the CSV file before any record.
+        echo (bool): Whether to print the records to stdout.
+        maxsize (int): Maximum number of queued records (bounds memory).
+        batch_size (int): Maximum number of records written per batch.
+        flush_interval (float): Seconds between flushes of the file and stdout.
+        """
+        self.filepath = filepath
+        self.header = header
+        self.echo = echo
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._closed = False
+        self._queue = queue.Queue(maxsize)
+        self._thread = threading.Thread(target=self._run, name="optimization-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        """
+        Queue a record (a list of values); blocks only while the queue is full.
+
+        Parameters:
+        record (list): Row to write and echo.
+        """
+        if self._closed:
+            return
+        if self._put(record):
+            return
+        if not self.dropped:
+            print("BackgroundLogger: the writer thread died, records are being dropped", file=sys.stderr)
+        self.dropped += 1
+
+    def _put(self, item):
+        """Put an item, waiting for room as long as the writer thread is alive. Returns False if it died."""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=self.flush_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        f = open(self.filepath, mode='a', newline='') if self.filepath else None
+        writer = csv.writer(f) if f else None
+        if writer and self.header is not None:
+            writer.writerow(self.header)
+
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch and batch[-1] is self._STOP:
+                batch.pop()
+                stop = True
+
+            if writer and batch:
+                writer.writerows(batch)
+            if self.echo and batch:
+                sys.stdout.write("".join(f"{record}\n" for record in batch))
+
+            if stop or time.monotonic() - last_flush >= self.flush_interval:
+                if f:
+                    f.flush()
+                if self.echo:
+                    sys.stdout.flush()
+                last_flush = time.monotonic()
+
+        if f:
+            f.close()
+
+    def close(self):
+        """Drain the queue, flush and stop the writer thread. Safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        # The sentinel is the last item ever queued, so waiting here only waits for the backlog;
+        # a dead writer thread can take no sentinel and needs no join
+        if self._put(self._STOP):
+            self._thread.join()
+        atexit.unregister(self.close)
+        if self.dropped:
+            print(f"BackgroundLogger: dropped {self.dropped} records because the writer thread died", file=sys.stderr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class RunRecorder:
+    """
+    History, CSV and console output of one optimization run, shared by the optimizers.
+
+    Every recorded iteration goes to an `OptimizationHistory` and a `BackgroundLogger`; the CSV
+    file is exported from the history on `close`. With an exact reference, `fidelity` and
+    `relative_error` columns are added. Every iteration is also checked against the optional
+    `StoppingCriteria`; optimizers end the run once `stop_reason` is set.
+
+    Attributes:
+        history (OptimizationHistory): The history store of the run.
+        stopping (StoppingCriteria): Early-stopping rules, or None.
+    """
+    def __init__(self, filepath, param_names, print_results=True, history_path=None, write_csv=True,
+                 exact_energy=None, exact_state=None, extra_columns=(), stopping=None):
+        """
+        Args:
+            filepath (str): Path to the CSV file, empty for no CSV.
+            param_names (List[str]): Names of the parameters, see `parameter_names`.
+            print_results (bool): Whether to echo the iterations to stdout.
+            history_path (str, optional): Directory of the history store, defaults to `filepath` with a `.history` suffix.
+            write_csv (bool): Whether to export the history to `filepath` as CSV.
+            exact_energy (float, optional): Exact ground-state energy, for the `relative_error` column.
+            exact_state (np.ndarray, optional): Exact ground state, for the `fidelity` column.
+            extra_columns (Iterable[str]): Further optimizer-specific columns.
+            stopping (StoppingCriteria, optional): Early-stopping rules.
+        """
+        self.filepath = filepath
+        self.print_results = print_results
+        self.stopping = stopping
+        self.last_params = None
+        self.write_csv = write_csv
+        self.exact_energy = exact_energy
+        self.exact_state = exact_state
+        self.history_path = history_path_for(filepath) if history_path is None else history_path
+        columns = (["fidelity"] if exact_state is not None else []) + (["relative_error"] if exact_energy is not None else [])
+        self.history = OptimizationHistory(self.history_path, param_names, extra_columns=columns + list(extra_columns))
+        self.logger = BackgroundLogger(echo=print_results)
+        self.start_time = time.perf_counter()
+
+    def fidelity(self, state):
+        """|<psi_exact|psi>|^2 of a state vector, as a single inner product."""
+        return np.abs(np.vdot(self.exact_state, state)) ** 2
+
+    def record(self, energy, params, n_evals, fidelity=None, **extra):
+        """
+        Append one iteration.
+
+        Args:
+            energy (float): Energy at `params`.
+            params (np.ndarray): Flattened parameters.
+            n_evals (int): Energy evaluations so far.
+            fidelity (float, optional): Fidelity at `params`, if an exact state is set.
+            **extra (float): Values of the optimizer-specific columns.
+        """
+        values = {}
+        if self.exact_state is not None:
+            values["fidelity"] = fidelity
+        if self.exact_energy is not None:
+            values["relative_error"] = abs((energy - self.exact_energy) / self.exact_energy)
+        values.update(extra)
+        elapsed = time.perf_counter() - self.start_time
+        self.history.append(self.history.count + 1, energy, params, elapsed, n_evals, **values)
+        self.logger.log([self.history.count, energy] + list(params) + list(values.values()))
+        self.last_params = np.array(params, dtype=float)
+        if self.stopping is not None:
+            self.stopping.check(energy, n_evals, elapsed)
+
+    @property
+    def stop_reason(self):
+        """Why the stopping criteria ended the run, or None."""
+        return None if self.stopping is None else self.stopping.reason
+
+    def close(self):
+        self.logger.close()
+        if self.stop_reason and self.print_results:
+            print(f"Stopped early: {self.stop_reason}")
+        self.history.close()
+        if self.filepath and self.write_csv:
+            export_history_csv(self.history_path, self.filepath)
+
+def multistart_initial_points(p, parameters=2, n_starts=8, initialization="random", seed=None):
+    """
+    Generate flattened initial parameter vectors for a multi-start optimization.
+
+    Parameters:
+    p (int): Number of layers.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    n_starts (int): Number of points.
+    initialization (str): "random" draws every parameter from U(0, 1) like the lattice driver;
+        "structured" spreads constant and linearly ramped schedules over (0, 1].
+    seed (int or list, optional): Seed of the random generator (anything `np.random.default_rng` accepts).
+
+    Returns:
+    list: `n_starts` arrays of length `parameters * p`.
+    """
+    rng = np.random.default_rng(seed)
+    points = []
+    for index in range(n_starts):
+        if initialization == "random":
+            point = rng.uniform(0, 1, parameters * p)
+        elif initialization == "structured":
+            level = (index + 1) / n_starts
+            if index % 2 == 0:
+                schedule = np.full(p, level)  # Constant angles, like the 0.6 default
+            else:
+                schedule = np.linspace(level / p, level, p)  # Ramp, like an annealing schedule
+            point = np.tile(schedule, parameters)
+        else:
+            raise ValueError(f"Unsupported initialization {initialization}, use 'random' or 'structured'.")
+        points.append(point)
+    return points
+
+def lbfgsb_round(function, params, parameters=2, bounds=None, maxiter=10, precision="double"):
+    """
+    Run L-BFGS-B for at most `maxiter` iterations from `params` (a multi-start budget round).
+
+    Parameters:
+    function (callable): The function to be optimized, taking the parameter sets as keywords.
+    params (np.ndarray): Flattened start point.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    bounds (list of tuple, optional): Bounds for the parameters.
+    maxiter (int): Iteration budget of the round.
+    precision (str): "single" or "double", see `PRECISION_TOLERANCES`.
+
+    Returns:
+    tuple: (end point, energy at the end point, number of energy evaluations).
+    """
+    from scipy.optimize import minimize
+
+    options, tol = lbfgsb_options(precision)
+    options['maxiter'] = int(maxiter)
+    result = minimize(
+        fun=lambda x: function(**split_parameters(x, parameters)),
+        x0=params,
+        jac="3-point",
+        method='L-BFGS-B',
+        options=options,
+        bounds=bounds,
+        tol=tol,
+    )
+    return result.x, float(np.real(result.fun)), result.nfev
+
+def optimize_by_lbfgsb_multistart(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2,
+                                  print_results=True, filepath="", precision="double", n_starts=8, initialization="random",
+                                  keep_fraction=0.5, budget=10, pool=None, seed=None, exact_energy=None, exact_state=None,
+                                  stopping=None, initial_points=None):
+    """
+    Multi-start L-BFGS-B with successive-halving pruning.
+
+    The given initial point plus `n_starts - 1` generated points are optimized in parallel for
+    `budget` iterations. After each round only the best `keep_fraction` of the starts survive,
+    and the survivors' budget grows by `1 / keep_fraction` (Hyperband style), so the total cost
+    stays a small multiple of a single run. The last survivor is then optimized to convergence
+    with `optimize_by_lbfgsb`, which writes the usual history and CSV. A summary of every round
+    is written next to `filepath` as `<stem>_multistart.csv`.
+
+    Parameters:
+    function (callable): The function to be optimized (must be picklable when `pool` is used).
+    initial_gamma (array-like): Initial values for gamma parameters (the first start).
+    initial_beta (array-like): Initial values for beta parameters.
+    initial_phi (array-like, optional): Initial values for phi parameters.
+    initial_theta (array-like, optional): Initial values for theta parameters.
+    bounds (list of tuple, optional): Bounds for the parameters.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    print_results (bool): Whether to print the optimization process.
+    filepath (str): Path to the CSV file of the final run.
+    precision (str): "single" or "double", see `PRECISION_TOLERANCES`.
+    n_starts (int): Number of starting points, including the given one.
+    initialization (str): How the other starts are generated, see `multistart_initial_points`.
+    keep_fraction (float): Fraction of the starts kept after each round, in (0, 1); every round
+        drops at least one start.
+    budget (int): Iterations per start in the first round.
+    pool (multiprocessing.Pool, optional): Pool evaluating the starts of a round in parallel;
+        a pool of `n_starts` processes is created (and closed) when None.
+    seed (int or list, optional): Seed for the generated starts.
+    exact_energy (float, optional): Passed to the final `optimize_by_lbfgsb` run.
+    exact_state (np.ndarray, optional): Passed to the final `optimize_by_lbfgsb` run.
+    stopping (StoppingCriteria, optional): Passed to the final `optimize_by_lbfgsb` run.
+    initial_points (list, optional): Further flattened starts, e.g. from `landscape_initial_points`,
+        used before generating any.
+
+    Returns:
+    tuple: Optimized parameter values.
+    """
+    if not 0 < keep_fraction < 1:
+        raise ValueError(f"keep_fraction must be in (0, 1), got {keep_fraction}")
+    initial = [initial_gamma, initial_beta, initial_phi, initial_theta][:parameters]
+    p = len(initial_gamma)
+    points = [np.concatenate(initial)] + [np.asarray(x, dtype=float) for x in (initial_points or [])][:n_starts - 1]
+    points += multistart_initial_points(p, parameters, n_starts - len(points), initialization, seed)
+    starts = list(range(len(points)))
+    if bounds is None:
+        bounds = [(0, None)] * len(points[0])
+
+    own_pool = pool is None
+    if own_pool:
+        pool = mp.Pool(len(points))
+
+    multistart_path = filepath.replace('.csv', '_multistart.csv') if filepath else ""
+    try:
+        with BackgroundLogger(multistart_path, header=["round", "start", "budget", "energy", "n_evals"], echo=print_results) as logger:
+            round_index = 0
+            while len(points) > 1:
+                results = pool.starmap(lbfgsb_round, [(function, x, parameters, bounds, budget, precision) for x in points])
+                for start, (_, energy, n_evals) in zip(starts, results):
+                    logger.log([round_index, start, budget, energy, n_evals])
+
+                # Keep the best fraction, and give the survivors a proportionally larger budget
+                order = np.argsort([energy for _, energy, _ in results])
+                n_keep = min(len(points) - 1, max(1, math.ceil(len(points) * keep_fraction)))
+                points = [results[index][0] for index in order[:n_keep]]
+                starts = [starts[index] for index in order[:n_keep]]
+                budget = int(math.ceil(budget / keep_fraction))
+                round_index += 1
+    finally:
+        if own_pool:
+            pool.close()
+            pool.join()
+
+    best = split_parameters(points[0], parameters)
+    return optimize_by_lbfgsb(
+        function,
+        *[best[name] for name in PARAMETER_NAMES[:parameters]],
+        bounds=bounds,
+        parameters=parameters,
+        print_results=print_results,
+        filepath=filepath,
+        precision=precision,
+        exact_energy=exact_energy,
+        exact_state=exact_state,
+        stopping=stopping)
+
+def evaluate_with_state(function, params, parameters=2):
+    """Energy and state vector at flattened `params`; a picklable pool job."""
+    return function(**split_parameters(params, parameters), return_state=True)
+
+def fubini_study_metric(state, derivatives, blocks=None):
+    """
+    Fubini-Study metric (real part of the quantum geometric tensor) from state derivatives.
+
+    G_ij = Re(<d_i psi|d_j psi> - <d_i psi|psi><psi|d_j psi>), computed for all pairs at once as
+    one (n x 2^N) @ (2^N x n) product and one (n x 2^N) @ (2^N) product.
+
+    Parameters:
+    state (np.ndarray): Normalized state vector psi.
+    derivatives (np.ndarray): Array of shape (n, 2^N) with d_i psi in row i.
+    blocks (np.ndarray, optional): Block label of every parameter; entries between different
+        blocks are zeroed (block-diagonal approximation).
+
+    Returns:
+    np.ndarray: The (n, n) metric.
+    """
+    gram = derivatives.conj() @ derivatives.T
+    projections = derivatives.conj() @ state
+    metric = np.real(gram - np.outer(projections, projections.conj()))
+    if blocks is not None:
+        metric = np.where(blocks[:, None] == blocks[None, :], metric, 0.0)
+    return metric
+
+def optimize_by_natural_gradient(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2,
+                                 print_results=True, filepath="", history_path=None, write_csv=True, precision="double",
+                                 exact_energy=None, exact_state=None, alpha=0.05, iteration=200, metric="block",
+                                 delta=None, regularization=1e-4, tol=None, pool=None, stopping=None):
+    """
+    Optimize with the quantum natural gradient, theta <- theta - alpha * (G + lambda I)^-1 grad E.
+
+    Each iteration evaluates the energy and state at theta and at theta +- delta e_k for every
+    parameter (2n + 1 simulations, like one 3-point gradient). The central differences of the
+    energies give the gradient, and the central differences of the states give d_k psi, from which
+    the Fubini-Study metric G is formed with batched inner products against the state of the
+    energy call; no further simulations are needed. Preconditioning with G removes the bad
+    conditioning between the gamma/beta/phi/theta directions, so far fewer iterations are needed
+    than with a fixed-rate gradient descent.
+
+    Parameters:
+    function (callable): Expectation function accepting `return_state=True`, returning (energy, state).
+    initial_gamma (array-like): Initial values for gamma parameters.
+    initial_beta (array-like): Initial values for beta parameters.
+    initial_phi (array-like, optional): Initial values for phi parameters.
+    initial_theta (array-like, optional): Initial values for theta parameters.
+    bounds (list of tuple, optional): Bounds the parameters are clipped to after every step; [(0, None)] * n
+        like `optimize_by_lbfgsb` if None.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    print_results (bool): Whether to print the optimization process.
+    filepath (str): Path to the CSV file for logging.
+    history_path (str, optional): Directory of the history store.
+    write_csv (bool): Whether to export the history to `filepath` as CSV.
+    precision (str): Precision of the energies ("single" or "double"); sets the default `delta` and `tol`.
+    exact_energy (float, optional): Exact ground-state energy for the `relative_error` column.
+    exact_state (np.ndarray, optional): Exact ground state for the `fidelity` column.
+    alpha (float): Step size.
+    iteration (int): Maximum number of iterations.
+    metric (str): "block" (block-diagonal per parameter set) or "full" metric.
+    delta (float, optional): Finite-difference step; 1e-2 in single and 1e-4 in double precision by default.
+    regularization (float): Tikhonov term lambda added to the metric diagonal.
+    tol (float, optional): Stop when the relative energy change of an iteration is below `tol`;
+        defaults to the L-BFGS-B `tol` of the precision.
+    pool (multiprocessing.Pool, optional): Pool for the 2n + 1 evaluations of an iteration.
+    stopping (StoppingCriteria, optional): Early-stopping rules, checked after every iteration.
+
+    Returns:
+    tuple: Optimized parameter values.
+    """
+    if metric not in ("block", "full"):
+        raise ValueError(f"Unsupported metric {metric}, use 'block' or 'full'.")
+    tolerances = PRECISION_TOLERANCES[precision]
+    delta = finite_difference_step(precision) if delta is None else delta
+    tol = tolerances['tol'] if tol is None else tol
+
+    p = len(initial_gamma)
+    params = np.concatenate([initial_gamma, initial_beta, initial_phi, initial_theta][:parameters]).astype(float)
+    n = len(params)
+    blocks = np.repeat(np.arange(parameters), p) if metric == "block" else None
+    lower, upper = bound_arrays(bounds, n)
+
+    recorder = RunRecorder(filepath, parameter_names(p, parameters), print_results=print_results, history_path=history_path,
+                           write_csv=write_csv, exact_energy=exact_energy, exact_state=exact_state, extra_columns=["gradient_norm"], stopping=stopping)
+    n_evals = 0
+    prev_energy = None
+    try:
+        for _ in range(iteration):
+            shifts = np.vstack([np.zeros(n), delta * np.eye(n), -delta * np.eye(n)])
+            arguments = [(function, params + shift, parameters) for shift in shifts]
+            results = pool.starmap(evaluate_with_state, arguments) if pool else [evaluate_with_state(*a) for a in arguments]
+            n_evals += len(results)
+
+            energy, state = results[0]
+            state = np.asarray(state, dtype=np.complex128)
+            energies_plus = np.array([e for e, _ in results[1:n + 1]])
+            energies_minus = np.array([e for e, _ in results[n + 1:]])
+            states_plus = np.array([s for _, s in results[1:n + 1]], dtype=np.complex128)
+            states_minus = np.array([s for _, s in results[n + 1:]], dtype=np.complex128)
+
+            gradient = (energies_plus - energies_minus) / (2 * delta)
+            derivatives = (states_plus - states_minus) / (2 * delta)
+            del states_plus, states_minus
+            metric_tensor = fubini_study_metric(state, derivatives, blocks)
+
+            fidelity = recorder.fidelity(state) if exact_state is not None else None
+            recorder.record(energy, params, n_evals, fidelity=fidelity, gradient_norm=np.linalg.norm(gradient))
+            if recorder.stop_reason:
+                break
+
+            if prev_energy is not None and abs(energy - prev_energy) <= tol * max(abs(energy), 1.0):
+                break
+            prev_energy = energy
+
+            step = np.linalg.solve(metric_tensor + regularization * np.eye(n), gradient)
+            params = np.clip(params - alpha * step, lower, upper)
+    finally:
+        recorder.close()
+
+    return tuple(split_parameters(params, parameters).values())
+
+def optimize_by_spsa(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2,
+                     print_results=True, filepath="", history_path=None, write_csv=True, precision="double",
+                     exact_energy=None, exact_state=None, iteration=500, a=None, c=None, A=None, alpha=0.602, gamma=0.101,
+                     resamplings=1, second_order=False, regularization=1e-3, target_step=0.1, seed=None, stopping=None,
+                     tol=None, patience=50):
+    """
+    Optimize with simultaneous perturbation stochastic approximation (SPSA), or 2-SPSA.
+
+    The gradient is estimated from two energies at theta +- c_k Delta, with Delta a random +-1
+    vector, so a step costs 2 evaluations however many parameters there are (a 3-point gradient
+    costs 2n + 1). Gains follow Spall, a_k = a / (k + 1 + A)^alpha and c_k = c / (k + 1)^gamma.
+    With `second_order`, two more evaluations per step estimate the Hessian (2-SPSA); its running
+    average, made positive definite, preconditions the step. `resamplings` averages the
+    estimates over several independent perturbations per step.
+
+    The energy recorded per iteration is the mean of the perturbed energies (no extra evaluation),
+    and likewise the fidelity is the mean over the perturbed states when `exact_state` is given.
+    The run stops when that energy has not improved on its best by more than `tol` (relative)
+    for `patience` iterations, after `iteration` iterations, or by `stopping`.
+
+    Parameters:
+    function (callable): The function to be optimized.
+    initial_gamma (array-like): Initial values for gamma parameters.
+    initial_beta (array-like): Initial values for beta parameters.
+    initial_phi (array-like, optional): Initial values for phi parameters.
+    initial_theta (array-like, optional): Initial values for theta parameters.
+    bounds (list of tuple, optional): Bounds the parameters are clipped to after every step; [(0, None)] * n
+        like `optimize_by_lbfgsb` if None.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    print_results (bool): Whether to print the optimization process.
+    filepath (str): Path to the CSV file for logging.
+    history_path (str, optional): Directory of the history store.
+    write_csv (bool): Whether to export the history to `filepath` as CSV.
+    precision (str): Precision of the energies ("single" or "double"); sets the defaults of `c` and `tol`.
+    exact_energy (float, optional): Exact ground-state energy for the `relative_error` column.
+    exact_state (np.ndarray, optional): Exact ground state for the `fidelity` column.
+    iteration (int): Maximum number of iterations.
+    a (float, optional): Step gain; calibrated from a few gradient estimates so that the first
+        step has size `target_step` if None.
+    c (float, optional): Perturbation size; 0.1 in single and 0.05 in double precision by default.
+    A (float, optional): Stability constant, 10% of `iteration` by default.
+    alpha (float): Decay exponent of a_k.
+    gamma (float): Decay exponent of c_k.
+    resamplings (int): Perturbations averaged per step.
+    second_order (bool): Use 2-SPSA.
+    regularization (float): Added to the eigenvalues of the 2-SPSA Hessian.
+    target_step (float): First step size used to calibrate `a`.
+    seed (int, optional): Seed of the perturbations.
+    stopping (StoppingCriteria, optional): Early-stopping rules, checked after every iteration.
+    tol (float, optional): Relative improvement that counts as progress; `PRECISION_TOLERANCES` tol by default.
+    patience (int): Iterations without improvement before stopping.
+
+    Returns:
+    tuple: Optimized parameter values.
+    """
+    rng = np.random.default_rng(seed)
+    c = (0.1 if precision == "single" else 0.05) if c is None else c
+    tol = PRECISION_TOLERANCES[precision]['tol'] if tol is None else tol
+    A = 0.1 * iteration if A is None else A
+
+    p = len(initial_gamma)
+    params = np.concatenate([initial_gamma, initial_beta, initial_phi, initial_theta][:parameters]).astype(float)
+    n = len(params)
+    lower, upper = bound_arrays(bounds, n)
+    state_kwargs = {} if exact_state is None else {'return_state': True}
+
+    recorder = RunRecorder(filepath, parameter_names(p, parameters), print_results=print_results, history_path=history_path,
+                           write_csv=write_csv, exact_energy=exact_energy, exact_state=exact_state, stopping=stopping)
+    n_evals = 0
+
+    def evaluate(x):
+        nonlocal n_evals
+        n_evals += 1
+        value = function(**split_parameters(x, parameters), **state_kwargs)
+        if exact_state is None:
+            return value, None
+        energy, state = value
+        return energy, recorder.fidelity(state)
+
+    def perturbation():
+        return rng.choice([-1.0, 1.0], size=n)
+
+    try:
+        if a is None:
+            # Calibrate a so that the first step has size target_step
+            magnitudes = []
+            center = np.clip(params, lower + c, upper - c)
+            for _ in range(max(1, min(5, resamplings * 5))):
+                delta = perturbation()
+                (energy_plus, _), (energy_minus, _) = evaluate(center + c * delta), evaluate(center - c * delta)
+                magnitudes.append(abs(energy_plus - energy_minus) / (2 * c))
+            a = target_step * (A + 1) ** alpha / max(np.mean(magnitudes), 1e-12)
+
+        hessian = np.zeros((n, n))
+        best_energy, since_best = np.inf, 0
+        for k in range(iteration):
+            a_k = a / (k + 1 + A) ** alpha
+            c_k = c / (k + 1) ** gamma
+
+            gradient = np.zeros(n)
+            hessian_estimate = np.zeros((n, n))
+            energies, fidelities = [], []
+            # Perturb around a point at least c_k inside the bounds, so no evaluation leaves them
+            center = np.clip(params, lower + c_k, upper - c_k)
+            for _ in range(resamplings):
+                delta = perturbation()
+                energy_plus, fidelity_plus = evaluate(center + c_k * delta)
+                energy_minus, fidelity_minus = evaluate(center - c_k * delta)
+                gradient += (energy_plus - energy_minus) / (2 * c_k) * delta  # 1 / delta_i == delta_i for +-1
+                energies += [energy_plus, energy_minus]
+                fidelities += [fidelity_plus, fidelity_minus]
+
+                if second_order:
+                    delta2 = perturbation()
+                    energy_plus2, _ = evaluate(np.clip(center + c_k * delta + c_k * delta2, lower, upper))
+                    energy_minus2, _ = evaluate(np.clip(center - c_k * delta + c_k * delta2, lower, upper))
+                    difference = ((energy_plus2 - energy_plus) - (energy_minus2 - energy_minus)) / (2 * c_k ** 2)
+                    outer = difference * np.outer(delta, delta2)
+                    hessian_estimate += (outer + outer.T) / 2
+            gradient /= resamplings
+
+            if second_order:
+                hessian = (k * hessian + hessian_estimate / resamplings) / (k + 1)
+                # Positive-definite version of the averaged Hessian, |H| + regularization
+                eigenvalues, eigenvectors = np.linalg.eigh(hessian)
+                step = eigenvectors @ ((eigenvectors.T @ gradient) / (np.abs(eigenvalues) + regularization))
+            else:
+                step = gradient
+
+            energy = np.mean(energies)
+            recorder.record(energy, params, n_evals, fidelity=np.mean(fidelities) if exact_state is not None else None)
+            if recorder.stop_reason:
+                break
+            if energy < best_energy - tol * max(abs(best_energy) if np.isfinite(best_energy) else 0.0, 1.0):
+                best_energy, since_best = energy, 0
+            else:
+                since_best += 1
+                if since_best >= patience:
+                    break
+            params = np.clip(params - a_k * step, lower, upper)
+    finally:
+        recorder.close()
+
+    return tuple(split_parameters(params, parameters).values())
+
+def evaluate_point(function, params, parameters=2, return_state=False):
+    """Energy (and state if `return_state`) at flattened `params`; a picklable pool job."""
+    if return_state:
+        return function(**split_parameters(params, parameters), return_state=True)
+    return function(**split_parameters(params, parameters))
+
+def parallel_gradient(pool, function, params, parameters=2, h=1e-4, return_state=False):
+    """
+    Energy and central-difference gradient at `params`, all 2n + 1 evaluations in one batch.
+
+    This generalizes `gradient_parallel` to any number of parameter sets: the energy at
+    `params` and at `params +- h e_k` for every k are submitted to the pool together.
+
+    Parameters:
+    pool (multiprocessing.Pool, optional): Pool for the evaluations; evaluated serially if None.
+    function (callable): The function for which the gradient is computed.
+    params (np.ndarray): Flattened parameters.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    h (float): Perturbation for numerical differentiation.
+    return_state (bool): Also return the state at `params` (for fidelity tracking).
+
+    Returns:
+    tuple: (energy, gradient) or (energy, gradient, state).
+    """
+    n = len(params)
+    shifts = np.vstack([np.zeros(n), h * np.eye(n), -h * np.eye(n)])
+    arguments = [(function, params + shift, parameters, return_state and index == 0) for index, shift in enumerate(shifts)]
+    results = pool.starmap(evaluate_point, arguments) if pool else [evaluate_point(*a) for a in arguments]
+    center = results[0]
+    energies = np.real(np.array(results[1:], dtype=complex))
+    gradient = (energies[:n] - energies[n:]) / (2 * h)
+    if return_state:
+        energy, state = center
+        return energy, gradient, state
+    return center, gradient
+
+FIRST_ORDER_METHODS = ("adam", "nesterov", "barzilai-borwein")
+
+def optimize_by_first_order(function, initial_gamma, initial_beta, initial_phi=None, initial_theta=None, bounds=None, parameters=2,
+                            print_results=True, filepath="", history_path=None, write_csv=True, precision="double",
+                            exact_energy=None, exact_state=None, method="adam", alpha=0.05, iteration=1000, h=None,
+                            beta1=0.9, beta2=0.999, epsilon=1e-8, momentum=0.9, max_step=0.5,
+                            gtol=None, patience=20, plateau_tol=None, pool=None, adaptive_steps=False, richardson=False, stopping=None):
+    """
+    Optimize with an adaptive first-order method on the parallel finite-difference gradient.
+
+    Methods:
+    - "adam": Adam with bias-corrected first and second moments.
+    - "nesterov": Nesterov momentum; the gradient is taken at the look-ahead point.
+    - "barzilai-borwein": gradient descent with the BB1 step size s.s / s.y, clipped to
+      [alpha / 100, `max_step` / |g|] and falling back to `alpha` when s.y <= 0.
+
+    The run stops when the gradient norm is below `gtol`, or when the best energy has not
+    improved by more than `plateau_tol` (relative) for `patience` iterations, or after
+    `iteration` iterations. Each iteration costs 2n + 1 evaluations, batched in `pool`.
+
+    Parameters:
+    function (callable): The function to be optimized.
+    initial_gamma (array-like): Initial values for gamma parameters.
+    initial_beta (array-like): Initial values for beta parameters.
+    initial_phi (array-like, optional): Initial values for phi parameters.
+    initial_theta (array-like, optional): Initial values for theta parameters.
+    bounds (list of tuple, optional): Bounds the parameters are clipped to after every step; [(0, None)] * n
+        like `optimize_by_lbfgsb` if None.
+    parameters (int): Number of parameter sets (2, 3, or 4).
+    print_results (bool): Whether to print the optimization process.
+    filepath (str): Path to the CSV file for logging.
+    history_path (str, optional): Directory of the history store.
+    write_csv (bool): Whether to export the history to `filepath` as CSV.
+    precision (str): Precision of the energies ("single" or "double"); sets the defaults of `h`, `gtol`
+        and `plateau_tol` from `PRECISION_TOLERANCES`.
+    exact_energy (float, optional): Exact ground-state energy for the `relative_error` column.
+    exact_state (np.ndarray, optional): Exact ground state for the `fidelity` column.
+    method (str): One of `FIRST_ORDER_METHODS`.
+    alpha (float): Learning rate (initial step size for Barzilai-Borwein).
+    iteration (int): Maximum number of iterations.
+    h (float, optional): Finite-difference step, see `finite_difference_step`.
+    beta1 (float): Adam first-moment decay.
+    beta2 (float): Adam second-moment decay.
+    epsilon (float): Adam denominator offset.
+    momentum (float): Nesterov momentum.
+    max_step (float): Largest Barzilai-Borwein step length.
+    gtol (float, optional): Gradient-norm tolerance.
+    patience (int): Iterations without improvement before stopping.
+    plateau_tol (float, optional): Relative improvement that counts as progress.
+    pool (multiprocessing.Pool, optional): Pool for the gradient evaluations.
+    adaptive_steps (bool): Use per-parameter steps adapted to noise and curvature (`AdaptiveGradient`),
+        starting from `h`.
+    richardson (bool): Use adaptive steps with Richardson extrapolation.
+    stopping (StoppingCriteria, optional): Early-stopping rules, checked after every iteration.
+
+    Returns:
+    tuple: Optimized parameter values.
+    """
+    if method not in FIRST_ORDER_METHODS:
+        raise ValueError(f"Unsupported method {method}, use one of {', '.join(FIRST_ORDER_METHODS)}.")
+    tolerances = PRECISION_TOLERANCES[precision]
+    h = finite_difference_step(precision) if h is None else h
+    gtol = tolerances['gtol'] if gtol is None else gtol
+    plateau_tol = tolerances['tol'] if plateau_tol is None else plateau_tol
+
+    p = len(initial_gamma)
+    params = np.concatenate([initial_gamma, initial_beta, initial_phi, initial_theta][:parameters]).astype(float)
+    n = len(params)
+    lower, upper = bound_arrays(bounds, n)
+
+    recorder = RunRecorder(filepath, parameter_names(p, parameters), print_results=print_results, history_path=history_path,
+                           write_csv=write_csv, exact_energy=exact_energy, exact_state=exact_state, extra_columns=["gradient_norm"], stopping=stopping)
+    first_moment, second_moment, velocity = np.zeros(n), np.zeros(n), np.zeros(n)
+    prev_params, prev_gradient = None, None
+    best_energy, since_best = np.inf, 0
+    adaptive = None
+    if adaptive_steps or richardson:
+        adaptive = AdaptiveGradient(partial(evaluate_point, function, parameters=parameters), n, precision=precision,
+                                    initial_step=h, richardson=richardson, pool=pool, lower=lower, upper=upper)
+    n_evals = 0
+    try:
+        for k in range(iteration):
+            point = np.clip(params + momentum * velocity, lower, upper) if method == "nesterov" else params
+            if adaptive is None:
+                result = parallel_gradient(pool, function, point, parameters, h, return_state=exact_state is not None)
+                energy, gradient = result[0], result[1]
+                state = result[2] if exact_state is not None else None
+                n_evals += 2 * n + 1
+            else:
+                if exact_state is not None:
+                    energy, state = evaluate_point(function, point, parameters, return_state=True)
+                else:
+                    energy, state = evaluate_point(function, point, parameters), None
+                gradient = adaptive.gradient(point, energy)
+                n_evals = (k + 1) + adaptive.n_evals
+            gradient_norm = np.linalg.norm(gradient)
+            recorder.record(energy, point, n_evals, fidelity=recorder.fidelity(state) if exact_state is not None else None,
+                            gradient_norm=gradient_norm)
+
+            if recorder.stop_reason or gradient_norm < gtol:
+                break
+            if energy < best_energy - plateau_tol * max(abs(best_energy) if np.isfinite(best_energy) else 0.0, 1.0):
+                best_energy, since_best = energy, 0
+            else:
+                since_best += 1
+                if since_best >= patience:
+                    break
+
+            if method == "adam":
+                first_moment = beta1 * first_moment + (1 - beta1) * gradient
+                second_moment = beta2 * second_moment + (1 - beta2) * gradient ** 2
+                corrected_first = first_moment / (1 - beta1 ** (k + 1))
+                corrected_second = second_moment / (1 - beta2 ** (k + 1))
+                new_params = params - alpha * corrected_first / (np.sqrt(corrected_second) + epsilon)
+            elif method == "nesterov":
+                velocity = momentum * velocity - alpha * gradient
+                new_params = params + velocity
+            else:
+                step_size = alpha
+                if prev_gradient is not None:
+                    s, y = params - prev_params, gradient - prev_gradient
+                    if s @ y > 0:
+                        step_size = np.clip((s @ s) / (s @ y), alpha / 100, max_step / max(gradient_norm, 1e-12))
+                prev_params, prev_gradient = params, gradient
+                new_params = params - step_size * gradient
+
+            params = np.clip(new_params, lower, upper)
+    finally:
+        recorder.close()
+
+    return tuple(split_parameters(params, parameters).values())
+
+# Optimizers sharing the `optimize_by_lbfgsb` interface, selectable by name from the drivers
+OPTIMIZERS = {
+    "lbfgsb": optimize_by_lbfgsb,
+    "natural-gradient": optimize_by_natural_gradient,
+    "spsa": optimize_by_spsa,
+    "2-spsa": partial(optimize_by_spsa, second_order=True),
+    "adam": partial(optimize_by_first_order, method="adam"),
+    "nesterov": partial(optimize_by_first_order, method="nesterov"),
+    "barzilai-borwein": partial(optimize_by_first_order, method="barzilai-borwein"),
+}
+
+# Optimizers of `OPTIMIZERS` that batch their evaluations in a `pool` argument
+POOLED_OPTIMIZERS = ("natural-gradient", "adam", "nesterov", "barzilai-borwein")
+
 def get_gradient(function, gamma, beta, delta_gamma, delta_beta, iter):
     """
     Compute the gradient of a function with respect to gamma and beta parameters.
@@ -176,29 +1098,21 @@ def optimize_by_gradient_descent(function, initial_gamma, initial_beta, alpha, d
     """
     gamma, beta = initial_gamma, initial_beta
 
-    textlines = []
     headline = ["iter", "energy"]
     for p in range(int(len(initial_gamma))):
         headline.append(f"gamma[{p}]")
         headline.append(f"beta[{p}]")
     print(headline)
-    textlines.append(headline)
 
-    for iter in range(int(iteration)):
-        grad_gamma, grad_beta = get_gradient(function, gamma, beta, delta_gamma, delta_beta, iter)
-        gamma -= alpha * grad_gamma
-        beta -= alpha * grad_beta
-        energy = function(gamma=gamma, beta=beta)
+    with BackgroundLogger(filepath, header=headline) as logger:
+        for iter in range(int(iteration)):
+            grad_gamma, grad_beta = get_gradient(function, gamma, beta, delta_gamma, delta_beta, iter)
+            gamma -= alpha * grad_gamma
+            beta -= alpha * grad_beta
+            energy = function(gamma=gamma, beta=beta)
 
-        record = [iter, energy] + list(gamma) + list(beta)
-        textlines.append(record)
-        print(record)
-    
-    if filepath:
-        with open(filepath, mode='a') as f:
-            writer = csv.writer(f)
-            for textline in textlines:
-                writer.writerow(textline)
+            record = [iter, energy] + list(gamma) + list(beta)
+            logger.log(record)
 
     return gamma, beta
 
@@ -264,29 +1178,21 @@ def optimize_by_gradient_descent_gpu(function, initial_gamma, initial_beta, alph
     """
     gamma, beta = np.asarray(initial_gamma), np.asarray(initial_beta)
 
-    textlines = []
     headline = ["iter", "energy"]
     for p in range(int(len(initial_gamma))):
         headline.append(f"gamma[{p}]")
         headline.append(f"beta[{p}]")
     print(headline)
-    textlines.append(headline)
 
-    for iter in range(int(iteration)):
-        grad_gamma, grad_beta = get_gradient_gpu(function, gamma, beta, delta_gamma, delta_beta, iter)
-        gamma -= alpha * grad_gamma
-        beta -= alpha * grad_beta
-        energy = function(gamma=gamma, beta=beta)
+    with BackgroundLogger(filepath, header=headline) as logger:
+        for iter in range(int(iteration)):
+            grad_gamma, grad_beta = get_gradient_gpu(function, gamma, beta, delta_gamma, delta_beta, iter)
+            gamma -= alpha * grad_gamma
+            beta -= alpha * grad_beta
+            energy = function(gamma=gamma, beta=beta)
 
-        record = [iter, energy] + list(gamma) + list(beta)
-        textlines.append(record)
-        print(record)
-    
-    if filepath:
-        with open(filepath, mode='a') as f:
-            writer = csv.writer(f)
-            for textline in textlines:
-                writer.writerow(textline)
+            record = [iter, energy] + list(gamma) + list(beta)
+            logger.log(record)
 
     return gamma, beta
 
@@ -358,10 +1264,14 @@ def partial_derivative_beta(f, gamma, beta, i, h=1e-5, variable='beta'):
     derivative = (f(gamma=gamma, beta=var_plus).real - f(gamma=gamma, beta=var_minus).real) / (2 * h)
     return derivative
 
-def optimize_by_gradient_descent_multiprocess(function, initial_gamma, initial_beta, alpha, delta_gamma, delta_beta, iteration, tol, figure=True, filepath="", pool=mp.Pool(2)):
+def optimize_by_gradient_descent_multiprocess(function, initial_gamma, initial_beta, alpha, delta_gamma, delta_beta, iteration, tol, figure=True, filepath="", pool=None,
+                                               patience=20, stopping=None):
     """
     Optimize a function using gradient descent with multiprocessing.
 
+    The run stops when the relative energy change has stayed below `tol` for `patience`
+    consecutive iterations, when `stopping` fires, or after `iteration` iterations.
+
     Parameters:
     function (callable): The function to be optimized.
     initial_gamma (array-like): Initial values for gamma parameters.
@@ -370,32 +1280,38 @@ def optimize_by_gradient_descent_multiprocess(function, initial_gamma, initial_b
     delta_gamma (float): Perturbation for gamma.
     delta_beta (float): Perturbation for beta.
     iteration (int): Number of iterations.
-    tol (float): Tolerance for convergence.
+    tol (float): Relative energy change below which an iteration counts as converged.
     figure (bool): Whether to print the optimization process.
     filepath (str): Path to the CSV file for logging.
-    pool (multiprocessing.Pool): Pool object for multiprocessing.
+    pool (multiprocessing.Pool, optional): Pool object for multiprocessing; a pool of 2 processes is
+        created (and closed) when None.
+    patience (int): Consecutive converged iterations before stopping.
+    stopping (StoppingCriteria, optional): Early-stopping rules, checked after every iteration.
 
     Returns:
     tuple: Optimized gamma and beta parameters.
     """
+    if pool is None:
+        with mp.Pool(2) as own_pool:
+            return optimize_by_gradient_descent_multiprocess(function, initial_gamma, initial_beta, alpha, delta_gamma, delta_beta,
+                                                             iteration, tol, figure, filepath, own_pool, patience, stopping)
+
     gamma, beta = initial_gamma.copy(), initial_beta.copy()
-    min_iterations = max(1, int(0.1 * iteration)) if iteration != -1 else 1  # Ensure at least 10% of the total iterations, minimum of 1
+    start_time = time.time()
+    n_evals, converged = 0, 0
 
-    with open(filepath, mode='a', newline='') as f:
-        writer = csv.writer(f)
-        headline = ["iter", "energy"]
-        for p in range(int(len(initial_gamma))):
-            headline.append(f"gamma[{p}]")
-            headline.append(f"beta[{p}]")
-        print(headline)
-        writer.writerow(headline)
+    headline = ["iter", "energy"]
+    for p in range(int(len(initial_gamma))):
+        headline.append(f"gamma[{p}]")
+        headline.append(f"beta[{p}]")
+    print(headline)
+
+    with BackgroundLogger(filepath, header=headline, echo=figure) as logger:
 
         iter = 0
         while True:
             if iter == 0:
                 energy = 0
-            prev_gamma = gamma.copy()
-            prev_beta = beta.copy()
             prev_energy = energy
             
             grad_gamma, grad_beta = gradient_parallel(pool, function, gamma, beta, delta_gamma)
@@ -404,19 +1320,20 @@ def optimize_by_gradient_descent_multiprocess(function, initial_gamma, initial_b
             beta -= alpha * grad_beta
             
             energy = function(gamma=gamma, beta=beta)
+            n_evals += 4 * len(gamma) + 1
 
-            gamma_change = max(abs((gamma - prev_gamma) / (prev_gamma + 1e-10)))
-            beta_change = max(abs((beta - prev_beta) / (prev_beta + 1e-10)))        
             energy_change = abs((energy - prev_energy) / (prev_energy + 1e-10))
             
-            if iter >= min_iterations and energy_change < tol:
+            record = [iter, energy] + [val for pair in zip(gamma, beta) for val in pair]
+            logger.log(record)
+
+            converged = converged + 1 if iter > 0 and energy_change < tol else 0
+            if converged >= patience:
                 print(f"Converged at iteration {iter}")
                 break
-            
-            record = [iter, energy] + [val for pair in zip(gamma, beta) for val in pair]
-            writer.writerow(record)
-            if figure:
-                print(record)
+            if stopping is not None and stopping.check(energy, n_evals, time.time() - start_time):
+                print(f"Stopped at iteration {iter}: {stopping.reason}")
+                break
 
             if iteration != -1 and iter >= iteration - 1:
                 break
@@ -0,0 +1,231 @@
+import os
+import math
+import atexit
+import itertools
+import multiprocessing as mp
+import numpy as np
+from hamiltonian import lattice_bonds
+
+_POOLS = {}  # (pid, processes) -> multiprocessing.Pool, reused across energy evaluations and closed at exit
+
+def _close_pools():
+    """Close and join the pools this process created (forked children inherit, but do not own, the parent's)."""
+    for (pid, processes) in list(_POOLS):
+        if pid == os.getpid():
+            pool = _POOLS.pop((pid, processes))
+            pool.close()
+            pool.join()
+
+atexit.register(_close_pools)
+
+def cut_qubits(rows, cols, cut_col=None):
+    """
+    Indices of the qubits left of a cut between two column blocks (qsimh part 0, option 'k').
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        cut_col (int, optional): First column right of the cut; defaults to `cols // 2`.
+
+    Returns:
+        List[int]: Qubit indices of columns `0 .. cut_col - 1`.
+    """
+    cut_col = cols // 2 if cut_col is None else cut_col
+    return [i * cols + j for i in range(rows) for j in range(cut_col)]
+
+def schmidt_rank(operation, tol=1e-10):
+    """Operator Schmidt rank of a two-qubit operation, i.e. the number of paths qsimh opens at a cut through it."""
+    import cirq  # Imported here, like qsimcirq, so that importing this module stays cheap
+    unitary = cirq.unitary(operation).reshape(2, 2, 2, 2)  # (out_a, out_b, in_a, in_b)
+    matrix = unitary.transpose(0, 2, 1, 3).reshape(4, 4)  # (a, a') x (b, b')
+    singular_values = np.linalg.svd(matrix, compute_uv=False)
+    return int(np.sum(singular_values > tol * singular_values[0]))
+
+def cut_gates(circuit, part):
+    """The two-qubit operations of a circuit that cross the cut between part 0 (qubit indices `part`) and the rest."""
+    index = {qubit: n for n, qubit in enumerate(sorted(circuit.all_qubits()))}
+    part = set(part)
+    return [op for op in circuit.all_operations()
+            if len(op.qubits) == 2 and (index[op.qubits[0]] in part) != (index[op.qubits[1]] in part)]
+
+def prefix_paths(circuit, part, prefix_gates):
+    """
+    Number of prefix paths (values of qsimh option 'w') for the first `prefix_gates` cut gates.
+
+    Args:
+        circuit (cirq.Circuit): Circuit on GridQubits.
+        part (List[int]): Qubit indices of part 0.
+        prefix_gates (int): qsimh option 'p'.
+
+    Returns:
+        int: Product of the Schmidt ranks of the prefix gates.
+    """
+    gates = cut_gates(circuit, part)
+    if prefix_gates > len(gates):
+        raise ValueError(f"{prefix_gates} prefix gates requested, but only {len(gates)} gates cross the cut.")
+    return math.prod(schmidt_rank(op) for op in gates[:prefix_gates])
+
+def total_paths(circuit, part):
+    """Number of paths qsimh sums over, the product of the Schmidt ranks of all cut gates; its cost is linear in it."""
+    return math.prod(schmidt_rank(op) for op in cut_gates(circuit, part))
+
+def sector_bitstrings(n_qubits, n_up=None):
+    """
+    Iterate over the bitstrings (as ints, big-endian in qubit index) with `n_up` ones, i.e. one S_z sector.
+
+    Args:
+        n_qubits (int): Number of qubits.
+        n_up (int, optional): Number of ones; defaults to the S_z = 0 sector, n_qubits / 2.
+
+    Raises:
+        ValueError: If `n_up` is not given and `n_qubits` is odd, so there is no S_z = 0 sector.
+    """
+    if n_up is None:
+        if n_qubits % 2:
+            raise ValueError(f"{n_qubits} qubits have no S_z = 0 sector; qsimh mode needs an even number of sites.")
+        n_up = n_qubits // 2
+    for ones in itertools.combinations(range(n_qubits), n_up):
+        yield sum(1 << (n_qubits - 1 - qubit) for qubit in ones)
+
+def qsimh_amplitudes(circuit, options, bitstrings):
+    """
+    Partial amplitudes of one prefix path (one value of options['w']) for a block of bitstrings; a pool job.
+
+    Args:
+        circuit (cirq.Circuit): Circuit to simulate.
+        options (dict): qsimh options 'k', 'p', 'r' and 'w'.
+        bitstrings (np.ndarray): Bitstrings (big-endian int64) to compute the amplitudes of.
+
+    Returns:
+        np.ndarray: complex128 partial amplitudes, in the order of `bitstrings`.
+    """
+    import qsimcirq
+    simulator = qsimcirq.QSimhSimulator(options)
+    return np.asarray(simulator.compute_amplitudes(circuit, bitstrings=bitstrings.tolist()), dtype=np.complex128)
+
+def heisenberg_energy_from_amplitudes(amplitudes, n_qubits, bonds, bitstrings, block_size=4096, return_norm=False):
+    """
+    <psi|sum_bonds (XX + YY + ZZ)|psi>, assembled block by block from the amplitudes of an S_z sector.
+
+    For a bitstring z, ZZ on a bond gives +1 or -1 and (XX + YY) maps z to z with the two bits
+    swapped (factor 2) if they differ and annihilates it otherwise, so a block only needs the
+    amplitudes of its bitstrings and of their bond-flipped partners. Only O(block_size * bonds)
+    amplitudes are held at a time.
+
+    Args:
+        amplitudes (callable): Maps an array of bitstrings to their complex amplitudes.
+        n_qubits (int): Number of qubits.
+        bonds (List[Tuple[int, int]]): Bonds as qubit index pairs.
+        bitstrings (iterable): Bitstrings (big-endian ints) carrying the state, e.g. one S_z sector;
+            flipping a bond must not leave this set.
+        block_size (int): Number of bitstrings per block.
+        return_norm (bool): If True, also return the squared norm of the amplitudes of `bitstrings`.
+
+    Returns:
+        float: The energy (and the norm if `return_norm`).
+    """
+    masks = np.array([(1 << (n_qubits - 1 - a)) | (1 << (n_qubits - 1 - b)) for a, b in bonds], dtype=np.int64)
+    bits_a = np.array([1 << (n_qubits - 1 - a) for a, _ in bonds], dtype=np.int64)
+    bits_b = np.array([1 << (n_qubits - 1 - b) for _, b in bonds], dtype=np.int64)
+
+    energy, norm = 0.0, 0.0
+    iterator = iter(bitstrings)
+    while True:
+        block = np.fromiter(itertools.islice(iterator, block_size), dtype=np.int64)
+        if block.size == 0:
+            return (energy, norm) if return_norm else energy
+
+        # Bonds with antiparallel spins, shape (block, bonds)
+        differ = ((block[:, None] & bits_a) != 0) != ((block[:, None] & bits_b) != 0)
+        partners = block[:, None] ^ masks
+        needed = np.unique(np.concatenate([block, partners[differ]]))
+        values = amplitudes(needed)
+
+        psi = values[np.searchsorted(needed, block)]
+        diagonal = np.sum(np.where(differ, -1.0, 1.0), axis=1)  # ZZ
+        probabilities = np.abs(psi) ** 2
+        energy += np.sum(diagonal * probabilities)
+        norm += np.sum(probabilities)
+
+        rows, cols = np.nonzero(differ)
+        psi_partner = values[np.searchsorted(needed, partners[rows, cols])]
+        energy += 2 * np.sum(np.real(np.conj(psi[rows]) * psi_partner))  # XX + YY
+
+def get_expectation_qsimh(circuit, rows, cols, periodic, qsimh_option):
+    """
+    Heisenberg energy of a lattice ansatz with the hybrid Schrödinger-Feynman simulator qsimh.
+
+    The lattice is cut between two column blocks; each block is simulated as a state vector of
+    its own (2^(N/2) amplitudes instead of 2^N), and the paths through the gates crossing the cut
+    are summed. The first `prefix_gates` cut gates are fixed per job, so every prefix path
+    (qsimh option 'w') is an independent job run in a process pool.
+
+    The S_z = 0 sector is streamed in blocks of `block_size` bitstrings: for every block, each
+    path job computes the amplitudes of just the block and its bond-flipped partners, the
+    partial amplitudes are summed as the jobs finish, and the block's share of the energy is
+    added (see `heisenberg_energy_from_amplitudes`). So no process ever holds the C(N, N/2)
+    sector, let alone the 2^N vector, only O(block_size * bonds) amplitudes besides the two
+    half-lattice states. The singlet-product ansatz never leaves the sector; the norm of the
+    sector amplitudes is checked, so a state outside it raises instead of giving a wrong energy.
+
+    The cost is linear in the number of paths, the product of the Schmidt ranks of all cut
+    gates, which grows exponentially with p and the number of bonds crossing the cut; above
+    `max_paths` a ValueError is raised rather than starting a run that would not finish. Each
+    path is simulated once per block, so a larger `block_size` trades memory for fewer runs.
+
+    Args:
+        circuit (cirq.Circuit): Ansatz circuit on GridQubits.
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        periodic (bool): If True, periodic boundary conditions are used.
+        qsimh_option (dict): Optional keys 'cut_col' (first column right of the cut, default
+            cols // 2), 'prefix_gates' (qsimh 'p', default 2), 'root_gates' (qsimh 'r', default 0),
+            'processes' (pool size, default: the number of prefix paths, at most the CPU count),
+            'block_size' (bitstrings per block, default 2^16) and 'max_paths' (largest number of
+            cut paths allowed, default 2^16).
+
+    Returns:
+        float: The energy.
+
+    Raises:
+        ValueError: If the lattice has an odd number of columns, the cut has more than `max_paths`
+            paths, or the state is not in the S_z = 0 sector.
+    """
+    if cols % 2:
+        raise ValueError(f"qsimh mode needs an even number of columns ({rows}x{cols} given): the ansatz pairs "
+                         "columns into singlets, and only then stays in the S_z = 0 sector.")
+    n_qubits = rows * cols
+    part = cut_qubits(rows, cols, qsimh_option.get('cut_col'))
+    paths, max_paths = total_paths(circuit, part), qsimh_option.get('max_paths', 2 ** 16)
+    if paths > max_paths:
+        raise ValueError(f"The cut of the {rows}x{cols} circuit has {paths} paths (more than max_paths = {max_paths}); "
+                         "use a smaller p, a cut through fewer bonds (cut_col, OBC) or the state-vector mode.")
+    prefix_gates = qsimh_option.get('prefix_gates', 2)
+    options = {'k': part, 'p': prefix_gates, 'r': qsimh_option.get('root_gates', 0)}
+    path_options = [dict(options, w=w) for w in range(prefix_paths(circuit, part, prefix_gates))]
+
+    processes = qsimh_option.get('processes', min(len(path_options), mp.cpu_count()))
+    if mp.current_process().daemon:
+        processes = 1  # Inside a pool worker (e.g. multi-start), which cannot have children
+    key = (os.getpid(), processes)
+    if processes > 1 and key not in _POOLS:
+        _POOLS[key] = mp.Pool(processes)
+    pool = _POOLS.get(key)
+
+    def amplitudes(bitstrings):
+        # One hybrid simulation per prefix path for this block, summed as the paths finish
+        arguments = [(circuit, path, bitstrings) for path in path_options]
+        values = np.zeros(bitstrings.size, dtype=np.complex128)
+        for partial_values in (pool.imap_unordered(_qsimh_amplitudes_job, arguments) if pool else map(_qsimh_amplitudes_job, arguments)):
+            values += partial_values
+        return values
+
+    energy, norm = heisenberg_energy_from_amplitudes(amplitudes, n_qubits, lattice_bonds(rows, cols, periodic), sector_bitstrings(n_qubits),
+                                                     qsimh_option.get('block_size', 2 ** 16), return_norm=True)
+    if abs(norm - 1) > 1e-4:
+        raise ValueError(f"The state has norm {norm:.6f} in the S_z = 0 sector; qsimh mode needs an S_z-conserving ansatz "
+                         "on an S_z = 0 initial state.")
+    return energy
+
+def _qsimh_amplitudes_job(arguments):
+    return qsimh_amplitudes(*arguments)
@@ -0,0 +1,183 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+from functools import lru_cache
+import numpy as np
+
+PY_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Keys of a driver section that select jobs or name outputs, but do not change the result of a job
+NON_RESULT_KEYS = ("length_list", "rows_list", "cols_list", "p_list", "results_dir_path", "catalog_path", "result_cache")
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Digest of the py/ modules (drivers included), so that any code change invalidates cached results.
+
+    Returns:
+        str: First 16 hex digits of the sha256 over the module names and contents.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(PY_DIR, "*.py"))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def result_key(model, rows, cols, boundary, p, initial_params, optimizer, settings):
+    """
+    Content address of a job: sha256 of everything its result depends on.
+
+    Args:
+        model (str): Model name, i.e. the driver's output file prefix.
+        rows (int): Number of rows (1 for a chain).
+        cols (int): Number of columns (the chain length for a chain).
+        boundary (str): "PBC" or "OBC".
+        p (int): Number of ansatz layers.
+        initial_params (array-like): Flattened initial parameters.
+        optimizer (str): Optimizer name.
+        settings (dict): The driver's TOML section; `NON_RESULT_KEYS` are left out.
+
+    Returns:
+        str: 64 hex digits.
+    """
+    description = {
+        "model": model,
+        "rows": int(rows),
+        "cols": int(cols),
+        "boundary": boundary,
+        "p": int(p),
+        "initial_params": [float(value) for value in np.ravel(initial_params)],
+        "optimizer": optimizer,
+        "settings": {key: value for key, value in settings.items() if key not in NON_RESULT_KEYS},
+        "code": code_version(),
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode()).hexdigest()
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _tree_digests(root):
+    """sha256 of every file below `root` (a file or a directory such as a history store), by relative path."""
+    if os.path.isfile(root):
+        return {"": _file_digest(root)}
+    digests = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            digests[os.path.relpath(path, root)] = _file_digest(path)
+    return digests
+
+class ResultCache:
+    """
+    Content-addressed store of the outputs of finished jobs.
+
+    A job's outputs are all files and directories next to its CSV that start with the CSV's
+    stem (`<prefix>_l16_p4_<timestamp>`): the CSV, the parameter TOML, the history store, the
+    stage and multistart CSVs and the observables. They are kept by suffix under
+    `<root>/<key[:2]>/<key>/`, with a manifest of the sha256 of every file, and restored under
+    the stem of a new sweep, so a rerun with an extended `p_list` only computes the new jobs.
+    An entry is valid only if every file of its manifest is present and unchanged; entries are
+    written to a temporary directory first and renamed into place, so concurrent workers never
+    see half an entry.
+
+    Attributes:
+        root (str): Cache directory, outside the results directories that the drivers clear.
+    """
+    def __init__(self, root=".results/cache"):
+        """
+        Args:
+            root (str): Cache directory, created if needed.
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """
+        The manifest of a valid entry.
+
+        Args:
+            key (str): From `result_key`.
+
+        Returns:
+            dict or None: `outputs` (suffix to file digests) and the metadata stored with the entry,
+                or None if there is no entry or it is incomplete or corrupted.
+        """
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        for suffix, digests in manifest["outputs"].items():
+            path = os.path.join(entry, "run" + suffix)
+            if not os.path.exists(path) or _tree_digests(path) != digests:
+                return None
+        return manifest
+
+    def put(self, key, stem, metadata=None):
+        """
+        Store the outputs of a finished job.
+
+        Args:
+            key (str): From `result_key`.
+            stem (str): Path of the job's CSV without `.csv`.
+            metadata (dict, optional): JSON-serializable information kept in the manifest.
+
+        Returns:
+            bool: True if the entry was written, False if a valid one already existed or there are no outputs.
+        """
+        paths = glob.glob(glob.escape(stem) + "*")
+        if not paths or self.get(key) is not None:
+            return False
+        entry = self._entry(key)
+        tmp_entry = f"{entry}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+        outputs = {}
+        for path in paths:
+            suffix = path[len(stem):]
+            target = os.path.join(tmp_entry, "run" + suffix)
+            if os.path.isdir(path):
+                shutil.copytree(path, target)
+            else:
+                shutil.copy2(path, target)
+            outputs[suffix] = _tree_digests(target)
+        with open(os.path.join(tmp_entry, "manifest.json"), 'w') as f:
+            json.dump({"key": key, "code": code_version(), "outputs": outputs, **(metadata or {})}, f, indent=1)
+        shutil.rmtree(entry, ignore_errors=True)  # An invalid entry, since get() failed
+        os.replace(tmp_entry, entry)
+        return True
+
+    def restore(self, key, stem):
+        """
+        Copy the outputs of a cached job to the paths of a new one.
+
+        Args:
+            key (str): From `result_key`.
+            stem (str): Path of the new job's CSV without `.csv`.
+
+        Returns:
+            dict or None: The manifest if the outputs were restored, None on a cache miss.
+        """
+        manifest = self.get(key)
+        if manifest is None:
+            return None
+        entry = self._entry(key)
+        for suffix in manifest["outputs"]:
+            source, target = os.path.join(entry, "run" + suffix), stem + suffix
+            if os.path.isdir(source):
+                shutil.rmtree(target, ignore_errors=True)
+                shutil.copytree(source, target)
+            else:
+                shutil.copy2(source, target)
+        return manifest
@@ -0,0 +1,396 @@
+import os
+import atexit
+import itertools
+import tempfile
+from multiprocessing import util
+from functools import lru_cache
+import numpy as np
+from kernels import apply_gate
+
+_STATES = {}  # (pid, directory, n_qubits, dtype) -> MemmapStateVector, reused across energy evaluations and deleted at exit
+
+def circuit_moments(circuit, qubits):
+    """
+    The gates of a circuit as unitaries on qubit indices, moment by moment.
+
+    Args:
+        circuit (cirq.Circuit): Circuit of unitary gates.
+        qubits (list): The circuit's qubits in state order (the first is the most significant).
+
+    Returns:
+        List[List[Tuple[np.ndarray, list]]]: (unitary, qubit indices) of every moment.
+    """
+    import cirq
+
+    index = {qubit: n for n, qubit in enumerate(qubits)}
+    return [[(cirq.unitary(op), [index[q] for q in op.qubits]) for op in moment.operations] for moment in circuit]
+
+def plan_passes(moments, n_qubits, block_qubits, max_high_qubits=2):
+    """
+    Group the gates into passes over the state.
+
+    The last `block_qubits` positions are "low", i.e. inside a block; a gate on high positions
+    needs the 2^h blocks that differ in them at once. A pass keeps a set of at most
+    `max_high_qubits` high positions and takes gates as long as their high positions fit, so
+    each pass reads and writes every block once, however many gates it applies. Gates of a
+    moment commute, so the ones that fit the current pass are taken first.
+
+    Args:
+        moments (list): (unitary, positions) of the gates of every moment, in circuit order.
+        n_qubits (int): Number of qubits.
+        block_qubits (int): Qubits per block.
+        max_high_qubits (int): Most high positions of a pass (a pass holds 2^this blocks in memory).
+
+    Returns:
+        List[Tuple[list, list]]: (sorted high positions, gates) per pass.
+    """
+    low_start = n_qubits - block_qubits
+    passes, high, current = [], set(), []
+    for moment in moments:
+        remaining = [(gate, {q for q in gate[1] if q < low_start}) for gate in moment]
+        while remaining:
+            index = next((i for i, (_, gate_high) in enumerate(remaining) if len(high | gate_high) <= max_high_qubits), None)
+            if index is None:
+                if current:
+                    passes.append((sorted(high), current))
+                high, current, index = set(), [], 0
+            gate, gate_high = remaining.pop(index)
+            high |= gate_high
+            current.append(gate)
+    if current:
+        passes.append((sorted(high), current))
+    return passes
+
+@lru_cache(maxsize=32)
+def plan_qubit_order(layout, n_qubits, block_qubits, max_high_qubits=2, sweeps=2):
+    """
+    Qubit positions that minimize the number of passes of a circuit layout, planned once per layout.
+
+    Frequently used qubits are first put in the low positions, then high and low qubits are
+    swapped as long as a swap saves passes (`plan_passes` on the layout).
+
+    Args:
+        layout (tuple): Qubit indices of the gates of every moment, e.g. from `circuit_layout`.
+        n_qubits (int): Number of qubits.
+        block_qubits (int): Qubits per block.
+        max_high_qubits (int): See `plan_passes`.
+        sweeps (int): Most rounds of pairwise swaps.
+
+    Returns:
+        tuple: order[q], the state position of qubit q.
+    """
+    def passes(order):
+        moments = [[(None, [order[q] for q in targets]) for targets in moment] for moment in layout]
+        return len(plan_passes(moments, n_qubits, block_qubits, max_high_qubits))
+
+    uses = np.zeros(n_qubits, dtype=int)
+    for moment in layout:
+        for targets in moment:
+            uses[list(targets)] += 1
+    order = [0] * n_qubits
+    for position, qubit in enumerate(np.argsort(uses, kind='stable')):  # Least used first, i.e. in the high positions
+        order[qubit] = position
+    best = passes(order)
+    low_start = n_qubits - block_qubits
+    for _ in range(sweeps):
+        improved = False
+        for a, b in itertools.product(range(n_qubits), repeat=2):
+            if order[a] < low_start <= order[b]:
+                order[a], order[b] = order[b], order[a]
+                count = passes(order)
+                if count < best:
+                    best, improved = count, True
+                else:
+                    order[a], order[b] = order[b], order[a]
+        if not improved:
+            break
+    return tuple(order)
+
+def circuit_layout(moments):
+    """Hashable qubit indices of the gates of `circuit_moments`, the key of `plan_qubit_order`."""
+    return tuple(tuple(tuple(targets) for _, targets in moment) for moment in moments)
+
+class BlockedStateVector:
+    """
+    A state vector processed in blocks of 2^block_qubits amplitudes.
+
+    Block k holds the amplitudes whose high (first) n - block_qubits positions spell k, so every
+    block starts at a multiple of its size. Gates are applied pass by pass (see `plan_passes`)
+    on groups of at most 2^max_high_qubits blocks: in memory, a group the size of the cache
+    takes all the gates of a pass before it is written back, instead of one sweep over the
+    whole state per gate; on disk (`MemmapStateVector`) only a group is ever in RAM.
+
+    Qubit q is stored at position `order[q]`, so a qubit order from `plan_qubit_order` keeps
+    the busiest qubits inside the blocks; `vector()` returns the amplitudes in qubit order.
+
+    Attributes:
+        n_qubits (int): Number of qubits.
+        block_qubits (int): Qubits per block.
+        max_high_qubits (int): See `plan_passes`.
+        order (tuple): Position of every qubit.
+        state (np.ndarray): The amplitudes in position order.
+    """
+    def __init__(self, state, block_qubits=16, max_high_qubits=2, order=None):
+        """
+        Args:
+            state (np.ndarray): Flat array of 2^n amplitudes in position order (np.memmap included), updated in place.
+            block_qubits (int): Qubits per block, 2^block_qubits amplitudes.
+            max_high_qubits (int): See `plan_passes`.
+            order (tuple, optional): Position of every qubit; the identity by default.
+        """
+        self.state = state
+        self.n_qubits = int(np.log2(len(state)))
+        self.block_qubits = min(block_qubits, self.n_qubits)
+        self.max_high_qubits = max_high_qubits
+        self.order = tuple(range(self.n_qubits)) if order is None else tuple(order)
+
+    @classmethod
+    def from_vector(cls, vector, block_qubits=16, max_high_qubits=2, order=None, dtype=np.complex64):
+        """
+        A copy of a state vector in qubit order, rearranged into the positions of `order`.
+
+        Returns:
+            BlockedStateVector: The blocked state.
+        """
+        n_qubits = int(np.log2(len(vector)))
+        tensor = np.array(vector, dtype=dtype).reshape((2,) * n_qubits)
+        if order is not None:
+            tensor = np.transpose(tensor, np.argsort(order))  # Position p holds the qubit q with order[q] = p
+        return cls(np.ascontiguousarray(tensor).reshape(-1), block_qubits, max_high_qubits, order)
+
+    @property
+    def block_size(self):
+        return 2 ** self.block_qubits
+
+    @property
+    def n_blocks(self):
+        return 2 ** (self.n_qubits - self.block_qubits)
+
+    def _block(self, k):
+        return self.state[k * self.block_size:(k + 1) * self.block_size]
+
+    def _low_axis(self, position):
+        """Axis of a low position in a block reshaped to (2,) * block_qubits."""
+        return position - (self.n_qubits - self.block_qubits)
+
+    def _position_mask(self, mask):
+        """A bit mask over qubits (bit n - 1 - q for qubit q) as a mask over positions."""
+        return sum(1 << (self.n_qubits - 1 - self.order[q]) for q in range(self.n_qubits) if (mask >> (self.n_qubits - 1 - q)) & 1)
+
+    def vector(self):
+        """
+        The amplitudes in qubit order.
+
+        Returns:
+            np.ndarray: The state itself with the identity order, otherwise a transposed copy.
+        """
+        if self.order == tuple(range(self.n_qubits)):
+            return self.state
+        return np.ascontiguousarray(np.transpose(self.state.reshape((2,) * self.n_qubits), self.order)).reshape(-1)
+
+    def apply_circuit(self, circuit, qubits):
+        """
+        Apply the gates of a circuit, streaming over the blocks.
+
+        Args:
+            circuit (cirq.Circuit): Circuit of unitary gates.
+            qubits (list): The circuit's qubits in qubit order (the first is the most significant).
+        """
+        self.apply_moments(circuit_moments(circuit, qubits))
+
+    def apply_moments(self, moments):
+        """Apply the gates of `circuit_moments`, pass by pass."""
+        moments = [[(unitary, [self.order[q] for q in targets]) for unitary, targets in moment] for moment in moments]
+        for high, gates in plan_passes(moments, self.n_qubits, self.block_qubits, self.max_high_qubits):
+            self._apply_pass(high, gates)
+
+    def _apply_pass(self, high, gates):
+        positions = [self.n_qubits - 1 - q - self.block_qubits for q in high]  # Bits of the high positions in a block index
+        high_mask = sum(1 << p for p in positions)
+        axes = {q: a for a, q in enumerate(high)}
+        targets = [(unitary, [axes[q] if q in axes else len(high) + self._low_axis(q) for q in gate_targets])
+                   for unitary, gate_targets in gates]
+        for k in range(self.n_blocks):
+            if k & high_mask:
+                continue
+            members = [k | sum(bit << p for bit, p in zip(bits, positions)) for bits in itertools.product((0, 1), repeat=len(high))]
+            group = np.stack([self._block(m) for m in members])
+            for unitary, target_axes in targets:
+                apply_gate(group.reshape(-1), unitary, target_axes)
+            for m, values in zip(members, group):
+                self._block(m)[:] = values
+
+    def expectation(self, hamiltonian, accumulator="double"):
+        """
+        <psi|H|psi> of a `CompiledHamiltonian`, streaming over the blocks.
+
+        For every block, each flip-mask group needs the block whose high bits differ by the
+        group's high flip bits (read once per distinct high flip), with its low bits flipped by
+        axis reversal. The phase tensor of a group is assembled per block from its terms, so
+        nothing of the size of the full state is ever built.
+
+        Args:
+            hamiltonian (CompiledHamiltonian): The observable, on `n_qubits` qubits in qubit order.
+            accumulator (str): "single" or "double", the precision of the reductions.
+
+        Returns:
+            float: The real part of the expectation value.
+        """
+        b = self.block_qubits
+        low_mask = self.block_size - 1
+        dtype = np.complex128 if accumulator == "double" else np.complex64
+        low_positions = range(self.n_qubits - b, self.n_qubits)
+
+        def low_axes(mask):
+            return tuple(self._low_axis(q) for q in low_positions if (mask >> (self.n_qubits - 1 - q)) & 1)
+
+        def low_sign(mask):
+            sign = np.ones((1,) * b)
+            for axis in low_axes(mask):
+                shape = [1] * b
+                shape[axis] = 2
+                sign = sign * np.array([1.0, -1.0]).reshape(shape)
+            return sign
+
+        groups = []
+        for x, masks, coefficients in zip(hamiltonian.flip_masks, hamiltonian.phase_masks, hamiltonian.coefficients):
+            x = self._position_mask(int(x))
+            terms = [(z >> b, c, low_sign(z & low_mask)) for z, c in zip(map(self._position_mask, map(int, masks)), coefficients)]
+            groups.append((x >> b, low_axes(x & low_mask), terms))
+
+        value = 0j
+        for k in range(self.n_blocks):
+            psi = np.asarray(self._block(k), dtype=dtype).reshape((2,) * b)
+            partners = {0: psi}
+            for x_high, flip_axes, terms in groups:
+                if x_high not in partners:
+                    partners[x_high] = np.asarray(self._block(k ^ x_high), dtype=dtype).reshape((2,) * b)
+                phase = sum(c * (-1) ** bin(k & z_high).count("1") * sign for z_high, c, sign in terms)
+                partner = np.flip(partners[x_high], flip_axes) if flip_axes else partners[x_high]
+                value += np.vdot(partner, phase * psi)
+        return float(np.real(value))
+
+class MemmapStateVector(BlockedStateVector):
+    """
+    A `BlockedStateVector` in a `numpy.memmap` file, for states larger than the RAM.
+
+    Blocks are large and page aligned, and only a group of them is in memory at a time, so
+    larger lattices run from local NVMe at the cost of one pass over the file per pass.
+
+    Attributes:
+        path (str): The state file.
+    """
+    def __init__(self, n_qubits, path, dtype=np.complex64, block_qubits=22, max_high_qubits=2, order=None):
+        """
+        Args:
+            n_qubits (int): Number of qubits.
+            path (str): File to map; created (sparse) or overwritten.
+            dtype (type): np.complex64 or np.complex128.
+            block_qubits (int): Qubits per block, 2^block_qubits amplitudes (32 MiB of complex64 for 22).
+            max_high_qubits (int): See `plan_passes`.
+            order (tuple, optional): Position of every qubit; the identity by default.
+        """
+        self.path = path
+        super().__init__(np.memmap(path, dtype=dtype, mode='w+', shape=(2 ** n_qubits,)), block_qubits, max_high_qubits, order)
+
+    def reset(self):
+        """Set the state to |0...0>, writing block by block."""
+        for k in range(self.n_blocks):
+            self._block(k)[:] = 0
+        self.state[0] = 1
+
+    def apply_moments(self, moments):
+        super().apply_moments(moments)
+        self.state.flush()
+
+    def close(self):
+        """Unmap and delete the state file."""
+        del self.state
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def _close_states():
+    """Delete the state files this process created (forked children inherit, but do not own, the parent's)."""
+    for key in list(_STATES):
+        if key[0] == os.getpid():
+            _STATES.pop(key).close()
+
+atexit.register(_close_states)
+
+def simulate_blocked(circuit, qubits, initial_state=None, blocked_option=None, precision="single"):
+    """
+    Simulate a circuit in memory with the cache-blocked kernels.
+
+    Args:
+        circuit (cirq.Circuit): Circuit of unitary gates.
+        qubits (list): The circuit's qubits in cirq's order.
+        initial_state (np.ndarray, optional): State to start from; |0...0> by default.
+        blocked_option (dict, optional): Optional keys 'block_qubits' (qubits per block, default 16),
+            'max_high_qubits' (blocks combined per pass are 2^this, default 2; a group of 2^18
+            complex64 amplitudes is 2 MiB) and 'reorder' (plan the qubit order, default True).
+        precision (str): "single" (complex64) or "double" (complex128) amplitudes.
+
+    Returns:
+        np.ndarray: The final state vector in qubit order.
+    """
+    blocked_option = blocked_option or {}
+    dtype = np.complex128 if precision == "double" else np.complex64
+    n_qubits = len(qubits)
+    block_qubits = min(blocked_option.get('block_qubits', 16), n_qubits)
+    max_high_qubits = blocked_option.get('max_high_qubits', 2)
+    moments = circuit_moments(circuit, qubits)
+    order = None
+    if blocked_option.get('reorder', True):
+        order = plan_qubit_order(circuit_layout(moments), n_qubits, block_qubits, max_high_qubits)
+    if initial_state is None:
+        initial_state = np.zeros(2 ** n_qubits, dtype=dtype)
+        initial_state[0] = 1
+    vector = BlockedStateVector.from_vector(initial_state, block_qubits, max_high_qubits, order, dtype)
+    vector.apply_moments(moments)
+    return vector.vector()
+
+def get_expectation_memmap(circuit, qubits, hamiltonian, memmap_option, precision="single", accumulator="double", return_state=False):
+    """
+    Energy of an ansatz simulated out of core, with the state vector memory-mapped from disk.
+
+    The state file of every process and geometry is created once (in `memmap_option['path']`,
+    ideally local NVMe, named by the process id so forked workers never share one), reset to
+    |0...0> for every evaluation and deleted at exit.
+
+    Args:
+        circuit (cirq.Circuit): Ansatz circuit, including its state preparation.
+        qubits (list): The circuit's qubits in cirq's order.
+        hamiltonian (CompiledHamiltonian): The energy operator.
+        memmap_option (dict): Optional keys 'path' (directory of the state files, default the
+            temporary directory), 'block_qubits' (qubits per block, default 22),
+            'max_high_qubits' (blocks combined per pass are 2^this, default 2) and 'reorder'
+            (plan the qubit order, default True).
+        precision (str): "single" (complex64) or "double" (complex128) amplitudes.
+        accumulator (str): "single" or "double", the precision of the reductions.
+        return_state (bool): If True, also return the state; only then is it assembled in memory.
+
+    Returns:
+        float: The energy, computed block by block from the file (and a copy of the state in qubit order
+        in memory if `return_state`).
+    """
+    directory = memmap_option.get('path', tempfile.gettempdir())
+    dtype = np.complex128 if precision == "double" else np.complex64
+    key = (os.getpid(), directory, len(qubits), np.dtype(dtype).name)
+    if key not in _STATES:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"state_{os.getpid()}_{len(qubits)}q_{np.dtype(dtype).name}.bin")
+        _STATES[key] = MemmapStateVector(len(qubits), path, dtype, memmap_option.get('block_qubits', 22),
+                                         memmap_option.get('max_high_qubits', 2))
+        # Pool workers skip atexit, but run multiprocessing's finalizers when the pool is closed
+        util.Finalize(None, _close_states, exitpriority=0)
+    vector = _STATES[key]
+    moments = circuit_moments(circuit, qubits)
+    if memmap_option.get('reorder', True):
+        vector.order = plan_qubit_order(circuit_layout(moments), vector.n_qubits, vector.block_qubits, vector.max_high_qubits)
+    vector.reset()
+    vector.apply_moments(moments)
+    energy = vector.expectation(hamiltonian, accumulator)
+    if return_state:
+        # A copy, as the state file is overwritten by the next evaluation
+        return energy, np.array(vector.vector())
+    return energy
@@ -0,0 +1,90 @@
+from collections import deque
+
+class StopOptimization(Exception):
+    """Raised inside an optimizer callback to end the run early (see `StoppingCriteria`)."""
+
+class StoppingCriteria:
+    """
+    Early-stopping rules shared by all optimizers.
+
+    The optimizers report every iteration to `check` (through `RunRecorder`); the first rule
+    that fires ends the run and is kept in `reason`. Rules left at None are disabled.
+
+    Attributes:
+        reference_energy (float): Energy the relative error is measured against, usually the
+            exact ground-state energy.
+        target_relative_error (float): Stop once |E - E_ref| / |E_ref| is at most this, e.g. 0.01
+            for E / E_exact >= 0.99.
+        plateau_window (int): Stop when the energy improved by less than `plateau_tol` (relative)
+            over the last `plateau_window` iterations.
+        plateau_tol (float): Relative improvement that counts as progress.
+        max_time (float): Wall-clock budget in seconds.
+        max_evals (int): Budget of energy evaluations.
+        reason (str): Why the run stopped, None while running.
+    """
+    def __init__(self, reference_energy=None, target_relative_error=None, plateau_window=None, plateau_tol=1e-8,
+                 max_time=None, max_evals=None):
+        self.reference_energy = reference_energy
+        self.target_relative_error = target_relative_error
+        self.plateau_window = plateau_window
+        self.plateau_tol = plateau_tol
+        self.max_time = max_time
+        self.max_evals = max_evals
+        self.reason = None
+        self._window = deque(maxlen=None if plateau_window is None else plateau_window + 1)
+
+    @classmethod
+    def from_config(cls, section, reference_energy=None):
+        """
+        Build the criteria from a driver's TOML section.
+
+        Args:
+            section (dict): TOML section; reads `target_relative_error`, `plateau_window`,
+                `plateau_tol`, `max_time` and `max_evals`.
+            reference_energy (float or callable, optional): Reference for `target_relative_error`, or a
+                callable computing it, which is only called when `target_relative_error` is set.
+
+        Returns:
+            StoppingCriteria or None: None if no rule is configured.
+        """
+        keys = ("target_relative_error", "plateau_window", "max_time", "max_evals")
+        if not any(section.get(key) is not None for key in keys):
+            return None
+        if callable(reference_energy):
+            reference_energy = reference_energy() if section.get("target_relative_error") is not None else None
+        return cls(reference_energy=reference_energy,
+                   target_relative_error=section.get("target_relative_error"),
+                   plateau_window=section.get("plateau_window"),
+                   plateau_tol=section.get("plateau_tol", 1e-8),
+                   max_time=section.get("max_time"),
+                   max_evals=section.get("max_evals"))
+
+    def check(self, energy, n_evals, elapsed):
+        """
+        Report one iteration.
+
+        Args:
+            energy (float): Energy of the iteration.
+            n_evals (int): Energy evaluations so far.
+            elapsed (float): Seconds since the start of the run.
+
+        Returns:
+            str or None: The reason to stop, or None to continue.
+        """
+        if self.reason is not None:
+            return self.reason
+        if self.target_relative_error is not None and self.reference_energy is not None:
+            relative_error = abs((energy - self.reference_energy) / self.reference_energy)
+            if relative_error <= self.target_relative_error:
+                self.reason = f"relative error {relative_error:.3g} <= {self.target_relative_error}"
+        if self.plateau_window is not None:
+            self._window.append(energy)
+            if len(self._window) == self._window.maxlen:
+                improvement = self._window[0] - min(self._window)
+                if improvement <= self.plateau_tol * max(abs(self._window[0]), 1.0):
+                    self.reason = f"energy plateau over {self.plateau_window} iterations"
+        if self.max_time is not None and elapsed >= self.max_time:
+            self.reason = f"wall-clock budget of {self.max_time} s reached"
+        if self.max_evals is not None and n_evals >= self.max_evals:
+            self.reason = f"evaluation budget of {self.max_evals} reached"
+        return self.reason
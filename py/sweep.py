@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import argparse
+import datetime
+import itertools
+from functools import partial
+import tomllib
+import numpy as np
+from catalog import ResultsCatalog, register_from_history
+from work_queue import WorkQueue, run_worker, run_coordinator
+from cost_model import CostModel, simulate_schedule, physical_memory
+
+# model -> (expectation function, Args class, number of parameter sets); names are resolved lazily
+# so that the coordinator does not need the simulator stack installed
+MODELS = {
+    "afm-heisenberg": ("get_expectation_afm_heisenberg", "AFMHeisenbergArgs", 2),
+    "afm-heisenberg-lattice": ("get_expectation_afm_heisenberg_lattice", "AFMHeisenbergLatticeArgs", 3),
+    "afm-heisenberg-matrix": ("get_expectation_afm_heisenberg_matrix", "AFMHeisenbergMatrixArgs", 4),
+}
+
+def sweep_jobs(model, section, timestamp):
+    """
+    Expand a driver's TOML section into one job per (geometry, p).
+
+    Args:
+        model (str): Model name, i.e. the TOML section name.
+        section (dict): TOML section with `p_list`, `results_dir_path`, `boundary_condition` and
+            either `length_list` (chain) or `rows_list`/`cols_list` (lattice).
+        timestamp (str): Timestamp of the sweep, used in the result file names.
+
+    Returns:
+        List[Tuple[str, dict]]: (job id, job) pairs.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model}, choose from {', '.join(MODELS)}")
+    if model == "afm-heisenberg":
+        geometries = [(1, length) for length in section["length_list"]]
+    else:
+        geometries = list(itertools.product(section["rows_list"], section["cols_list"]))
+    periodic = section.get("boundary_condition", "PBC" if section.get("periodic", True) else "OBC") == "PBC"
+
+    jobs = []
+    for (rows, cols), p in itertools.product(geometries, section["p_list"]):
+        job = {
+            "model": model,
+            "rows": rows,
+            "cols": cols,
+            "p": p,
+            "periodic": periodic,
+            "precision": section.get("precision", "single"),
+            "results_dir_path": os.path.abspath(section["results_dir_path"]),
+            "timestamp": timestamp,
+            "result_cache": os.path.abspath(section["result_cache"]) if section.get("result_cache") else None,
+            "seed": section.get("seed", 0 if section.get("result_cache") else None),
+            "settings": section,
+        }
+        jobs.append((f"{model}_r{rows}c{cols}_p{p}_{timestamp}", job))
+    return jobs
+
+def estimate_jobs(jobs, cost_model):
+    """
+    Add the `estimated_seconds` and `estimated_bytes` of a cost model to jobs, by which
+    `WorkQueue.claim` orders them longest first and packs them into the workers' memory.
+
+    Args:
+        jobs (List[Tuple[str, dict]]): (job id, job) pairs from `sweep_jobs`.
+        cost_model (CostModel): Fitted cost model.
+
+    Returns:
+        List[Tuple[str, dict]]: The pairs, longest job first.
+    """
+    estimated = [(job_id, dict(job, estimated_seconds=cost_model.runtime(job), estimated_bytes=cost_model.memory(job)))
+                 for job_id, job in jobs]
+    return sorted(estimated, key=lambda item: -item[1]["estimated_seconds"])
+
+def run_job(job):
+    """
+    Optimize one (model, geometry, p) job; the worker side of a sweep.
+
+    The optimizer is chosen as in the drivers, from the `optimizer`, `n_starts`,
+    `initialization` and `precision` settings of the model's section: "mixed" runs a
+    single-precision stage refined in double precision, and `n_starts > 1` runs the first
+    stage as a multi-start L-BFGS-B. Early-stopping rules of the section apply too.
+
+    With a `seed` in the model's section (0 by default with a `result_cache`), the initial
+    parameters and the multi-start points are drawn from it, and with a `result_cache` a job
+    whose result is cached is restored instead of optimized.
+
+    Args:
+        job (dict): Job from `sweep_jobs`.
+
+    Returns:
+        dict: `csv_path`, `params` and `elapsed` of the run, and `cached` if it was restored.
+    """
+    import expectation
+    from optimization import optimize_by_lbfgsb_multistart, OPTIMIZERS
+    from stopping import StoppingCriteria
+    from exact_expectation import get_exact_energy
+    from result_cache import ResultCache, result_key
+
+    function_name, args_name, parameters = MODELS[job["model"]]
+    settings = job["settings"]
+    rows, cols, p = job["rows"], job["cols"], job["p"]
+    length = rows * cols
+    qsim_option = {'t': int(length / 2), 'f': 1}  # Set simulation options
+    optimizer_name = settings.get("optimizer", "lbfgsb")
+    n_starts = settings.get("n_starts", 1)
+
+    os.makedirs(job["results_dir_path"], exist_ok=True)
+    # Named by rows and columns like the job id, as a sweep can hold transposed geometries of one length
+    csvpath = os.path.join(job["results_dir_path"], '{}_r{}c{}_p{}_{}.csv'.format(job["model"], rows, cols, p, job["timestamp"]))
+    cache = ResultCache(job["result_cache"]) if job.get("result_cache") else None
+    seed = None if job.get("seed") is None else [job["seed"], rows, cols, p]
+    rng = np.random.default_rng(seed) if seed is not None else np.random
+    params = [rng.uniform(0, 1, p) for _ in range(parameters)]
+
+    job_start_time = time.time()
+    if cache is not None:
+        key = result_key(job["model"], rows, cols, "PBC" if job["periodic"] else "OBC", p, np.concatenate(params), optimizer_name,
+                         settings)
+        manifest = cache.restore(key, os.path.splitext(csvpath)[0])
+        if manifest is not None:
+            return {"csv_path": csvpath, "params": manifest["params"], "elapsed": time.time() - job_start_time, "cached": True}
+
+    # Single precision only resolves the energy to ~1e-7, so "mixed" refines the single-precision
+    # optimum in double precision
+    stages = ["single", "double"] if job["precision"] == "mixed" else [job["precision"]]
+    max_exact_qubits = settings.get("max_exact_qubits", 20)
+    reference_energy = (lambda: get_exact_energy(job["model"], rows, cols, job["periodic"])) if length <= max_exact_qubits else None
+    for stage in stages:
+        stage_csvpath = csvpath if stage == stages[-1] else csvpath.replace('.csv', f'_{stage}.csv')
+        if job["model"] == "afm-heisenberg":
+            function_args = getattr(expectation, args_name)(length, job["periodic"], qsim_option, precision=stage)
+        else:
+            function_args = getattr(expectation, args_name)(rows, cols, job["periodic"], qsim_option, precision=stage)
+        if n_starts > 1 and stage == stages[0]:
+            optimizer = partial(optimize_by_lbfgsb_multistart, n_starts=n_starts, initialization=settings.get("initialization", "random"),
+                                seed=None if seed is None else seed + [1])  # Not the stream of the first start
+        else:
+            optimizer = OPTIMIZERS[optimizer_name]
+        params = optimizer(
+            partial(getattr(expectation, function_name), function_args=function_args),
+            *params,
+            parameters=parameters,
+            print_results=False,
+            filepath=stage_csvpath,
+            precision=stage,
+            stopping=StoppingCriteria.from_config(settings, reference_energy))
+    result = {
+        "csv_path": csvpath,
+        "params": np.concatenate(params).tolist(),
+        "elapsed": time.time() - job_start_time,
+    }
+    if cache is not None:
+        cache.put(key, os.path.splitext(csvpath)[0], {"params": result["params"]})
+    return result
+
+def register_result(catalog, entry):
+    """Register a finished queue entry in the results catalog (called by the coordinator only)."""
+    job, result = entry["job"], entry["result"]
+    boundary_name = "PBC" if job["periodic"] else "OBC"
+    register_from_history(catalog, job["model"], job["rows"], job["cols"], job["p"], boundary_name,
+                          job["timestamp"], result["csv_path"], elapsed=result["elapsed"])
+    print(f"coordinator: {entry['id']} {'restored from the result cache' if result.get('cached') else 'finished'} by {entry['worker']} in {result['elapsed']:.1f} s")
+
+def main(argv=None):
+    """
+    Distribute a p x L sweep over several hosts through a queue directory they all mount.
+
+        python sweep.py submit afm-heisenberg-lattice --queue /shared/queue   # once
+        python sweep.py worker --queue /shared/queue                          # on every host, any number
+        python sweep.py coordinator --queue /shared/queue                     # once
+
+    Several workers on one machine work just as well, e.g. for testing. Jobs are claimed
+    longest first by a cost model fitted to the elapsed times in the results catalog, and the
+    workers of a host only take jobs whose estimated memory fits next to the running ones
+    (`--memory`, by default the host's RAM). `plan` prints the estimates and the expected
+    makespan of a sweep without submitting it:
+
+        python sweep.py plan afm-heisenberg-lattice --workers 4 --memory 64
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['submit', 'worker', 'coordinator', 'plan'])
+    parser.add_argument('model', nargs='?', help='model (TOML section) to sweep, for submit and plan')
+    parser.add_argument('--queue', default='.results/queue', help='shared queue directory')
+    parser.add_argument('--config', default='.toml', help='TOML configuration file')
+    parser.add_argument('--heartbeat', type=float, default=10.0, help='seconds between worker heartbeats')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds without heartbeat before a job is reassigned')
+    parser.add_argument('--catalog', default=None, help='results catalog (default: catalog_path of the model, or .results/catalog.sqlite)')
+    parser.add_argument('--memory', type=float, default=None, help='GB of RAM shared by the workers of a host (default: all of it)')
+    parser.add_argument('--workers', type=int, default=1, help='number of workers, for plan')
+    args = parser.parse_args(argv)
+
+    catalog_path = args.catalog
+    if catalog_path is None and args.model is not None and os.path.exists(args.config):
+        with open(args.config, mode="rb") as f:
+            catalog_path = tomllib.load(f).get(args.model, {}).get("catalog_path")
+    catalog_path = catalog_path or ".results/catalog.sqlite"
+    memory_budget = args.memory * 2 ** 30 if args.memory is not None else physical_memory()
+
+    if args.command in ('submit', 'plan'):
+        if args.model is None:
+            parser.error(f"{args.command} needs a model")
+        with open(args.config, mode="rb") as f:
+            config = tomllib.load(f)
+        # Set the timezone to Japan Standard Time (JST)
+        JST = datetime.timezone(datetime.timedelta(hours=9), 'JST')
+        ymdhms = datetime.datetime.now(JST).strftime('%Y-%m-%d_%H-%M-%S')
+        jobs = sweep_jobs(args.model, config[args.model], ymdhms)
+        # Runtime and memory estimates, calibrated on the elapsed times of earlier runs
+        with ResultsCatalog(catalog_path) as catalog:
+            jobs = estimate_jobs(jobs, CostModel.from_catalog(catalog))
+
+    if args.command == 'plan':
+        estimates = [(job_id, job["estimated_seconds"], job["estimated_bytes"]) for job_id, job in jobs]
+        for job_id, seconds, memory in estimates:
+            print(f"{job_id:<60}{seconds:>12.1f} s{memory / 2 ** 30:>10.2f} GB")
+        in_order = sorted(estimates, key=lambda estimate: estimate[0])
+        makespan, _ = simulate_schedule(estimates, args.workers, memory_budget)
+        makespan_in_order, _ = simulate_schedule(in_order, args.workers, memory_budget, longest_first=False)
+        print(f"Makespan on {args.workers} workers: {makespan:.1f} s longest first, {makespan_in_order:.1f} s in job id order")
+
+    elif args.command == 'submit':
+        queue = WorkQueue(args.queue)
+        submitted = sum(queue.submit(job_id, job) for job_id, job in jobs)
+        print(f"Submitted {submitted} jobs to {args.queue}")
+
+    elif args.command == 'worker':
+        queue = WorkQueue(args.queue)
+        completed = run_worker(queue, run_job, heartbeat_interval=args.heartbeat, memory_budget=memory_budget)
+        print(f"Worker finished {completed} jobs")
+
+    elif args.command == 'coordinator':
+        queue = WorkQueue(args.queue)
+        with ResultsCatalog(catalog_path) as catalog:
+            counts = run_coordinator(queue, timeout=args.timeout, on_result=partial(register_result, catalog))
+        for entry in queue.entries("failed"):
+            print(f"coordinator: {entry['id']} failed: {entry.get('error')}", file=sys.stderr)
+        print(f"Sweep finished: {counts['done']} done, {counts['failed']} failed")
+
+if __name__ == '__main__':
+    main()
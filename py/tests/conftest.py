@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live flat in py/ and import each other by name, as when a driver is run from py/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,46 @@
+import math
+import pytest
+from cost_model import CostModel, job_size, simulate_schedule
+
+def test_fit_recovers_a_power_law_per_model():
+    records = [("afm-heisenberg-lattice", rows, cols, p, True, 3e-6 * job_size("afm-heisenberg-lattice", rows, cols, p) ** 1.2)
+               for rows, cols, p in [(2, 2, 1), (2, 3, 2), (3, 3, 2), (3, 4, 4)]]
+    records.append(("afm-heisenberg", 1, 8, 1, True, 10.0))  # A single size: falls back to the fit of all models
+    model = CostModel.fit(records)
+
+    a, c = model.coefficients["afm-heisenberg-lattice"]
+    assert a == pytest.approx(3e-6, rel=1e-6) and c == pytest.approx(1.2)
+    assert "afm-heisenberg" not in model.coefficients and None in model.coefficients
+    small, large = ({"model": "afm-heisenberg-lattice", "rows": 2, "cols": cols, "p": 2, "periodic": True} for cols in (2, 4))
+    assert model.runtime(large) > model.runtime(small)
+    assert CostModel.fit([]).runtime(small) == pytest.approx(CostModel.DEFAULT[0] * job_size("afm-heisenberg-lattice", 2, 2, 2))
+
+def test_memory_follows_the_simulation_mode():
+    model = CostModel(state_copies=4.0, base_memory=0.0)
+    job = {"rows": 5, "cols": 6, "precision": "single"}
+    in_memory = model.memory(job)
+    assert in_memory == 4 * 2 ** 30 * 8
+    assert model.memory(dict(job, precision="double")) == 2 * in_memory
+    assert model.memory(dict(job, settings={"blocked_option": {}})) == 5 * 2 ** 30 * 8
+    # Out of core only the groups of blocks being updated are in memory
+    assert model.memory(dict(job, settings={"memmap_option": {"block_qubits": 20, "max_high_qubits": 2}})) == 4 * 2 ** 22 * 8
+    # qsimh streams the S_z = 0 sector in blocks, so its memory does not grow with the sector
+    qsimh = {"qsimh_option": {"processes": 1, "block_size": 1024}}
+    block_bytes = 2 * 1024 * 61 * 72  # Pool worker and parent, each a block and its partners on 60 bonds
+    assert block_bytes < model.memory(dict(job, settings=qsimh)) < 2 * block_bytes < math.comb(30, 15)
+    assert model.memory(dict(job, rows=6, settings=qsimh)) < 2 * model.memory(dict(job, settings=qsimh))
+
+def test_schedule_takes_the_longest_job_first():
+    jobs = [("a", 1.0, 0), ("b", 1.0, 0), ("c", 4.0, 0)]
+    makespan, schedule = simulate_schedule(jobs, workers=2)
+    assert makespan == 4.0 and schedule[0] == ("c", 0.0, 4.0)
+    makespan_in_order, schedule = simulate_schedule(jobs, workers=2, longest_first=False)
+    assert makespan_in_order == 5.0 and [job_id for job_id, _, _ in schedule] == ["a", "b", "c"]
+
+def test_schedule_packs_jobs_into_the_memory_budget():
+    jobs = [("big", 3.0, 6), ("small1", 2.0, 4), ("small2", 2.0, 4), ("huge", 1.0, 20)]
+    makespan, schedule = simulate_schedule(jobs, workers=3, memory_budget=10)
+    starts = {job_id: (start, end) for job_id, start, end in schedule}
+    # "big" and one "small" fit together; the other waits for the first "small", "huge" runs alone
+    assert starts["big"] == (0.0, 3.0) and starts["small1"] == (0.0, 2.0) and starts["small2"] == (2.0, 4.0)
+    assert starts["huge"] == (4.0, 5.0) and makespan == 5.0
@@ -0,0 +1,32 @@
+import pytest
+import sweep
+
+def test_sweep_jobs_expand_geometries_and_p():
+    section = {"rows_list": [2, 3], "cols_list": [2], "p_list": [1, 2], "results_dir_path": "results"}
+    jobs = dict(sweep.sweep_jobs("afm-heisenberg-lattice", section, "T"))
+    assert sorted(jobs) == [f"afm-heisenberg-lattice_r{rows}c2_p{p}_T" for rows in (2, 3) for p in (1, 2)]
+    assert all(job["precision"] == "single" and job["periodic"] for job in jobs.values())
+
+def test_run_job_uses_the_drivers_optimizer_selection(tmp_path, monkeypatch):
+    pytest.importorskip("cirq")
+    pytest.importorskip("qsimcirq")
+    import optimization
+    calls = []
+
+    def fake_optimizer(name):
+        def optimize(function, *initial, precision, filepath, **kwargs):
+            calls.append((name, precision, filepath))
+            return initial
+        return optimize
+
+    monkeypatch.setitem(optimization.OPTIMIZERS, "adam", fake_optimizer("adam"))
+    monkeypatch.setattr(optimization, "optimize_by_lbfgsb_multistart", fake_optimizer("multistart"))
+    section = {"length_list": [4], "p_list": [1], "results_dir_path": str(tmp_path), "optimizer": "adam",
+               "n_starts": 4, "precision": "mixed"}
+    (_, job), = sweep.sweep_jobs("afm-heisenberg", section, "T")
+    result = sweep.run_job(job)
+
+    # As in the drivers: multi-start in the first (single-precision) stage, the configured optimizer in the second
+    assert [(name, precision) for name, precision, _ in calls] == [("multistart", "single"), ("adam", "double")]
+    assert calls[0][2].endswith("_single.csv") and calls[1][2] == result["csv_path"]
+    assert result["csv_path"].endswith("afm-heisenberg_r1c4_p1_T.csv")  # Named like the job id
@@ -0,0 +1,131 @@
+import os
+import time
+import multiprocessing as mp
+from work_queue import WorkQueue, run_worker, run_coordinator
+
+def marker_job(job):
+    """Create the job's marker file exclusively, so a second execution of the same job fails."""
+    with open(os.path.join(job["markers"], job["name"]), 'x') as f:
+        f.write(str(os.getpid()))
+    time.sleep(0.01)
+    return {"name": job["name"], "pid": os.getpid()}
+
+def start_workers(root, count):
+    context = mp.get_context("fork")
+    workers = [context.Process(target=run_worker, args=(WorkQueue(root), marker_job, f"worker-{index}", 0.5, 0.01))
+               for index in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+def submit_jobs(queue, markers, count):
+    os.makedirs(markers, exist_ok=True)
+    for index in range(count):
+        assert queue.submit(f"job{index:02}", {"name": f"job{index:02}", "markers": markers})
+
+def test_submit_ignores_duplicate_ids(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    assert queue.submit("job", {"name": "job"})
+    assert not queue.submit("job", {"name": "other"})
+    assert queue.counts()["pending"] == 1
+
+def test_workers_claim_every_job_exactly_once(tmp_path):
+    root, markers = str(tmp_path / "queue"), str(tmp_path / "markers")
+    queue = WorkQueue(root)
+    submit_jobs(queue, markers, 30)
+
+    workers = start_workers(root, 3)
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    assert queue.counts() == {"pending": 0, "running": 0, "done": 30, "failed": 0}
+    assert sorted(os.listdir(markers)) == [f"job{index:02}" for index in range(30)]
+    entries = queue.entries("done")
+    assert all(entry["attempts"] == 1 for entry in entries)
+    assert len({entry["worker"] for entry in entries}) >= 2  # The work was actually shared
+
+def test_stale_claims_are_requeued_then_failed(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"), max_attempts=2)
+    queue.submit("job", {"name": "job"})
+
+    for attempt in (1, 2):
+        entry = queue.claim("dead-worker")
+        assert entry["id"] == "job" and entry["attempts"] == attempt
+        queue.heartbeat("dead-worker", "job")
+        assert queue.requeue_stale(timeout=0.05) == []  # A new heartbeat counts as alive
+        time.sleep(0.1)
+        assert queue.requeue_stale(timeout=0.05) == ["job"]
+
+    # The first loss put the job back into pending/, the second exhausted max_attempts
+    assert queue.counts() == {"pending": 0, "running": 0, "done": 0, "failed": 1}
+    assert queue.entries("failed")[0]["error"] == "worker lost"
+
+def test_requeued_job_is_finished_by_another_worker(tmp_path):
+    root, markers = str(tmp_path / "queue"), str(tmp_path / "markers")
+    queue = WorkQueue(root)
+    submit_jobs(queue, markers, 1)
+    queue.claim("dead-worker")
+    queue.heartbeat("dead-worker", "job00")
+    queue.requeue_stale(timeout=0.05)
+    time.sleep(0.1)
+    assert queue.requeue_stale(timeout=0.05) == ["job00"]
+
+    assert run_worker(WorkQueue(root), marker_job, "live-worker", 0.5, 0.01) == 1
+    entry = queue.entries("done")[0]
+    assert entry["worker"] == "live-worker" and entry["attempts"] == 2
+
+def test_coordinator_reports_every_result_until_completion(tmp_path):
+    root, markers = str(tmp_path / "queue"), str(tmp_path / "markers")
+    queue = WorkQueue(root)
+    submit_jobs(queue, markers, 12)
+
+    workers = start_workers(root, 2)
+    results = []
+    counts = run_coordinator(queue, timeout=30.0, poll_interval=0.05, on_result=results.append)
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert counts == {"pending": 0, "running": 0, "done": 12, "failed": 0}
+    assert sorted(entry["result"]["name"] for entry in results) == [f"job{index:02}" for index in range(12)]
+
+def test_claims_take_the_longest_job_that_fits_the_memory_budget(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue"))
+    for job_id, seconds, memory in [("big", 30, 6), ("medium", 20, 6), ("small", 10, 3), ("huge", 5, 20)]:
+        queue.submit(job_id, {"estimated_seconds": seconds, "estimated_bytes": memory})
+
+    assert queue.claim("worker-0", memory_budget=10)["id"] == "big"
+    assert queue.claim("worker-1", memory_budget=10)["id"] == "small"  # "medium" does not fit next to "big"
+    assert queue.claim("worker-2", memory_budget=10) is None
+    assert queue.host_memory_in_use() == 9
+
+    for entry in queue.entries("running"):
+        queue.complete(entry, {})
+    assert queue.claim("worker-0", memory_budget=10)["id"] == "medium"
+    assert queue.claim("worker-1", memory_budget=10) is None  # "huge" only runs on an idle host
+    queue.complete(queue.entries("running")[0], {})
+    assert queue.claim("worker-0", memory_budget=10)["id"] == "huge"
+
+def claim_once(root, worker_id, memory_budget, barrier, results):
+    barrier.wait()
+    entry = WorkQueue(root).claim(worker_id, memory_budget)
+    results.put(entry["id"] if entry else None)
+
+def test_concurrent_claims_never_exceed_the_host_memory_budget(tmp_path):
+    root = str(tmp_path / "queue")
+    queue = WorkQueue(root)
+    for index in range(8):
+        queue.submit(f"job{index}", {"estimated_seconds": 1, "estimated_bytes": 4})
+
+    # Eight workers of one host claim at once; the host lock makes each memory check and claim atomic
+    context = mp.get_context("fork")
+    barrier, results = context.Barrier(8), context.Queue()
+    workers = [context.Process(target=claim_once, args=(root, f"worker-{index}", 10, barrier, results)) for index in range(8)]
+    for worker in workers:
+        worker.start()
+    claimed = [results.get(timeout=60) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=60)
+
+    assert sum(job_id is not None for job_id in claimed) == 2
+    assert queue.host_memory_in_use() == 8 and queue.counts()["running"] == 2
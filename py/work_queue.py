@@ -0,0 +1,327 @@
+import os
+import json
+import time
+import fcntl
+import socket
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+QUEUE_STATES = ("pending", "running", "done", "failed")
+
+def _write_json(path, data):
+    """Write a JSON file atomically (write to a temporary file, then rename)."""
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    """Read a JSON file, or return None if it disappeared (moved by another process) meanwhile."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """
+    Job queue in a shared directory, for distributing sweep jobs over several hosts.
+
+    Every job is a JSON file that moves between the `pending/`, `running/`, `done/` and
+    `failed/` subdirectories. A worker claims a job by renaming it from `pending/` to
+    `running/`; `os.rename` is atomic on POSIX file systems (including NFS), so exactly one
+    worker wins each job without any lock server. Workers write a heartbeat file while they
+    run; the coordinator puts jobs of workers whose heartbeat stops back into `pending/`.
+
+    Staleness is judged by the coordinator's own clock (a heartbeat is stale when its
+    content has not changed for `timeout` seconds), so the hosts' clocks need not agree.
+
+    Jobs may carry `estimated_seconds` and `estimated_bytes` (see `cost_model.CostModel`):
+    pending jobs are claimed longest first, so the largest jobs do not start last and leave
+    the other workers idle at the end of a sweep, and a worker with a memory budget skips
+    jobs that do not fit next to the jobs already running on its host.
+
+    Attributes:
+        root (str): Queue directory, shared by the coordinator and all workers.
+        max_attempts (int): A job that was claimed this many times without finishing is failed.
+    """
+    def __init__(self, root, max_attempts=3):
+        """
+        Open (and create if needed) a queue directory.
+
+        Args:
+            root (str): Queue directory.
+            max_attempts (int): Maximum number of claims of a job.
+        """
+        self.root = root
+        self.max_attempts = max_attempts
+        for state in QUEUE_STATES + ("heartbeats",):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+        self._seen_beats = {}  # worker id -> (heartbeat content, local time it was first seen)
+        self._seen_unowned = {}  # job id -> local time a running job without owner was first seen
+
+    def _path(self, state, job_id):
+        return os.path.join(self.root, state, f"{job_id}.json")
+
+    def _job_ids(self, state):
+        return sorted(name[:-len(".json")] for name in os.listdir(os.path.join(self.root, state)) if name.endswith(".json"))
+
+    @contextmanager
+    def _host_lock(self):
+        """Serialize the claims of the workers of this host, so their memory check and claim are atomic together."""
+        digest = hashlib.sha256(os.path.abspath(self.root).encode()).hexdigest()[:16]
+        with open(os.path.join(tempfile.gettempdir(), f"work_queue_{digest}.lock"), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def host_memory_in_use(self, host=None):
+        """Sum of `estimated_bytes` of the jobs running on a host (default: this one)."""
+        host = host or socket.gethostname()
+        entries = (_read_json(self._path("running", job_id)) for job_id in self._job_ids("running"))
+        return sum(entry["job"].get("estimated_bytes", 0) for entry in entries if entry is not None and entry.get("host") == host)
+
+    def submit(self, job_id, job):
+        """
+        Add a job, unless a job with the same id is already in the queue.
+
+        Args:
+            job_id (str): Unique, file-name safe job id.
+            job (dict): JSON-serializable job description.
+
+        Returns:
+            bool: True if the job was added.
+        """
+        if any(os.path.exists(self._path(state, job_id)) for state in QUEUE_STATES):
+            return False
+        _write_json(self._path("pending", job_id), {"id": job_id, "job": job, "attempts": 0, "worker": None})
+        return True
+
+    def claim(self, worker_id, memory_budget=None):
+        """
+        Atomically take the longest pending job (by `estimated_seconds`, then by id) that fits.
+
+        Args:
+            worker_id (str): Id of the claiming worker.
+            memory_budget (float, optional): Bytes that the jobs running on this host may use together.
+                A job that fits next to the running ones is taken; a job larger than the whole budget
+                only when nothing else runs on the host. No limit if None.
+
+        Returns:
+            dict or None: Queue entry (`id`, `job`, `attempts`, `worker`, `host`), or None if nothing
+                (that fits) is pending.
+        """
+        if memory_budget is None:
+            return self._claim(worker_id)
+        with self._host_lock():
+            in_use = self.host_memory_in_use()
+            return self._claim(worker_id, memory_budget - in_use, in_use == 0)
+
+    def _claim(self, worker_id, memory_free=None, host_idle=True):
+        pending = [(job_id, _read_json(self._path("pending", job_id))) for job_id in self._job_ids("pending")]
+        pending = sorted(((job_id, entry["job"]) for job_id, entry in pending if entry is not None),
+                         key=lambda item: -item[1].get("estimated_seconds", 0))
+        for job_id, job in pending:
+            if memory_free is not None and job.get("estimated_bytes", 0) > memory_free and not host_idle:
+                continue
+            try:
+                os.rename(self._path("pending", job_id), self._path("running", job_id))
+            except FileNotFoundError:
+                continue  # Another worker was faster
+            entry = _read_json(self._path("running", job_id))
+            if entry is None:
+                continue  # Requeued or finished meanwhile
+            entry["worker"] = worker_id
+            entry["host"] = socket.gethostname()
+            entry["attempts"] += 1
+            entry["claimed_at"] = time.time()
+            _write_json(self._path("running", job_id), entry)
+            return entry
+        return None
+
+    def heartbeat(self, worker_id, job_id=None):
+        """Signal that a worker is alive (and which job it is running)."""
+        path = os.path.join(self.root, "heartbeats", f"{worker_id}.json")
+        _write_json(path, {"worker": worker_id, "job": job_id, "time": time.time()})
+
+    def complete(self, entry, result):
+        """
+        Store the result of a claimed job.
+
+        A worker whose job was reassigned (e.g. after a network partition) may still finish it;
+        its result is kept, and the running entry is only removed if it still belongs to it.
+
+        Args:
+            entry (dict): Queue entry returned by `claim`.
+            result (dict): JSON-serializable result.
+        """
+        _write_json(self._path("done", entry["id"]), dict(entry, result=result, finished_at=time.time()))
+        self._release(entry)
+
+    def fail(self, entry, error):
+        """Record a job that raised; it is retried until `max_attempts` is reached."""
+        if entry["attempts"] < self.max_attempts:
+            current = _read_json(self._path("running", entry["id"]))
+            if current is not None and current.get("worker") == entry["worker"]:
+                _write_json(self._path("running", entry["id"]), dict(entry, worker=None, error=error))
+                os.rename(self._path("running", entry["id"]), self._path("pending", entry["id"]))
+            return
+        _write_json(self._path("failed", entry["id"]), dict(entry, error=error, finished_at=time.time()))
+        self._release(entry)
+
+    def _release(self, entry):
+        current = _read_json(self._path("running", entry["id"]))
+        if current is not None and current.get("worker") == entry["worker"]:
+            try:
+                os.remove(self._path("running", entry["id"]))
+            except FileNotFoundError:
+                pass
+
+    def requeue_stale(self, timeout):
+        """
+        Move the jobs of workers without a recent heartbeat back to `pending/` (or `failed/`).
+
+        Called periodically by the coordinator.
+
+        Args:
+            timeout (float): Seconds without a heartbeat change after which a worker is dead.
+
+        Returns:
+            List[str]: Ids of the requeued or failed jobs.
+        """
+        now = time.time()
+        alive = set()
+        for name in os.listdir(os.path.join(self.root, "heartbeats")):
+            beat = _read_json(os.path.join(self.root, "heartbeats", name))
+            if beat is None:
+                continue
+            worker_id = beat["worker"]
+            seen = self._seen_beats.get(worker_id)
+            if seen is None or seen[0] != beat["time"]:
+                self._seen_beats[worker_id] = (beat["time"], now)
+                alive.add(worker_id)
+            elif now - seen[1] < timeout:
+                alive.add(worker_id)
+
+        requeued = []
+        for job_id in self._job_ids("running"):
+            entry = _read_json(self._path("running", job_id))
+            if entry is None:
+                continue
+            if entry["worker"] is None:
+                # Claimed but not yet stamped with its owner; give the claimer `timeout` seconds
+                first_seen = self._seen_unowned.setdefault(job_id, now)
+                if now - first_seen < timeout:
+                    continue
+            elif entry["worker"] in alive:
+                continue
+            self._seen_unowned.pop(job_id, None)
+            if entry["attempts"] >= self.max_attempts:
+                _write_json(self._path("failed", job_id), dict(entry, error="worker lost", finished_at=now))
+                os.remove(self._path("running", job_id))
+            else:
+                _write_json(self._path("running", job_id), dict(entry, worker=None))
+                os.rename(self._path("running", job_id), self._path("pending", job_id))
+            requeued.append(job_id)
+        return requeued
+
+    def counts(self):
+        """Number of jobs in each state."""
+        return {state: len(self._job_ids(state)) for state in QUEUE_STATES}
+
+    def entries(self, state):
+        """Queue entries in a state, e.g. `entries("done")` for all finished results."""
+        return [entry for entry in (_read_json(self._path(state, job_id)) for job_id in self._job_ids(state)) if entry is not None]
+
+def run_worker(queue, run_job, worker_id=None, heartbeat_interval=10.0, poll_interval=5.0, exit_when_empty=True,
+               memory_budget=None):
+    """
+    Worker agent: claim jobs from a queue and run them until the queue is drained.
+
+    A background thread keeps the heartbeat going while a (possibly hours-long) job runs.
+
+    Args:
+        queue (WorkQueue): Shared queue.
+        run_job (callable): Called with a job dict; returns a JSON-serializable result.
+        worker_id (str, optional): Worker id; defaults to `<hostname>-<pid>`.
+        heartbeat_interval (float): Seconds between heartbeats.
+        poll_interval (float): Seconds to wait when nothing is pending.
+        exit_when_empty (bool): Return once no job is pending or running; otherwise keep polling.
+        memory_budget (float, optional): Bytes shared by the jobs running on this host; see `WorkQueue.claim`.
+
+    Returns:
+        int: Number of jobs completed by this worker.
+    """
+    worker_id = worker_id or default_worker_id()
+    current = {"job": None}
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(heartbeat_interval):
+            queue.heartbeat(worker_id, current["job"])
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    completed = 0
+    try:
+        while True:
+            queue.heartbeat(worker_id, current["job"])
+            entry = queue.claim(worker_id, memory_budget)
+            if entry is None:
+                counts = queue.counts()
+                if exit_when_empty and counts["pending"] == 0 and counts["running"] == 0:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            current["job"] = entry["id"]
+            print(f"{worker_id}: running {entry['id']}")
+            try:
+                result = run_job(entry["job"])
+            except Exception as error:
+                print(f"{worker_id}: {entry['id']} failed: {error!r}")
+                queue.fail(entry, repr(error))
+            else:
+                queue.complete(entry, result)
+                completed += 1
+            current["job"] = None
+    finally:
+        stop.set()
+        thread.join()
+    return completed
+
+def run_coordinator(queue, timeout=60.0, poll_interval=5.0, on_result=None):
+    """
+    Coordinator: watch a queue until every job is done or failed.
+
+    It requeues jobs of dead workers and streams results to `on_result` as they arrive.
+
+    Args:
+        queue (WorkQueue): Shared queue, with the jobs already submitted.
+        timeout (float): Seconds without a heartbeat change after which a worker is dead.
+        poll_interval (float): Seconds between scans of the queue.
+        on_result (callable, optional): Called once with each finished queue entry.
+
+    Returns:
+        dict: Final job counts per state.
+    """
+    reported = set()
+    while True:
+        for job_id in queue.requeue_stale(timeout):
+            print(f"coordinator: requeued {job_id} (worker lost)")
+        for entry in queue.entries("done"):
+            if entry["id"] not in reported:
+                reported.add(entry["id"])
+                if on_result is not None:
+                    on_result(entry)
+        counts = queue.counts()
+        if counts["pending"] == 0 and counts["running"] == 0:
+            return counts
+        time.sleep(poll_interval)